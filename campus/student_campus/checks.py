@@ -0,0 +1,21 @@
+"""
+Project system checks - deployment settings that silently break cross-worker behaviour
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Outside DEBUG the default cache must be shared by all workers"""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or not backend.endswith(('LocMemCache', 'DummyCache')):
+        return []
+    return [Warning(
+        f"The default cache ({backend.rsplit('.', 1)[-1]}) is not shared between worker processes.",
+        hint=(
+            "Submission statuses, indexing progress and the catalog and leaderboard caches are "
+            "invalidated across requests; set CACHE_URL to a file cache or Redis."
+        ),
+        id='campus.W001',
+    )]
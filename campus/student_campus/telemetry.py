@@ -0,0 +1,125 @@
+"""
+Lightweight latency telemetry - timing spans for the AI pipelines, emitted as log
+records and aggregated into in-memory histograms (per worker process)
+"""
+import time
+import logging
+import threading
+from contextlib import ContextDecorator
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds; the last bucket catches everything slower
+BUCKET_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for a single pipeline stage"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+        self.errors = 0
+
+    def observe(self, duration_ms, error=False):
+        index = len(BUCKET_BOUNDS_MS)
+        for i, bound in enumerate(BUCKET_BOUNDS_MS):
+            if duration_ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = duration_ms if self.max_ms is None else max(self.max_ms, duration_ms)
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket containing the q-th quantile (max for the overflow bucket)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                if i < len(BUCKET_BOUNDS_MS):
+                    return round(min(BUCKET_BOUNDS_MS[i], self.max_ms), 2)
+                return round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def snapshot(self):
+        labels = [f"<={bound}ms" for bound in BUCKET_BOUNDS_MS] + [f">{BUCKET_BOUNDS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'min_ms': round(self.min_ms, 2) if self.min_ms is not None else None,
+            'max_ms': round(self.max_ms, 2) if self.max_ms is not None else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def record_timing(stage, duration_ms, error=False, **fields):
+    """Record one finished span: log it and add it to the stage histogram"""
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = LatencyHistogram()
+        histogram.observe(duration_ms, error)
+
+    logger.info(
+        "span stage=%s duration_ms=%.1f error=%s",
+        stage, duration_ms, error,
+        extra={'stage': stage, 'duration_ms': round(duration_ms, 2), 'error': error, 'span_fields': fields},
+    )
+
+
+class timed(ContextDecorator):
+    """Time a block or function as a named stage.
+
+        with timed('pdf_chat.search', pdf=pdf_hash):
+            ...
+
+        @timed('quiz.generate')
+        def generate_quiz_questions(...):
+    """
+
+    def __init__(self, stage, **fields):
+        self.stage = stage
+        self.fields = fields
+
+    def _recreate_cm(self):
+        # Each decorated call gets its own instance, so concurrent calls keep their own start time
+        return timed(self.stage, **self.fields)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        record_timing(self.stage, duration_ms, error=exc_type is not None, **self.fields)
+        return False
+
+
+def get_timing_snapshot():
+    """Return {stage: histogram summary} for every stage recorded in this process"""
+    with _lock:
+        return {stage: histogram.snapshot() for stage, histogram in sorted(_histograms.items())}
+
+
+def reset_timings():
+    with _lock:
+        _histograms.clear()
@@ -0,0 +1,27 @@
+"""
+Test runner - runs the suite against a throwaway file cache, so tests never read pages
+or statuses cached by the development server or by an earlier run
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CampusTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='campus-test-cache-')
+        self._cache_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self._cache_dir,
+            'KEY_PREFIX': 'campus',
+        }})
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
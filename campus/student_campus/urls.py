@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.shortcuts import redirect
 from django.conf import settings
 from django.conf.urls.static import static
+from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,6 +27,8 @@ urlpatterns = [
     path('auth/', include('authentication.urls')),
     path('student/', include('students.urls')),
     path('teacher/', include('teachers.urls')),
+    path('ops/timings/', views.pipeline_timings, name='pipeline_timings'),
+    path('ops/indexing/', views.indexing_jobs, name='indexing_jobs'),
 ]
 
 # Serve media files during development
@@ -0,0 +1,41 @@
+"""
+Operational endpoints for staff - pipeline latency telemetry and ingest throughput
+"""
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.utils import timezone
+from .telemetry import get_timing_snapshot, reset_timings
+from students.indexing_progress import list_recent_jobs
+
+
+@staff_member_required
+def pipeline_timings(request):
+    """Aggregate per-stage latency histograms for this worker process (POST ?reset=1 clears them)"""
+    if request.method == 'POST' and request.GET.get('reset'):
+        reset_timings()
+
+    return JsonResponse({
+        'success': True,
+        'generated_at': timezone.now().isoformat(),
+        'stages': get_timing_snapshot(),
+    })
+
+
+@staff_member_required
+def indexing_jobs(request):
+    """Recent PDF indexing jobs with per-job and overall ingest throughput"""
+    jobs = list_recent_jobs()
+    finished = [job for job in jobs if job['status'] == 'done']
+    total_seconds = sum(job['elapsed_seconds'] for job in finished)
+
+    return JsonResponse({
+        'success': True,
+        'generated_at': timezone.now().isoformat(),
+        'active': [job for job in jobs if job['status'] not in ('done', 'failed')],
+        'jobs': jobs,
+        'throughput': {
+            'finished_jobs': len(finished),
+            'pages_per_second': round(sum(job['pages_done'] for job in finished) / total_seconds, 2) if total_seconds else None,
+            'chunks_per_second': round(sum(job['chunks_done'] for job in finished) / total_seconds, 2) if total_seconds else None,
+        },
+    })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatHistory, KnowledgeBotHistory
+from .models import ChatHistory, KnowledgeBotHistory, WikipediaSearchCache, WikipediaArticleCache, LeaderboardEntry
 
 @admin.register(ChatHistory)
 class ChatHistoryAdmin(admin.ModelAdmin):
@@ -14,3 +14,19 @@ class KnowledgeBotHistoryAdmin(admin.ModelAdmin):
     list_filter = ['student', 'created_at']
     search_fields = ['question', 'answer', 'student__username']
     readonly_fields = ['created_at', 'sources']
+
+@admin.register(WikipediaSearchCache)
+class WikipediaSearchCacheAdmin(admin.ModelAdmin):
+    list_display = ['term', 'search_term', 'fetched_at', 'last_used_at']
+    search_fields = ['term', 'search_term']
+
+@admin.register(WikipediaArticleCache)
+class WikipediaArticleCacheAdmin(admin.ModelAdmin):
+    list_display = ['title', 'page_id', 'fetched_at', 'last_used_at']
+    search_fields = ['title']
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ['student', 'engagement_score', 'total_quizzes', 'avg_percentage', 'perfect_scores', 'updated_at']
+    search_fields = ['student__username']
+    readonly_fields = ['updated_at']
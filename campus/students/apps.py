@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StudentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'students'
+
+    def ready(self):
+        # Registers the project's system checks (student_campus has no app config of its own)
+        from student_campus import checks
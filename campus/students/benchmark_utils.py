@@ -0,0 +1,316 @@
+"""
+Offline RAG benchmark utilities - measure PDF chat retrieval speed and quality
+without calling the Gemini API
+"""
+import os
+import json
+import time
+import glob
+import random
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+from .utils import (
+    get_pdf_hash, get_pdf_text_from_path, get_text_chunks,
+    build_answer_prompt, RETRIEVAL_K,
+)
+from .local_knowledge import HashingEmbeddings
+
+STAGES = ['hash', 'index', 'load', 'embed_query', 'search', 'generate']
+
+
+class RecordedEmbeddings(Embeddings):
+    """Replay query embeddings recorded from the real embedding model"""
+
+    def __init__(self, recordings=None, fallback=None):
+        self.recordings = recordings or {}
+        self.fallback = fallback or HashingEmbeddings()
+
+    @classmethod
+    def from_file(cls, path, fallback=None):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), fallback)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if text in self.recordings:
+            return self.recordings[text]
+        return self.fallback.embed_query(text)
+
+
+class FakeLLM:
+    """Stand-in for the Gemini client: echoes the first context line after a fixed delay"""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+
+    def generate(self, prompt):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        marker = 'Context:'
+        body = prompt.split(marker, 1)[-1].strip()
+        return body.split('\n', 1)[0][:200]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(np.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize_timings(timings):
+    """Turn {stage: [seconds, ...]} into per-stage count/mean/p50/p95 in milliseconds"""
+    summary = {}
+    for stage in STAGES:
+        values = [t * 1000 for t in timings.get(stage, [])]
+        if not values:
+            continue
+        summary[stage] = {
+            'count': len(values),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+        }
+    return summary
+
+
+def sample_queries(texts, per_doc, rng, window=12):
+    """Pick short passages from chunks; a retrieval is a hit if a returned chunk contains the passage"""
+    queries = []
+    candidates = [t for t in texts if len(t.split()) >= window]
+    if not candidates:
+        return queries
+    for _ in range(per_doc):
+        words = rng.choice(candidates).split()
+        start = rng.randint(0, len(words) - window)
+        queries.append(' '.join(words[start:start + window]))
+    return queries
+
+
+def paraphrase(passage, rng):
+    """Turn a sampled passage into a question that shares only some of its words, in another order"""
+    words = [word.strip('.,;:!?()[]"\'').lower() for word in passage.split()]
+    content = [word for word in words if len(word) > 3] or words
+    kept = rng.sample(content, max(1, len(content) // 2))
+    return f"What does the document say about {' '.join(kept)}?"
+
+
+def _normalize(text):
+    return ' '.join(text.split())
+
+
+def discover_pdfs(media_root):
+    """Map PDF content hash to one representative path under MEDIA_ROOT, timing each hash"""
+    pdfs = {}
+    hash_timings = []
+    for path in sorted(glob.glob(os.path.join(str(media_root), '**', '*.pdf'), recursive=True)):
+        start = time.perf_counter()
+        pdf_hash = get_pdf_hash(path)
+        hash_timings.append(time.perf_counter() - start)
+        pdfs.setdefault(pdf_hash, path)
+    return pdfs, hash_timings
+
+
+def load_questions(path):
+    """Held-out questions per PDF: {pdf hash: [{"question": ..., "answer": passage in the PDF}, ...]}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _run_queries(vector_store, embeddings, queries, k, llm, timings, doc_vectors=None, answers=None):
+    """Run embed/search/generate for each query and return the number of hits.
+
+    A hit is a retrieved chunk containing the query's answer passage (the query itself
+    when no answers are given).
+    """
+    hits = 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        if doc_vectors is not None and query in doc_vectors:
+            query_vector = doc_vectors[query]
+        else:
+            query_vector = embeddings.embed_query(query)
+        timings['embed_query'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        docs = vector_store.similarity_search_by_vector(query_vector, k=k)
+        timings['search'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        context = "\n\n".join(doc.page_content for doc in docs)
+        llm.generate(build_answer_prompt(context, query))
+        timings['generate'].append(time.perf_counter() - start)
+
+        expected = _normalize(answers[i]) if answers else query
+        if any(expected in _normalize(doc.page_content) for doc in docs):
+            hits += 1
+    return hits
+
+
+def _question_hits(vector_store, embeddings, texts, k, llm, timings, rng, queries_per_doc, held_out):
+    """{kind: (hits, queries)} for paraphrased passages and held-out questions against a store of `texts`"""
+    passages = sample_queries(texts, queries_per_doc, rng)
+    paraphrased = [paraphrase(passage, rng) for passage in passages]
+    counts = {'paraphrased': (
+        _run_queries(vector_store, embeddings, paraphrased, k, llm, timings, answers=passages), len(passages)
+    )}
+    if held_out:
+        counts['held_out'] = (
+            _run_queries(vector_store, embeddings, [q['question'] for q in held_out], k, llm, timings,
+                         answers=[q['answer'] for q in held_out]),
+            len(held_out),
+        )
+    return counts
+
+
+def _rates(counts):
+    return {kind: round(hits / total, 3) if total else None for kind, (hits, total) in counts.items()}
+
+
+def _add_counts(totals, counts):
+    for kind, (hits, total) in counts.items():
+        previous = totals.get(kind, (0, 0))
+        totals[kind] = (previous[0] + hits, previous[1] + total)
+
+
+def benchmark_checked_in_indexes(base_dir, media_root, embeddings, llm, k=RETRIEVAL_K,
+                                 queries_per_doc=5, seed=0, questions=None):
+    """Benchmark load/search/generate against the faiss_index_* directories on disk.
+
+    The stored vectors are real Gemini embeddings, so the 'recorded' hit-rate only counts
+    held-out questions (see load_questions) whose query embedding was recorded from the
+    real model. Every index also gets a lexical hit-rate: its chunks are re-embedded with
+    the hashing embedder and searched with paraphrased passages ('paraphrased') and the
+    held-out questions ('held_out'). Timings use passages sampled from the chunks,
+    searched by the stored vector of the chunk they came from. Indexes with no more than
+    k chunks return every chunk for any question, so they are only timed.
+    """
+    rng = random.Random(seed)
+    timings = defaultdict(list)
+    pdfs, timings['hash'] = discover_pdfs(media_root)
+    recordings = embeddings.recordings if isinstance(embeddings, RecordedEmbeddings) else {}
+    lexical = embeddings.fallback if isinstance(embeddings, RecordedEmbeddings) else HashingEmbeddings()
+    per_index = []
+    totals = {}
+
+    for index_path in sorted(glob.glob(os.path.join(str(base_dir), 'faiss_index_*'))):
+        if not os.path.isdir(index_path):
+            continue
+        pdf_hash = os.path.basename(index_path)[len('faiss_index_'):]
+
+        start = time.perf_counter()
+        vector_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+        timings['load'].append(time.perf_counter() - start)
+
+        texts = []
+        doc_vectors = {}
+        for position in range(vector_store.index.ntotal):
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+            texts.append(_normalize(doc.page_content))
+        queries = sample_queries(texts, queries_per_doc, rng)
+        for query in queries:
+            for position, text in enumerate(texts):
+                if query in text:
+                    doc_vectors[query] = vector_store.index.reconstruct(position).tolist()
+                    break
+        _run_queries(vector_store, embeddings, queries, k, llm, timings, doc_vectors)
+
+        trivial = len(texts) <= k
+        counts = {}
+        held_out = (questions or {}).get(pdf_hash, [])
+        if not trivial:
+            recorded = [q for q in held_out if q['question'] in recordings]
+            if recorded:
+                counts['recorded'] = (
+                    _run_queries(vector_store, embeddings, [q['question'] for q in recorded], k, llm, timings,
+                                 answers=[q['answer'] for q in recorded]),
+                    len(recorded),
+                )
+            # Searches of the re-embedded copy are not timed: it is not the index the app loads
+            lexical_store = FAISS.from_texts(texts, embedding=lexical)
+            counts.update(_question_hits(lexical_store, lexical, texts, k, llm, defaultdict(list), rng,
+                                         queries_per_doc, held_out))
+            _add_counts(totals, counts)
+
+        per_index.append({
+            'index': os.path.basename(index_path),
+            'pdf': pdfs.get(pdf_hash),
+            'chunks': vector_store.index.ntotal,
+            'queries': len(queries),
+            'trivial': trivial,
+            'hit_rate': _rates(counts),
+        })
+
+    return {
+        'source': 'indexes',
+        'k': k,
+        'stages': summarize_timings(timings),
+        'hit_rate': _rates(totals),
+        'queries': {kind: total for kind, (_, total) in totals.items()},
+        'skipped': sum(doc['trivial'] for doc in per_index),
+        'documents': per_index,
+    }
+
+
+def benchmark_media_pdfs(media_root, embeddings, llm, k=RETRIEVAL_K, queries_per_doc=5,
+                         chunk_size=15000, chunk_overlap=2000, seed=0, questions=None):
+    """Re-index every PDF under MEDIA_ROOT in memory and benchmark the full pipeline.
+
+    Passages sampled verbatim from the chunks are embedded by the same embedder as the
+    chunks, so their 'verbatim' hit-rate is close to 100% by construction and only a
+    sanity check. Paraphrased passages ('paraphrased') and held-out questions
+    ('held_out', see load_questions) measure retrieval. Documents with no more than k
+    chunks return every chunk for any question; they are flagged and left out of the
+    totals.
+    """
+    rng = random.Random(seed)
+    timings = defaultdict(list)
+    pdfs, timings['hash'] = discover_pdfs(media_root)
+    per_document = []
+    totals = {}
+
+    for pdf_hash, pdf_path in pdfs.items():
+        start = time.perf_counter()
+        raw_text = get_pdf_text_from_path(pdf_path)
+        if not raw_text.strip():
+            continue
+        chunks = get_text_chunks(raw_text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        vector_store = FAISS.from_texts(chunks, embedding=embeddings)
+        timings['index'].append(time.perf_counter() - start)
+
+        texts = [_normalize(c) for c in chunks]
+        queries = sample_queries(texts, queries_per_doc, rng)
+        counts = {'verbatim': (_run_queries(vector_store, embeddings, queries, k, llm, timings), len(queries))}
+        counts.update(_question_hits(vector_store, embeddings, texts, k, llm, timings, rng, queries_per_doc,
+                                     (questions or {}).get(pdf_hash, [])))
+        trivial = len(chunks) <= k
+        if not trivial:
+            _add_counts(totals, counts)
+        per_document.append({
+            'pdf': pdf_path,
+            'chunks': len(chunks),
+            'queries': len(queries),
+            'trivial': trivial,
+            'hit_rate': _rates(counts),
+        })
+
+    return {
+        'source': 'pdfs',
+        'k': k,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'stages': summarize_timings(timings),
+        'hit_rate': _rates(totals),
+        'queries': {kind: total for kind, (_, total) in totals.items()},
+        'skipped': sum(doc['trivial'] for doc in per_document),
+        'documents': per_document,
+    }
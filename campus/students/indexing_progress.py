@@ -0,0 +1,157 @@
+"""
+Indexing progress tracking for PDF chat - pages extracted, chunks embedded, throughput
+and ETA per indexing job. State lives in the default Django cache, which must be shared
+by the workers (the file cache by default, or Redis) for a poll to find a job another
+worker is indexing; a per-process locmem cache fails the campus.W001 check outside DEBUG.
+"""
+import time
+import hashlib
+import logging
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'indexing_progress:job:{}'
+PATH_KEY = 'indexing_progress:path:{}'
+RECENT_JOBS_KEY = 'indexing_progress:recent'
+JOB_TTL = 24 * 60 * 60
+MAX_RECENT_JOBS = 50
+# Minimum seconds between cache writes for per-page/per-chunk updates
+WRITE_INTERVAL = 0.5
+
+
+def _path_digest(pdf_path):
+    return hashlib.sha1(str(pdf_path).encode('utf-8')).hexdigest()
+
+
+class IndexingJob:
+    """Progress of building one FAISS index; job_id is the PDF content hash"""
+
+    STAGES = ('extracting', 'chunking', 'embedding', 'saving', 'done', 'failed')
+
+    def __init__(self, job_id, pdf_path):
+        now = time.time()
+        self.job_id = job_id
+        self.pdf_path = str(pdf_path)
+        self.status = 'extracting'
+        self.pages_total = 0
+        self.pages_done = 0
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.started_at = now
+        self.stage_started_at = now
+        self.updated_at = now
+        self.finished_at = None
+        self.error = None
+        self._last_write = 0.0
+
+    @classmethod
+    def start(cls, job_id, pdf_path):
+        job = cls(job_id, pdf_path)
+        cache.set(PATH_KEY.format(_path_digest(pdf_path)), job_id, JOB_TTL)
+        recent = [j for j in cache.get(RECENT_JOBS_KEY, []) if j != job_id]
+        recent.insert(0, job_id)
+        cache.set(RECENT_JOBS_KEY, recent[:MAX_RECENT_JOBS], JOB_TTL)
+        job.save(force=True)
+        logger.info("Indexing started job=%s path=%s", job_id, pdf_path)
+        return job
+
+    def save(self, force=False):
+        now = time.time()
+        self.updated_at = now
+        if not force and now - self._last_write < WRITE_INTERVAL:
+            return
+        self._last_write = now
+        cache.set(JOB_KEY.format(self.job_id), self.to_dict(), JOB_TTL)
+
+    def set_stage(self, status):
+        self.status = status
+        self.stage_started_at = time.time()
+        self.save(force=True)
+
+    def page_extracted(self, pages_done, pages_total):
+        self.pages_done = pages_done
+        self.pages_total = pages_total
+        self.save(force=pages_done == pages_total)
+
+    def chunked(self, chunks_total):
+        self.chunks_total = chunks_total
+        self.set_stage('embedding')
+
+    def chunk_embedded(self, chunks_done):
+        self.chunks_done = chunks_done
+        self.save(force=chunks_done == self.chunks_total)
+
+    def finish(self):
+        self.finished_at = time.time()
+        self.set_stage('done')
+        logger.info(
+            "Indexing finished job=%s pages=%s chunks=%s seconds=%.1f",
+            self.job_id, self.pages_done, self.chunks_done, self.finished_at - self.started_at,
+        )
+
+    def fail(self, error):
+        self.error = str(error)
+        self.finished_at = time.time()
+        self.set_stage('failed')
+        logger.warning("Indexing failed job=%s error=%s", self.job_id, error)
+
+    def to_dict(self):
+        now = self.finished_at or time.time()
+        elapsed = max(now - self.started_at, 1e-6)
+        stage_elapsed = max(now - self.stage_started_at, 1e-6)
+
+        pages_per_second = self.pages_done / elapsed if self.pages_done else None
+        chunks_per_second = None
+        eta_seconds = None
+        if self.status == 'extracting' and self.pages_total and self.pages_done:
+            eta_seconds = (self.pages_total - self.pages_done) / (self.pages_done / stage_elapsed)
+        elif self.status == 'embedding' and self.chunks_total and self.chunks_done:
+            chunks_per_second = self.chunks_done / stage_elapsed
+            eta_seconds = (self.chunks_total - self.chunks_done) / chunks_per_second
+        elif self.chunks_done and self.status in ('saving', 'done'):
+            chunks_per_second = self.chunks_done / elapsed
+
+        if self.status == 'done':
+            percent = 100.0
+        elif self.status == 'embedding' and self.chunks_total:
+            # Embedding dominates indexing time; extraction counts for the first 20%
+            percent = 20 + 80 * self.chunks_done / self.chunks_total
+        elif self.pages_total:
+            percent = 20 * self.pages_done / self.pages_total
+        else:
+            percent = 0.0
+
+        return {
+            'job_id': self.job_id,
+            'pdf_path': self.pdf_path,
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'pages_total': self.pages_total,
+            'chunks_done': self.chunks_done,
+            'chunks_total': self.chunks_total,
+            'percent': round(percent, 1),
+            'pages_per_second': round(pages_per_second, 2) if pages_per_second else None,
+            'chunks_per_second': round(chunks_per_second, 2) if chunks_per_second else None,
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id))
+
+
+def get_job_for_path(pdf_path):
+    """Latest indexing job for a file path, without hashing the file"""
+    job_id = cache.get(PATH_KEY.format(_path_digest(pdf_path)))
+    return get_job(job_id) if job_id else None
+
+
+def list_recent_jobs():
+    jobs = [get_job(job_id) for job_id in cache.get(RECENT_JOBS_KEY, [])]
+    return [job for job in jobs if job]
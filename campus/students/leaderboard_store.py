@@ -0,0 +1,102 @@
+"""
+Materialised leaderboard - keeps LeaderboardEntry rows in step with completed quiz
+attempts so the leaderboard page is a single ordered read
+"""
+import logging
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F, Window
+from django.db.models.functions import RowNumber
+from teachers.models import QuizAttempt
+from .models import LeaderboardEntry
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = 'leaderboard:data'
+
+
+def invalidate_leaderboard():
+    """Drop the cached leaderboard page data (see leaderboard_utils.get_leaderboard_data)"""
+    cache.delete(LEADERBOARD_KEY)
+
+
+def record_attempt(attempt):
+    """Fold one newly completed attempt into the student's leaderboard entry"""
+    if attempt.completed_at is None or attempt.score is None or not attempt.student.is_student():
+        return None
+    with transaction.atomic():
+        entry = LeaderboardEntry.objects.select_for_update().filter(student_id=attempt.student_id).first()
+        if entry is not None:
+            entry.add_attempt(attempt.score, attempt.total_points)
+        else:
+            # A student's first entry starts from their whole history, which already
+            # includes this attempt, not from zero
+            built = build_entries(QuizAttempt.objects.filter(student_id=attempt.student_id))
+            if built:
+                entry = built[0]
+            else:
+                entry = LeaderboardEntry(student_id=attempt.student_id)
+                entry.add_attempt(attempt.score, attempt.total_points)
+        entry.save()
+        transaction.on_commit(invalidate_leaderboard)
+    return entry
+
+
+def build_entries(attempts=None):
+    """
+    Compute unsaved LeaderboardEntry objects from completed attempts - every student's by
+    default, or those in `attempts` (a QuizAttempt queryset, also a historical one in migrations)
+    """
+    if attempts is None:
+        attempts = QuizAttempt.objects.all()
+    completed = attempts.filter(
+        student__role='student', completed_at__isnull=False, score__isnull=False
+    )
+
+    entries = {
+        row['student_id']: LeaderboardEntry(
+            student_id=row['student_id'],
+            total_quizzes=row['total_quizzes'],
+            total_score=row['total_score'],
+            total_possible=row['total_possible'],
+            perfect_scores=row['perfect_scores'],
+            recent_scores=[],
+        )
+        for row in completed.order_by().values('student_id').annotate(
+            total_quizzes=Count('id'),
+            total_score=Sum('score'),
+            total_possible=Sum('total_points'),
+            perfect_scores=Count('id', filter=Q(score=F('total_points'))),
+        )
+    }
+
+    recent_rows = completed.annotate(
+        recency=Window(RowNumber(), partition_by=[F('student_id')], order_by=F('completed_at').desc()),
+    ).filter(recency__lte=LeaderboardEntry.RECENT_ATTEMPTS).order_by('student_id', 'recency').values_list(
+        'student_id', 'score', 'total_points'
+    )
+    for student_id, score, total_points in recent_rows:
+        entries[student_id].recent_scores.append([score, total_points])
+
+    for entry in entries.values():
+        entry.refresh_scores()
+    return list(entries.values())
+
+
+def rebuild_entries():
+    """Replace all leaderboard entries with freshly computed ones; returns the entry count"""
+    entries = build_entries()
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        transaction.on_commit(invalidate_leaderboard)
+    logger.info("Rebuilt %s leaderboard entries", len(entries))
+    return len(entries)
+
+
+def get_ranked_entries():
+    """Leaderboard entries in rank order (filled by migration 0008 and rebuild_leaderboard)"""
+    return list(
+        LeaderboardEntry.objects.filter(student__role='student', total_quizzes__gt=0)
+        .select_related('student').order_by('-engagement_score', 'student_id')
+    )
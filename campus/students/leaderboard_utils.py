@@ -2,10 +2,16 @@
 Leaderboard utilities for calculating student rankings and generating AI suggestions
 """
 import os
+import json
+import typing
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
-from django.db.models import Count, Sum, Avg, Q
-from teachers.models import QuizAttempt
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .leaderboard_store import get_ranked_entries, LEADERBOARD_KEY
 
 # Load .env from the campus directory
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -15,71 +21,56 @@ API_KEY = os.getenv("API_KEY")
 if not API_KEY:
     raise ValueError("API_KEY not found in environment variables. Please check your .env file at: " + env_path)
 
+logger = logging.getLogger(__name__)
+
+SUGGESTION_MODEL = 'gemini-2.0-flash-exp'
+SUGGESTION_TTL = getattr(settings, 'LEADERBOARD_SUGGESTION_TTL', 6 * 60 * 60)
+LEADERBOARD_CACHE_TTL = getattr(settings, 'LEADERBOARD_CACHE_TTL', 5 * 60)
+SUGGESTION_BATCH_SIZE = 30
+SUGGESTION_KEY = 'leaderboard_suggestion:{}'
+INSIGHTS_KEY = 'leaderboard_insights:{}:{}'
+REFRESH_LOCK_KEY = 'leaderboard_suggestion:refresh'
+REFRESH_LOCK_TTL = 5 * 60
+QUIZ_COUNT_BANDS = [(2, '1-2'), (5, '3-5'), (10, '6-10'), (float('inf'), '11+')]
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='leaderboard-suggestions')
+_model = None
+_structured_model = None
+
 def get_leaderboard_data():
+    """Cached leaderboard rankings; dropped whenever a submission or rebuild changes the entries"""
+    leaderboard = cache.get(LEADERBOARD_KEY)
+    if leaderboard is None:
+        leaderboard = build_leaderboard_data()
+        cache.set(LEADERBOARD_KEY, leaderboard, LEADERBOARD_CACHE_TTL)
+    return leaderboard
+
+
+def build_leaderboard_data():
     """
-    Calculate comprehensive leaderboard rankings based on multiple metrics
+    Leaderboard rankings from the materialised LeaderboardEntry table (one ordered query);
+    entries are kept current by submit_quiz and can be rebuilt with rebuild_leaderboard
     """
-    from authentication.models import User
-    
-    students = User.objects.filter(role='student')
-    leaderboard = []
-    
-    for student in students:
-        # Get quiz statistics
-        attempts = QuizAttempt.objects.filter(
-            student=student,
-            completed_at__isnull=False
-        )
-        
-        total_quizzes = attempts.count()
-        if total_quizzes == 0:
-            continue  # Skip students with no quiz attempts
-        
-        # Calculate metrics
-        total_score = sum([attempt.score for attempt in attempts])
-        total_possible = sum([attempt.total_points for attempt in attempts])
-        
-        avg_percentage = (total_score / total_possible * 100) if total_possible > 0 else 0
-        
-        # Count perfect scores
-        perfect_scores = attempts.filter(score=total_possible).count()
-        
-        # Get recent performance (last 5 quizzes)
-        recent_attempts = attempts.order_by('-completed_at')[:5]
-        recent_avg = 0
-        if recent_attempts.exists():
-            recent_score = sum([a.score for a in recent_attempts])
-            recent_possible = sum([a.total_points for a in recent_attempts])
-            recent_avg = (recent_score / recent_possible * 100) if recent_possible > 0 else 0
-        
-        # Calculate engagement score (weighted combination)
-        engagement_score = (
-            avg_percentage * 0.5 +  # 50% weight on average score
-            (perfect_scores / total_quizzes * 100) * 0.2 +  # 20% weight on perfect scores
-            recent_avg * 0.2 +  # 20% weight on recent performance
-            min(total_quizzes * 2, 10)  # 10% weight on participation (capped at 10 points)
-        )
-        
-        leaderboard.append({
-            'student': student,
-            'total_quizzes': total_quizzes,
-            'avg_percentage': round(avg_percentage, 2),
-            'total_score': total_score,
-            'total_possible': total_possible,
-            'perfect_scores': perfect_scores,
-            'recent_avg': round(recent_avg, 2),
-            'engagement_score': round(engagement_score, 2)
-        })
-    
-    # Sort by engagement score (highest first)
-    leaderboard.sort(key=lambda x: x['engagement_score'], reverse=True)
-    
+    leaderboard = [
+        {
+            'student': entry.student,
+            'total_quizzes': entry.total_quizzes,
+            'avg_percentage': entry.avg_percentage,
+            'total_score': entry.total_score,
+            'total_possible': entry.total_possible,
+            'perfect_scores': entry.perfect_scores,
+            'recent_avg': entry.recent_avg,
+            'engagement_score': entry.engagement_score
+        }
+        for entry in get_ranked_entries()
+    ]
+
     # Add rankings and badges
     for idx, entry in enumerate(leaderboard, 1):
         entry['rank'] = idx
         entry['badge'] = get_rank_badge(idx)
         entry['tier'] = get_tier(entry['engagement_score'])
-    
+
     return leaderboard
 
 
@@ -122,27 +113,87 @@ def get_tier(engagement_score):
         return {'name': 'Beginner', 'color': '#95a5a6', 'icon': '🎓'}
 
 
-def generate_personalized_suggestion(student_data, leaderboard_position):
+class SuggestionItem(typing.TypedDict):
+    bucket: str
+    tip: str
+
+
+def _get_model(structured=False):
+    """Shared Gemini models (plain text, or JSON list of SuggestionItem) configured once per process"""
+    global _model, _structured_model
+    if _model is None:
+        genai.configure(api_key=API_KEY)
+        _model = genai.GenerativeModel(SUGGESTION_MODEL)
+        _structured_model = genai.GenerativeModel(
+            SUGGESTION_MODEL,
+            generation_config=genai.GenerationConfig(
+                response_mime_type='application/json',
+                response_schema=list[SuggestionItem],
+            ),
+        )
+    return _structured_model if structured else _model
+
+
+def get_performance_trend(student_data):
+    trend = "improving" if student_data['recent_avg'] > student_data['avg_percentage'] else "steady"
+    if student_data['recent_avg'] < student_data['avg_percentage'] - 5:
+        trend = "declining"
+    return trend
+
+
+def get_quiz_count_band(total_quizzes):
+    for limit, band in QUIZ_COUNT_BANDS:
+        if total_quizzes <= limit:
+            return band
+    return QUIZ_COUNT_BANDS[-1][1]
+
+
+def get_metric_bucket(student_data):
+    """Students in the same bucket (tier, trend, quiz count band) share one cached tip"""
+    return f"{student_data['tier']['name']}|{get_performance_trend(student_data)}|{get_quiz_count_band(student_data['total_quizzes'])}"
+
+
+def _clean_suggestion(text):
+    suggestion = text.strip().replace('**', '').replace('🎯', '').replace('*', '')
+    # Remove any line breaks and extra spaces
+    suggestion = ' '.join(suggestion.split())
+    # Truncate if too long
+    words = suggestion.split()
+    if len(words) > 15:
+        suggestion = ' '.join(words[:15]) + '...'
+    return suggestion
+
+
+def fallback_suggestion(student_data):
+    """Smart fallback based on actual data"""
+    if student_data['avg_percentage'] >= 85:
+        return "Excellent work! Try helping classmates to deepen your understanding."
+    elif student_data['avg_percentage'] >= 70:
+        return "Good progress! Review quiz mistakes to reach the next level."
+    elif student_data['recent_avg'] > student_data['avg_percentage']:
+        return "You're improving! Keep this momentum with daily practice sessions."
+    elif student_data['total_quizzes'] < 3:
+        return "Take more quizzes to build confidence and improve scores."
+    else:
+        return "Focus on mastering one topic at a time for better results."
+
+
+def generate_bucket_suggestions(buckets):
     """
-    Use Gemini AI to generate personalized improvement suggestions
+    One structured-output request for many metric buckets; returns {bucket: tip}
     """
-    try:
-        genai.configure(api_key=os.getenv('API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        # Add unique context based on actual performance changes
-        performance_trend = "improving" if student_data['recent_avg'] > student_data['avg_percentage'] else "steady"
-        if student_data['recent_avg'] < student_data['avg_percentage'] - 5:
-            performance_trend = "declining"
-        
-        prompt = f"""You are an encouraging educational AI coach. Generate ONE SHORT personalized tip (maximum 15 words).
+    lines = []
+    for bucket in buckets:
+        tier, trend, quizzes = bucket.split('|')
+        lines.append(f'- bucket "{bucket}": {tier} tier, {trend} performance, {quizzes} quizzes completed')
+
+    prompt = f"""You are an encouraging educational AI coach. For EACH student group below, write ONE SHORT personalized tip (maximum 15 words).
 
-Student: Rank #{student_data['rank']}/{leaderboard_position['total_students']}
-Score: {student_data['avg_percentage']}% average, {student_data['recent_avg']}% recent ({performance_trend})
-Completed: {student_data['total_quizzes']} quizzes, {student_data['perfect_scores']} perfect
-Tier: {student_data['tier']['name']}
+Student groups:
+{chr(10).join(lines)}
 
-Create a VERY SHORT (10-15 words), specific, actionable tip based on their performance trend.
+Tiers from highest to lowest: Diamond, Platinum, Gold, Silver, Bronze, Beginner.
+Each tip must be specific and actionable for the group's tier and performance trend.
 
 Examples:
 - Top performer + improving: "Keep crushing it! Try teaching others to master concepts."
@@ -150,47 +201,78 @@ Examples:
 - Lower rank: "Start with 15-min daily reviews before attempting quizzes."
 - Declining: "Take a break, then review basics before next quiz."
 
-NO emojis, NO formatting, NO titles. Just one practical sentence (max 15 words)."""
-        
-        response = model.generate_content(prompt)
-        suggestion = response.text.strip().replace('**', '').replace('🎯', '').replace('*', '')
-        # Remove any line breaks and extra spaces
-        suggestion = ' '.join(suggestion.split())
-        # Truncate if too long
-        words = suggestion.split()
-        if len(words) > 15:
-            suggestion = ' '.join(words[:15]) + '...'
-        return suggestion
-        
-    except Exception as e:
-        print(f"AI suggestion error: {e}")
-        # Smart fallback based on actual data
-        if student_data['avg_percentage'] >= 85:
-            return "Excellent work! Try helping classmates to deepen your understanding."
-        elif student_data['avg_percentage'] >= 70:
-            return "Good progress! Review quiz mistakes to reach the next level."
-        elif student_data['recent_avg'] > student_data['avg_percentage']:
-            return "You're improving! Keep this momentum with daily practice sessions."
-        elif student_data['total_quizzes'] < 3:
-            return "Take more quizzes to build confidence and improve scores."
-        else:
-            return "Focus on mastering one topic at a time for better results."
-
-
-def generate_overall_insights(leaderboard_data):
+NO emojis, NO formatting, NO titles. Return one item per group with the bucket string copied exactly."""
+
+    response = _get_model(structured=True).generate_content(prompt)
+    items = json.loads(response.text)
+    return {
+        item['bucket']: _clean_suggestion(item['tip'])
+        for item in items
+        if item.get('bucket') in buckets and item.get('tip')
+    }
+
+
+def get_suggestions(leaderboard_data, generate=True):
+    """
+    Tips for every student, {student_id: tip}. Cached per metric bucket; missing buckets
+    are generated in batched requests when generate is True, else the fallback is used.
+    """
+    buckets = {entry['student'].id: get_metric_bucket(entry) for entry in leaderboard_data}
+    keys = {SUGGESTION_KEY.format(bucket): bucket for bucket in set(buckets.values())}
+    tips = {keys[key]: tip for key, tip in cache.get_many(keys).items()}
+
+    missing = sorted(set(buckets.values()) - set(tips))
+    if generate and missing:
+        for start in range(0, len(missing), SUGGESTION_BATCH_SIZE):
+            batch = missing[start:start + SUGGESTION_BATCH_SIZE]
+            try:
+                generated = generate_bucket_suggestions(batch)
+            except Exception as e:
+                logger.warning("AI suggestion batch failed: %s", e)
+                continue
+            cache.set_many({SUGGESTION_KEY.format(b): tip for b, tip in generated.items()}, SUGGESTION_TTL)
+            tips.update(generated)
+
+    return {
+        entry['student'].id: tips.get(buckets[entry['student'].id]) or fallback_suggestion(entry)
+        for entry in leaderboard_data
+    }
+
+
+def generate_personalized_suggestion(student_data, leaderboard_position=None):
     """
-    Generate AI-powered insights about the overall leaderboard trends
+    Personalized improvement suggestion for one student (shared by their metric bucket)
     """
+    return get_suggestions([student_data])[student_data['student'].id]
+
+
+def get_cached_suggestion(student_data):
+    """Cached tip for the student's bucket without calling Gemini (None on a miss)"""
+    return cache.get(SUGGESTION_KEY.format(get_metric_bucket(student_data)))
+
+
+def _insights_key(leaderboard_data):
+    avg_score = sum([d['avg_percentage'] for d in leaderboard_data]) / len(leaderboard_data)
+    # Insights only change meaningfully with class size and average score band
+    return INSIGHTS_KEY.format(len(leaderboard_data), int(avg_score // 5) * 5)
+
+
+def generate_overall_insights(leaderboard_data, generate=True):
+    """
+    Generate AI-powered insights about the overall leaderboard trends (cached with TTL)
+    """
+    if not leaderboard_data:
+        return "No student data available yet."
+
+    key = _insights_key(leaderboard_data)
+    insights = cache.get(key)
+    if insights is not None or not generate:
+        return insights
+
     try:
-        if not leaderboard_data:
-            return "No student data available yet."
-        
-        genai.configure(api_key=os.getenv('API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
         # Calculate statistics
         avg_score = sum([d['avg_percentage'] for d in leaderboard_data]) / len(leaderboard_data)
-        top_performer = leaderboard_data[0] if leaderboard_data else None
+        top_performer = leaderboard_data[0]
         total_students = len(leaderboard_data)
         
         prompt = f"""You are an educational analytics AI providing insights about class performance.
@@ -207,8 +289,31 @@ Keep it under 80 words and friendly in tone.
 
 Format: Plain text, no emojis, professional but warm."""
         
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        response = _get_model().generate_content(prompt)
+        insights = response.text.strip()
+        cache.set(key, insights, SUGGESTION_TTL)
+        return insights
         
     except Exception as e:
+        logger.warning("AI insights error: %s", e)
         return "The class is showing great engagement with the learning materials. Keep up the excellent work!"
+
+
+def precompute_suggestions():
+    """Fill the suggestion and insights caches for the current leaderboard"""
+    try:
+        leaderboard_data = get_leaderboard_data()
+        get_suggestions(leaderboard_data)
+        generate_overall_insights(leaderboard_data)
+    except Exception as e:
+        logger.warning("Suggestion precompute failed: %s", e)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        # Runs on a worker thread, which owns its own database connection
+        connection.close()
+
+
+def schedule_suggestion_refresh():
+    """Precompute suggestions in the background; bursts of submissions share one refresh"""
+    if cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TTL):
+        _executor.submit(precompute_suggestions)
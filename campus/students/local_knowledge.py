@@ -0,0 +1,310 @@
+"""
+Offline knowledge backend for the knowledge bot - a local SQLite FTS5 full-text index
+plus a FAISS vector index built from a Wikipedia extract dump or a folder of text files
+"""
+import os
+import re
+import json
+import glob
+import shutil
+import sqlite3
+import tempfile
+import time
+import hashlib
+import logging
+import threading
+from typing import List
+
+import faiss
+import numpy as np
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+from student_campus.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BACKEND = getattr(settings, 'KNOWLEDGE_BACKEND', os.getenv('KNOWLEDGE_BACKEND', 'wikipedia'))
+KNOWLEDGE_INDEX_DIR = str(getattr(settings, 'KNOWLEDGE_INDEX_DIR', os.path.join(settings.BASE_DIR, 'knowledge_index')))
+DB_NAME = 'knowledge.sqlite3'
+VECTORS_NAME = 'vectors.faiss'
+DEFAULT_DIM = 256
+# Characters of an article used for its vector; the full text is still searchable via FTS
+VECTOR_TEXT_CHARS = 4000
+CANDIDATES = 20
+# Full-text ranking of very common terms can scan much of a large dump; past this budget
+# the body search is abandoned and the title and vector hits are used on their own
+FTS_BUDGET_MS = 25
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'at', 'to', 'for', 'and', 'or', 'is', 'are', 'was',
+    'were', 'be', 'by', 'with', 'what', 'who', 'whom', 'when', 'where', 'which', 'why', 'how',
+    'do', 'does', 'did', 'tell', 'me', 'about', 'explain', 'define', 'describe', 'please', 'it',
+}
+# Reciprocal rank fusion constant
+RRF_K = 60
+# Cosine similarity a vector hit needs to count when full-text search did not also find the
+# article; weaker vector hits only re-rank BM25 hits, so a query the index cannot answer
+# comes back empty (and local_then_wikipedia falls back to Wikipedia)
+VECTOR_MIN_SCORE = 0.5
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings (feature hashing), no network needed"""
+
+    def __init__(self, size=768):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.size
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def iter_documents(path):
+    """Yield {'title', 'text', 'url'} from a dump file or a folder of files.
+
+    .jsonl/.json files hold one article per line (WikiExtractor --json or the MediaWiki
+    extracts API shape: title plus text/extract, optional url/pageid); .txt/.md files
+    are one article each, titled by file name.
+    """
+    if os.path.isdir(path):
+        files = sorted(
+            f for pattern in ('*.jsonl', '*.json', '*.txt', '*.md')
+            for f in glob.glob(os.path.join(path, '**', pattern), recursive=True)
+        )
+    else:
+        files = [path]
+
+    for file_path in files:
+        if file_path.endswith(('.jsonl', '.json')):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping malformed line in %s", file_path)
+                        continue
+                    text = record.get('text') or record.get('extract') or ''
+                    title = record.get('title') or ''
+                    if not text.strip() or not title:
+                        continue
+                    url = record.get('url') or ''
+                    page_id = record.get('pageid') or record.get('id')
+                    if not url and page_id:
+                        url = f"https://en.wikipedia.org/?curid={page_id}"
+                    yield {'title': title, 'text': text, 'url': url}
+        else:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            if text.strip():
+                title = os.path.splitext(os.path.basename(file_path))[0].replace('_', ' ')
+                yield {'title': title, 'text': text, 'url': ''}
+
+
+def build_index(paths, index_dir=KNOWLEDGE_INDEX_DIR, dim=DEFAULT_DIM, batch_size=1000):
+    """
+    (Re)build the local knowledge index from dump files / folders; returns the article count.
+    The new index is written next to index_dir and swapped in once complete, so searches
+    keep using the current index while it builds
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix='.knowledge_build_', dir=os.path.dirname(os.path.abspath(index_dir)))
+    try:
+        count = _write_index(paths, build_dir, dim, batch_size)
+        # Vectors first: get_index reopens the index when the database file changes, by
+        # which time the matching vectors are already in place
+        os.replace(os.path.join(build_dir, VECTORS_NAME), os.path.join(index_dir, VECTORS_NAME))
+        os.replace(os.path.join(build_dir, DB_NAME), os.path.join(index_dir, DB_NAME))
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    _reset_index()
+    return count
+
+
+def _write_index(paths, build_dir, dim, batch_size):
+    db_path = os.path.join(build_dir, DB_NAME)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE docs (id INTEGER PRIMARY KEY, title TEXT NOT NULL, url TEXT, text TEXT NOT NULL);
+        CREATE VIRTUAL TABLE docs_fts USING fts5(title, text, content='docs', content_rowid='id', tokenize='porter unicode61');
+    """)
+    conn.execute("INSERT INTO meta VALUES ('dim', ?)", (str(dim),))
+
+    embeddings = HashingEmbeddings(dim)
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    count = 0
+    batch = []
+
+    def flush():
+        rows = [(count - len(batch) + i + 1, d['title'], d['url'], d['text']) for i, d in enumerate(batch)]
+        conn.executemany("INSERT INTO docs (id, title, url, text) VALUES (?, ?, ?, ?)", rows)
+        vectors = np.array(
+            embeddings.embed_documents([f"{d['title']}\n{d['text'][:VECTOR_TEXT_CHARS]}" for d in batch]),
+            dtype=np.float32,
+        )
+        index.add_with_ids(vectors, np.array([row[0] for row in rows], dtype=np.int64))
+        batch.clear()
+
+    for path in paths:
+        for document in iter_documents(path):
+            batch.append(document)
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+                if count % (batch_size * 10) == 0:
+                    logger.info("Indexed %s articles", count)
+    if batch:
+        flush()
+
+    conn.execute("INSERT INTO docs_fts(docs_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+    faiss.write_index(index, os.path.join(build_dir, VECTORS_NAME))
+    return count
+
+
+class LocalKnowledgeIndex:
+    """Read-only handle on a built index; one per process, shared by request threads"""
+
+    def __init__(self, index_dir=KNOWLEDGE_INDEX_DIR):
+        self.db_path = os.path.join(index_dir, DB_NAME)
+        # build_index swaps in a new database file; get_index compares this to notice it
+        self.db_inode = os.stat(self.db_path).st_ino
+        self.vectors = faiss.read_index(os.path.join(index_dir, VECTORS_NAME))
+        self._local = threading.local()
+        dim = int(self._conn().execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()[0])
+        self.embeddings = HashingEmbeddings(dim)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _ranked(self, match, limit, deadline=None):
+        conn = self._conn()
+        if deadline is not None:
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            rows = conn.execute(
+                "SELECT rowid FROM docs_fts WHERE docs_fts MATCH ? ORDER BY bm25(docs_fts, 5.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                raise
+            logger.info("Local knowledge full-text search over budget for %r", match)
+            return []
+        finally:
+            if deadline is not None:
+                conn.set_progress_handler(None, 0)
+        return [row[0] for row in rows]
+
+    def _fts_ids(self, tokens, limit):
+        """BM25 hits: title matches first (selective), then body matches within FTS_BUDGET_MS"""
+        quoted = [f'"{token}"' for token in tokens]
+        ids = self._ranked(f"title : ({' OR '.join(quoted)})", limit)
+        if len(ids) < limit:
+            deadline = time.perf_counter() + FTS_BUDGET_MS / 1000
+            for doc_id in self._ranked(' '.join(quoted), limit, deadline):
+                if doc_id not in ids:
+                    ids.append(doc_id)
+        return ids[:limit]
+
+    def _vector_ids(self, tokens, limit, fts_ids):
+        """Vector hits that full-text search agrees with, or that score at least VECTOR_MIN_SCORE"""
+        vector = np.array([self.embeddings.embed_query(' '.join(tokens))], dtype=np.float32)
+        scores, ids = self.vectors.search(vector, limit)
+        return [
+            int(i) for i, score in zip(ids[0], scores[0])
+            if i != -1 and score > 0 and (int(i) in fts_ids or score >= VECTOR_MIN_SCORE)
+        ]
+
+    def search(self, query, limit=2):
+        """Hybrid search: reciprocal rank fusion of BM25 and vector rankings"""
+        tokens = [t for t in re.findall(r"\w+", query.lower()) if t not in STOPWORDS]
+        if not tokens:
+            return []
+        fts_ids = self._fts_ids(tokens, CANDIDATES)
+        fused = {}
+        for ranking in (fts_ids, self._vector_ids(tokens, CANDIDATES, set(fts_ids))):
+            for rank, doc_id in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:limit]
+        if not top_ids:
+            return []
+
+        placeholders = ','.join('?' * len(top_ids))
+        rows = self._conn().execute(
+            f"SELECT id, title, url, text FROM docs WHERE id IN ({placeholders})", top_ids
+        ).fetchall()
+        by_id = {row[0]: {'pageid': row[0], 'title': row[1], 'url': row[2], 'text': row[3]} for row in rows}
+        return [by_id[doc_id] for doc_id in top_ids if doc_id in by_id]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _reset_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def get_index():
+    """Lazily open the local index, reopening it after a rebuild; None when it has not been built"""
+    global _index
+    try:
+        db_inode = os.stat(os.path.join(KNOWLEDGE_INDEX_DIR, DB_NAME)).st_ino
+    except FileNotFoundError:
+        return None
+    if _index is None or _index.db_inode != db_inode:
+        with _index_lock:
+            if _index is None or _index.db_inode != db_inode:
+                if not os.path.exists(os.path.join(KNOWLEDGE_INDEX_DIR, VECTORS_NAME)):
+                    return None
+                # Searches already holding the previous index finish on its open files
+                _index = LocalKnowledgeIndex(KNOWLEDGE_INDEX_DIR)
+    return _index
+
+
+def search_local_knowledge(query):
+    """Same result shape as search_wikipedia, answered entirely in-process"""
+    from .wikipedia_utils import build_context
+
+    index = get_index()
+    if index is None:
+        return {'context': '', 'sources': []}
+    with timed('knowledge_bot.local'):
+        results = index.search(query)
+    if not results:
+        return {'context': '', 'sources': []}
+    return build_context(results, {r['pageid']: r['text'] for r in results})
+
+
+def search_knowledge(query, extract_topic=True):
+    """Dispatch to the configured knowledge backend (wikipedia, local, or local with wikipedia fallback)"""
+    from .wikipedia_utils import search_wikipedia
+
+    if KNOWLEDGE_BACKEND in ('local', 'local_then_wikipedia'):
+        context = search_local_knowledge(query)
+        if context.get('context') or KNOWLEDGE_BACKEND == 'local':
+            return context
+    return search_wikipedia(query, extract_topic=extract_topic)
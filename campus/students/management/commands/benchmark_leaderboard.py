@@ -0,0 +1,172 @@
+"""
+Benchmark leaderboard computation on a synthetic dataset.
+
+    python manage.py benchmark_leaderboard
+    python manage.py benchmark_leaderboard --students 10000 --attempts 8 --compare-legacy
+
+Times the full rebuild of the materialised leaderboard, incremental updates for new
+attempts and the leaderboard read itself.
+
+The synthetic users, quizzes and attempts are created inside a transaction that is
+rolled back afterwards, so the database is left untouched.
+"""
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+def legacy_leaderboard_scores():
+    """Per-student recomputation the leaderboard used originally (~5 queries per student), rules included"""
+    from authentication.models import User
+    from teachers.models import QuizAttempt
+
+    scores = {}
+    for student in User.objects.filter(role='student'):
+        attempts = QuizAttempt.objects.filter(student=student, completed_at__isnull=False)
+        total_quizzes = attempts.count()
+        if total_quizzes == 0:
+            continue
+        total_score = sum([attempt.score for attempt in attempts])
+        total_possible = sum([attempt.total_points for attempt in attempts])
+        avg_percentage = (total_score / total_possible * 100) if total_possible > 0 else 0
+        # The original rule: an attempt counted as perfect when its score equalled the
+        # student's total possible points over all attempts, not the attempt's own
+        perfect_scores = attempts.filter(score=total_possible).count()
+        recent_attempts = attempts.order_by('-completed_at')[:5]
+        recent_avg = 0
+        if recent_attempts.exists():
+            recent_score = sum([a.score for a in recent_attempts])
+            recent_possible = sum([a.total_points for a in recent_attempts])
+            recent_avg = (recent_score / recent_possible * 100) if recent_possible > 0 else 0
+        engagement_score = (
+            avg_percentage * 0.5 +
+            (perfect_scores / total_quizzes * 100) * 0.2 +
+            recent_avg * 0.2 +
+            min(total_quizzes * 2, 10)
+        )
+        scores[student.pk] = round(engagement_score, 2)
+    return scores
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time build_leaderboard_data (and optionally the legacy per-student loop) on synthetic students"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--attempts', type=int, default=6, help="Maximum completed attempts per student")
+        parser.add_argument('--quizzes', type=int, default=20)
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--compare-legacy', action='store_true',
+                            help="Also time the old per-student loop and check both give the same scores")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # leaderboard_utils configures Gemini at import time; it never makes a request here
+        os.environ.setdefault('API_KEY', 'offline-benchmark')
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic data rolled back")
+        finally:
+            from students.leaderboard_store import invalidate_leaderboard
+            # The cached leaderboard read above holds the synthetic students
+            invalidate_leaderboard()
+
+    def seed(self, options):
+        from authentication.models import User
+        from teachers.models import Subject, Quiz, QuizAttempt
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        teacher = User.objects.create(username='bench_teacher', role='teacher')
+        subject = Subject.objects.create(name='Benchmark', teacher=teacher)
+        quizzes = Quiz.objects.bulk_create([
+            Quiz(title=f'Bench quiz {i}', subject=subject, created_by=teacher)
+            for i in range(options['quizzes'])
+        ])
+        students = User.objects.bulk_create([
+            User(username=f'bench_student_{i}', role='student') for i in range(options['students'])
+        ], batch_size=2000)
+
+        now = timezone.now()
+        attempts = []
+        for student in students:
+            for _ in range(rng.randint(0, options['attempts'])):
+                total_points = rng.choice([5, 10, 20])
+                attempts.append(QuizAttempt(
+                    quiz=rng.choice(quizzes),
+                    student=student,
+                    completed_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+                    score=rng.randint(0, total_points),
+                    total_points=total_points,
+                ))
+        QuizAttempt.objects.bulk_create(attempts, batch_size=5000)
+        self.stdout.write(
+            f"Seeded {len(students)} students, {len(attempts)} attempts in {time.perf_counter() - started:.1f}s"
+        )
+
+    def timed_runs(self, label, func, runs):
+        timings = []
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"{label:<24} best={min(timings) * 1000:8.1f} ms  mean={sum(timings) / len(timings) * 1000:8.1f} ms  "
+            f"queries={len(queries)}"
+        )
+        return result
+
+    def run(self, options):
+        from teachers.models import QuizAttempt
+        from students.leaderboard_store import rebuild_entries, record_attempt
+        from students.leaderboard_utils import build_leaderboard_data, get_leaderboard_data
+
+        self.timed_runs('rebuild_entries', rebuild_entries, 1)
+
+        # Fold extra attempts in one at a time, as submit_quiz does
+        samples = list(QuizAttempt.objects.filter(student__username__startswith='bench_student_')
+                       .select_related('student')[:200])
+        new_attempts = QuizAttempt.objects.bulk_create([
+            QuizAttempt(quiz_id=a.quiz_id, student=a.student, completed_at=timezone.now(),
+                        score=a.score, total_points=a.total_points)
+            for a in samples
+        ])
+        started = time.perf_counter()
+        for attempt in new_attempts:
+            record_attempt(attempt)
+        if new_attempts:
+            per_attempt = (time.perf_counter() - started) / len(new_attempts) * 1000
+            self.stdout.write(f"{'record_attempt':<24} mean={per_attempt:8.2f} ms per submission")
+
+        leaderboard = self.timed_runs('build_leaderboard_data', build_leaderboard_data, options['runs'])
+        self.timed_runs('cached leaderboard read', get_leaderboard_data, options['runs'])
+        self.stdout.write(f"{len(leaderboard)} ranked students")
+
+        if options['compare_legacy']:
+            legacy = self.timed_runs('legacy per-student loop', legacy_leaderboard_scores, 1)
+            current = {entry['student'].pk: entry['engagement_score'] for entry in leaderboard}
+            mismatched = [pk for pk in legacy if legacy[pk] != current.get(pk)]
+            if mismatched or len(legacy) != len(current):
+                # Expected wherever the two rules count a student's perfect attempts
+                # differently: they are now counted per attempt (score == total_points)
+                self.stdout.write(self.style.WARNING(
+                    f"Scores differ from the original perfect-score rule for {len(mismatched)} students"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS("Engagement scores match the per-student recomputation"))
@@ -0,0 +1,120 @@
+"""
+Offline benchmark for the PDF chat pipeline.
+
+    python manage.py benchmark_rag
+    python manage.py benchmark_rag --source pdfs --chunk-size 4000 --chunk-overlap 400 -k 4
+    python manage.py benchmark_rag --recordings query_vectors.json --llm-latency-ms 800 --json out.json
+    python manage.py benchmark_rag --source indexes --questions questions.json --recordings query_vectors.json
+
+Hit-rate counts questions whose answer passage is in one of the k retrieved chunks:
+
+    paraphrased  passages sampled from the chunks, rewritten as questions with only some
+                 of their words, in another order
+    held_out     questions from --questions ({pdf hash: [{"question": ..., "answer":
+                 passage from the PDF}]})
+    verbatim     (pdfs) the sampled passages themselves; near 100% by construction
+    recorded     (indexes) held-out questions searched against the stored Gemini vectors
+                 with the real model's query embedding (--recordings: {question:
+                 embedding}, from embed_query)
+
+The paraphrased and held-out rates use the offline hashing embedder; for the checked-in
+indexes the chunks are re-embedded with it. Documents with no more than k chunks return
+every chunk for any question, so they are flagged and left out of the hit-rates.
+"""
+import os
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF chat retrieval (per-stage p50/p95 and hit-rate) with fake LLM/embedding backends"
+    # System checks import every URLconf (and with it the Gemini clients); not needed offline
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['indexes', 'pdfs', 'both'], default='both',
+                            help="Checked-in faiss_index_* directories, PDFs re-indexed from media/, or both")
+        parser.add_argument('-k', type=int, default=None, help="Chunks retrieved per question (default: RETRIEVAL_K)")
+        parser.add_argument('--queries', type=int, default=5, help="Sampled questions per document")
+        parser.add_argument('--chunk-size', type=int, default=15000)
+        parser.add_argument('--chunk-overlap', type=int, default=2000)
+        parser.add_argument('--recordings', help="JSON file of {query text: embedding} recorded from the real model")
+        parser.add_argument('--questions', help="JSON file of held-out questions and answer passages per PDF hash")
+        parser.add_argument('--llm-latency-ms', type=int, default=0, help="Simulated generation latency")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help="Also write the full results to this file")
+
+    def handle(self, *args, **options):
+        # students.utils builds a Gemini client at import time; it never makes a request here
+        os.environ.setdefault('API_KEY', 'offline-benchmark')
+        from students.benchmark_utils import (
+            HashingEmbeddings, RecordedEmbeddings, FakeLLM, load_questions,
+            benchmark_checked_in_indexes, benchmark_media_pdfs,
+        )
+        from students.utils import RETRIEVAL_K
+
+        k = options['k'] or RETRIEVAL_K
+        llm = FakeLLM(options['llm_latency_ms'])
+        hashing = HashingEmbeddings()
+        results = []
+
+        for name in ('recordings', 'questions'):
+            if options[name] and not os.path.exists(options[name]):
+                raise CommandError(f"{name.capitalize()} file not found: {options[name]}")
+        questions = load_questions(options['questions']) if options['questions'] else None
+
+        if options['source'] in ('indexes', 'both'):
+            if options['recordings']:
+                embeddings = RecordedEmbeddings.from_file(options['recordings'], hashing)
+            else:
+                embeddings = RecordedEmbeddings(fallback=hashing)
+            results.append(benchmark_checked_in_indexes(
+                settings.BASE_DIR, settings.MEDIA_ROOT, embeddings, llm,
+                k=k, queries_per_doc=options['queries'], seed=options['seed'], questions=questions,
+            ))
+
+        if options['source'] in ('pdfs', 'both'):
+            results.append(benchmark_media_pdfs(
+                settings.MEDIA_ROOT, hashing, llm, k=k, queries_per_doc=options['queries'],
+                chunk_size=options['chunk_size'], chunk_overlap=options['chunk_overlap'],
+                seed=options['seed'], questions=questions,
+            ))
+
+        for result in results:
+            self._print_result(result)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, default=str)
+            self.stdout.write(f"Results written to {options['json_path']}")
+
+    def _print_result(self, result):
+        title = f"Source: {result['source']} (k={result['k']}"
+        if 'chunk_size' in result:
+            title += f", chunk_size={result['chunk_size']}, overlap={result['chunk_overlap']}"
+        title += ")"
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(f"  {'stage':<12}{'count':>7}{'mean ms':>12}{'p50 ms':>12}{'p95 ms':>12}")
+        for stage, row in result['stages'].items():
+            self.stdout.write(
+                f"  {stage:<12}{row['count']:>7}{row['mean_ms']:>12.3f}{row['p50_ms']:>12.3f}{row['p95_ms']:>12.3f}"
+            )
+        if result['hit_rate']:
+            rates = ', '.join(
+                f"{kind} {rate:.1%} ({result['queries'][kind]})" for kind, rate in result['hit_rate'].items()
+                if rate is not None
+            )
+            self.stdout.write(f"  hit-rate@{result['k']}: {rates}")
+        else:
+            self.stdout.write("  hit-rate: no documents with more than k chunks")
+        if result['skipped']:
+            self.stdout.write(f"  {result['skipped']} document(s) with no more than k={result['k']} chunks left out")
+        for doc in result['documents']:
+            name = doc.get('index') or os.path.relpath(doc['pdf'], settings.MEDIA_ROOT)
+            rates = 'only timed (chunks <= k)' if doc['trivial'] else ' '.join(
+                f"{kind}={rate}" for kind, rate in doc['hit_rate'].items()
+            )
+            self.stdout.write(f"    {name[:60]:<60} chunks={doc['chunks']:<5} {rates}")
+        self.stdout.write("")
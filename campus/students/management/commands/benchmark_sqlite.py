@@ -0,0 +1,206 @@
+"""
+Benchmark SQLite journal settings under mixed chat polling and quiz submission load.
+
+    python manage.py benchmark_sqlite
+    python manage.py benchmark_sqlite --readers 32 --writers 8 --duration 20
+
+Migrates and seeds a scratch SQLite database (teacher, quiz, chat threads), then for
+each configuration runs N reader threads polling get_messages (with since_id, as the
+chat page does) while M writer threads post to submit_quiz for a fixed time, each on a
+fresh copy of the seeded file:
+
+    rollback journal  Django's defaults (DELETE journal, synchronous=FULL, DEFERRED transactions)
+    wal               journal_mode=WAL only
+    tuned             settings.SQLITE_OPTIONS (WAL, synchronous=NORMAL, busy_timeout, mmap,
+                      cache_size, IMMEDIATE transactions)
+
+Each writer thread drains the stored submissions inline, as the writer of its own
+worker process would. Reports requests/s, latency percentiles and errors (reads answered with
+an error, submissions acknowledged but never written). The configured database is not
+touched.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.test import RequestFactory, override_settings
+
+MODES = [
+    ('rollback journal', {'init_command': 'PRAGMA journal_mode=DELETE'}),
+    ('wal', {'init_command': 'PRAGMA journal_mode=WAL'}),
+    ('tuned', settings.SQLITE_OPTIONS),
+]
+
+
+class InlineWriter:
+    """Stands in for the submission writer thread: the caller drains the submissions itself"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite journal modes and pragmas with chat readers and quiz submission writers"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=16, help="Threads polling get_messages")
+        parser.add_argument('--writers', type=int, default=4, help="Threads posting submit_quiz")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per configuration")
+        parser.add_argument('--poll-interval', type=float, default=0.05, help="Pause between a reader's polls")
+        parser.add_argument('--messages', type=int, default=40, help="Chat messages per reader thread")
+
+    def handle(self, *args, **options):
+        # leaderboard_utils configures Gemini at import time; it never makes a request here
+        os.environ.setdefault('API_KEY', 'offline-benchmark')
+
+        # Scratch quiz and user ids must not reach a cache shared with the real database
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-sqlite',
+        }}), tempfile.TemporaryDirectory() as scratch:
+            seeded = os.path.join(scratch, 'seeded.sqlite3')
+            self.use_database(seeded, MODES[0][1])
+            call_command('migrate', verbosity=0)
+            fixtures = self.seed(options)
+
+            results = {}
+            for mode, db_options in MODES:
+                path = os.path.join(scratch, f'{len(results)}.sqlite3')
+                shutil.copy(seeded, path)
+                self.use_database(path, db_options)
+                results[mode] = self.measure(fixtures, options)
+            connections.close_all()
+
+        self.stdout.write(
+            f"\n{'configuration':<18}{'reads/s':>9}{'read p50':>10}{'p95':>9}{'p99':>9}{'errors':>8}"
+            f"{'writes/s':>10}{'write p50':>11}{'p95':>9}{'p99':>9}{'failed':>8}"
+        )
+        for mode, (reads, writes) in results.items():
+            self.stdout.write(
+                f"{mode:<18}{reads['rate']:>9.0f}{reads['p50']:>8.1f}ms{reads['p95']:>7.1f}ms{reads['p99']:>7.1f}ms"
+                f"{reads['errors']:>8}{writes['rate']:>10.1f}{writes['p50']:>9.1f}ms{writes['p95']:>7.1f}ms"
+                f"{writes['p99']:>7.1f}ms{writes['errors']:>8}"
+            )
+
+    def use_database(self, path, db_options):
+        """Point the default alias (for every thread) at a scratch SQLite file"""
+        connections[DEFAULT_DB_ALIAS].close()
+        del connections[DEFAULT_DB_ALIAS]
+        connections.settings[DEFAULT_DB_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': dict(db_options),
+        }
+        connections.configure_settings(connections.settings)
+
+    def seed(self, options):
+        from authentication.models import User
+        from teachers.models import Subject, Quiz, Question, ChatMessage
+
+        teacher = User.objects.create(username='bench_teacher', role='teacher')
+        subject = Subject.objects.create(name='SQLite benchmark', teacher=teacher)
+        quiz = Quiz.objects.create(title='SQLite benchmark', subject=subject, created_by=teacher, question_count=10)
+        Question.objects.bulk_create([
+            Question(quiz=quiz, text=f'Question {i}', question_type='multiple_choice',
+                     options=['a', 'b', 'c', 'd'], correct_answer=str(i % 4), order=i)
+            for i in range(10)
+        ])
+        readers = User.objects.bulk_create([
+            User(username=f'bench_reader_{i}', role='student') for i in range(options['readers'])
+        ])
+        writers = User.objects.bulk_create([
+            User(username=f'bench_writer_{i}', role='student') for i in range(options['writers'])
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(sender=teacher, receiver=student, message=f'Message {i}') if i % 2 else
+            ChatMessage(sender=student, receiver=teacher, message=f'Message {i}', is_read=True)
+            for student in readers for i in range(options['messages'])
+        ])
+        return {
+            'teacher': teacher, 'quiz': quiz, 'readers': readers, 'writers': writers,
+            'question_ids': [str(question_id) for question_id in quiz.questions.values_list('id', flat=True)],
+        }
+
+    def measure(self, fixtures, options):
+        from teachers.models import QuizAttempt
+        from teachers.views import get_messages
+        from students.views import submit_quiz
+
+        factory = RequestFactory()
+        teacher, quiz = fixtures['teacher'], fixtures['quiz']
+        deadline = time.perf_counter() + options['duration']
+        read_latencies, write_latencies = [], []
+        read_errors = []
+        acknowledged = []
+
+        def reader(student):
+            last_id = 0
+            try:
+                while time.perf_counter() < deadline:
+                    # Polls like the chat page: only messages after the last one seen
+                    request = factory.get(f'/teacher/chat/get/{teacher.id}/', {'since_id': last_id})
+                    request.user = student
+                    started = time.perf_counter()
+                    response = get_messages(request, teacher.id)
+                    read_latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        read_errors.append(response.status_code)
+                    else:
+                        last_id = max([last_id] + [m['id'] for m in json.loads(response.content)['messages']])
+                    time.sleep(options['poll_interval'])
+            finally:
+                close_old_connections()
+
+        def writer(student):
+            try:
+                while time.perf_counter() < deadline:
+                    answers = {question_id: str(hash((student.id, question_id, time.time())) % 4)
+                               for question_id in fixtures['question_ids']}
+                    request = factory.post(
+                        f'/student/quiz/submit/{quiz.id}/', content_type='application/json',
+                        data=json.dumps({'answers': answers, 'submission_token': uuid.uuid4().hex}),
+                    )
+                    request.user = student
+                    started = time.perf_counter()
+                    response = submit_quiz(request, quiz.id)
+                    write_latencies.append(time.perf_counter() - started)
+                    if response.status_code == 202:
+                        acknowledged.append(student.id)
+            finally:
+                close_old_connections()
+
+        # Failed writes are counted below instead of logged one by one, and submissions
+        # must not schedule the Gemini suggestion refresh
+        with mock.patch('students.submission_queue._writer', InlineWriter()), \
+                mock.patch('students.leaderboard_utils.schedule_suggestion_refresh'), \
+                mock.patch.object(logging.getLogger('students.submission_queue'), 'disabled', True):
+            threads = [threading.Thread(target=reader, args=(student,)) for student in fixtures['readers']]
+            threads += [threading.Thread(target=writer, args=(student,)) for student in fixtures['writers']]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        written = QuizAttempt.objects.filter(quiz=quiz).count()
+        return (
+            self.summarise(read_latencies, elapsed, len(read_errors)),
+            self.summarise(write_latencies, elapsed, len(acknowledged) - written),
+        )
+
+    def summarise(self, latencies, elapsed, errors):
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+        return {
+            'rate': len(latencies) / elapsed, 'errors': errors,
+            'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+        }
@@ -0,0 +1,24 @@
+"""
+Recompute every LeaderboardEntry from completed quiz attempts.
+
+    python manage.py rebuild_leaderboard
+
+Run after bulk imports or deletions of attempts, or whenever the materialised
+leaderboard may have drifted from the attempts table.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialised leaderboard from completed quiz attempts"
+
+    def handle(self, *args, **options):
+        from students.leaderboard_store import rebuild_entries
+
+        started = time.perf_counter()
+        count = rebuild_entries()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {count} leaderboard entries in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_remove_studentprofile_avatar_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WikipediaArticleCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('extract', models.TextField(blank=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Wikipedia Article Cache',
+            },
+        ),
+        migrations.CreateModel(
+            name='WikipediaSearchCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=255, unique=True)),
+                ('search_term', models.CharField(blank=True, max_length=255)),
+                ('results', models.JSONField(default=list)),
+                ('fetched_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Wikipedia Search Cache',
+            },
+        ),
+    ]
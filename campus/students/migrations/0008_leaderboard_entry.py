@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import RowNumber
+
+
+# Frozen copy of LeaderboardEntry.RECENT_ATTEMPTS and refresh_scores as of this migration
+RECENT_ATTEMPTS = 5
+
+
+def entry_scores(total_quizzes, total_score, total_possible, perfect_scores, recent_scores):
+    """avg_percentage, recent_avg and engagement_score for one student's totals"""
+    avg_percentage = (total_score / total_possible * 100) if total_possible > 0 else 0
+    recent_score = sum(score for score, _ in recent_scores)
+    recent_possible = sum(total for _, total in recent_scores)
+    recent_avg = (recent_score / recent_possible * 100) if recent_possible > 0 else 0
+    engagement_score = 0
+    if total_quizzes:
+        # Weighted combination: average 50%, perfect scores 20%, recent performance 20%, participation up to 10 points
+        engagement_score = round(
+            avg_percentage * 0.5 +
+            (perfect_scores / total_quizzes * 100) * 0.2 +
+            recent_avg * 0.2 +
+            min(total_quizzes * 2, 10), 2
+        )
+    return round(avg_percentage, 2), round(recent_avg, 2), engagement_score
+
+
+def build_leaderboard(apps, schema_editor):
+    """Fill the new table from existing attempts, with the same aggregation as rebuild_leaderboard"""
+    QuizAttempt = apps.get_model('teachers', 'QuizAttempt')
+    LeaderboardEntry = apps.get_model('students', 'LeaderboardEntry')
+    completed = QuizAttempt.objects.filter(
+        student__role='student', completed_at__isnull=False, score__isnull=False
+    )
+
+    totals = completed.order_by().values('student_id').annotate(
+        total_quizzes=models.Count('id'),
+        total_score=models.Sum('score'),
+        total_possible=models.Sum('total_points'),
+        perfect_scores=models.Count('id', filter=models.Q(score=models.F('total_points'))),
+    )
+    recent_scores = {}
+    recent_rows = completed.annotate(
+        recency=models.Window(RowNumber(), partition_by=[models.F('student_id')],
+                              order_by=models.F('completed_at').desc()),
+    ).filter(recency__lte=RECENT_ATTEMPTS).order_by('student_id', 'recency').values_list(
+        'student_id', 'score', 'total_points'
+    )
+    for student_id, score, total_points in recent_rows:
+        recent_scores.setdefault(student_id, []).append([score, total_points])
+
+    entries = []
+    for row in totals:
+        recent = recent_scores.get(row['student_id'], [])
+        avg_percentage, recent_avg, engagement_score = entry_scores(
+            row['total_quizzes'], row['total_score'], row['total_possible'], row['perfect_scores'], recent
+        )
+        entries.append(LeaderboardEntry(
+            **row, recent_scores=recent, avg_percentage=avg_percentage,
+            recent_avg=recent_avg, engagement_score=engagement_score,
+        ))
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0007_wikipedia_cache'),
+        ('teachers', '0009_quizattempt_fullscreen_exit_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_quizzes', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('total_possible', models.IntegerField(default=0)),
+                ('perfect_scores', models.IntegerField(default=0)),
+                ('recent_scores', models.JSONField(default=list)),
+                ('avg_percentage', models.FloatField(default=0)),
+                ('recent_avg', models.FloatField(default=0)),
+                ('engagement_score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard Entries',
+                'ordering': ['-engagement_score', 'student'],
+                'indexes': [models.Index(fields=['-engagement_score', 'student'], name='leaderboard_rank_idx')],
+            },
+        ),
+        migrations.RunPython(build_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0008_leaderboard_entry'),
+        ('teachers', '0011_hot_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chathistory',
+            index=models.Index(fields=['student', 'pdf_note', 'created_at'], name='chat_history_thread_idx'),
+        ),
+    ]
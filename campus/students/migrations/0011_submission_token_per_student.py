@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_pending_submission'),
+        ('teachers', '0015_submission_token_per_student'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingsubmission',
+            name='token',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='pendingsubmission',
+            constraint=models.UniqueConstraint(fields=('student', 'token'), name='pending_student_token_uniq'),
+        ),
+    ]
@@ -1,6 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from authentication.models import User
-from teachers.models import PDFNote
+from teachers.models import PDFNote, Quiz
 
 class ChatHistory(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_histories')
@@ -14,6 +15,9 @@ class ChatHistory(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['student', 'pdf_note', 'created_at'], name='chat_history_thread_idx'),
+        ]
         verbose_name_plural = "Chat Histories"
 
 class KnowledgeBotHistory(models.Model):
@@ -88,3 +92,110 @@ class StudentProfile(models.Model):
     
     class Meta:
         verbose_name_plural = "Student Profiles"
+
+class WikipediaSearchCache(models.Model):
+    """Cached Wikipedia search hits for a normalised knowledge bot query"""
+    term = models.CharField(max_length=255, unique=True)
+    search_term = models.CharField(max_length=255, blank=True)  # Topic extracted by Gemini
+    results = models.JSONField(default=list)  # [{'title': ..., 'pageid': ...}, ...]
+    fetched_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return self.term
+    
+    class Meta:
+        verbose_name_plural = "Wikipedia Search Cache"
+
+class WikipediaArticleCache(models.Model):
+    """Cached plain-text extract of a Wikipedia article"""
+    page_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=255)
+    extract = models.TextField(blank=True)
+    fetched_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.title} ({self.page_id})"
+    
+    class Meta:
+        verbose_name_plural = "Wikipedia Article Cache"
+
+class LeaderboardEntry(models.Model):
+    """Materialised leaderboard row, updated incrementally as quiz attempts are submitted"""
+    RECENT_ATTEMPTS = 5
+    
+    student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='leaderboard_entry')
+    total_quizzes = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    total_possible = models.IntegerField(default=0)
+    perfect_scores = models.IntegerField(default=0)
+    recent_scores = models.JSONField(default=list)  # [[score, total_points], ...] newest first, at most 5
+    avg_percentage = models.FloatField(default=0)
+    recent_avg = models.FloatField(default=0)
+    engagement_score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def add_attempt(self, score, total_points):
+        self.total_quizzes += 1
+        self.total_score += score
+        self.total_possible += total_points
+        if score == total_points:
+            self.perfect_scores += 1
+        self.recent_scores = ([[score, total_points]] + list(self.recent_scores))[:self.RECENT_ATTEMPTS]
+        self.refresh_scores()
+    
+    def refresh_scores(self):
+        """Recompute the derived percentages and engagement score from the running totals"""
+        self.avg_percentage = round(self.total_score / self.total_possible * 100, 2) if self.total_possible > 0 else 0
+        recent_score = sum(score for score, _ in self.recent_scores)
+        recent_possible = sum(total for _, total in self.recent_scores)
+        recent_avg = (recent_score / recent_possible * 100) if recent_possible > 0 else 0
+        self.recent_avg = round(recent_avg, 2)
+        
+        if self.total_quizzes == 0:
+            self.engagement_score = 0
+            return
+        avg_percentage = (self.total_score / self.total_possible * 100) if self.total_possible > 0 else 0
+        # Weighted combination: average 50%, perfect scores 20%, recent performance 20%, participation up to 10 points
+        engagement_score = (
+            avg_percentage * 0.5 +
+            (self.perfect_scores / self.total_quizzes * 100) * 0.2 +
+            recent_avg * 0.2 +
+            min(self.total_quizzes * 2, 10)
+        )
+        self.engagement_score = round(engagement_score, 2)
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.engagement_score}"
+    
+    class Meta:
+        ordering = ['-engagement_score', 'student']
+        indexes = [
+            models.Index(fields=['-engagement_score', 'student'], name='leaderboard_rank_idx'),
+        ]
+        verbose_name_plural = "Leaderboard Entries"
+
+class PendingSubmission(models.Model):
+    """A scored quiz submission stored until the submission writer turns it into a QuizAttempt"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('failed', 'Failed'),
+    ]
+    
+    token = models.CharField(max_length=64)  # Client idempotency key, becomes QuizAttempt.submission_token
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_submissions')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='pending_submissions')
+    submission = models.JSONField(encoder=DjangoJSONEncoder)  # Payload passed to accept_submission
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.quiz.title} ({self.status})"
+    
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'token'], name='pending_student_token_uniq'),
+        ]
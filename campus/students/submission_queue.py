@@ -0,0 +1,214 @@
+"""
+Queued, idempotent quiz submissions - submit_quiz scores the answers and stores them as a
+PendingSubmission row, while a single writer thread drains that table in batches, so a
+burst of submissions at a deadline never piles up on the attempt and leaderboard writes,
+and a restart loses nothing that was acknowledged. With QUIZ_SUBMISSION_QUEUE off (the
+default on SQLite, where the stored row costs more than it saves) the attempt is
+written on the request instead; either way a token is applied once per student
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction, IntegrityError, OperationalError
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+WRITE_RETRIES = 5
+DRAIN_BATCH_SIZE = 100
+
+# One worker: submissions are written strictly one after another
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quiz-submissions')
+
+
+def get_submission_status(student_id, token):
+    """Status dict for a student's submission token ('queued', 'done' or 'failed'), or None when unknown"""
+    from teachers.models import QuizAttempt
+    from .models import PendingSubmission
+
+    # The saved attempt or the stored submission is the record; both lookups use the
+    # (student, token) unique indexes
+    attempt = QuizAttempt.objects.filter(submission_token=token, student_id=student_id).only('id').first()
+    if attempt:
+        return {'status': 'done', 'attempt_id': attempt.id}
+    pending = PendingSubmission.objects.filter(token=token, student_id=student_id).first()
+    if pending:
+        return {'status': pending.status, 'result': pending.submission['result'], 'error': pending.error}
+    return None
+
+
+def _written_status(attempt):
+    # The caller scores the answers of the first submission again for its result
+    return {'status': 'done', 'attempt_id': attempt.id, 'answers': attempt.answers}
+
+
+def store_submission(token, submission):
+    """
+    Durably store a scored submission for the writer; returns its status dict. A token
+    already written, or already queued, keeps its first submission
+    """
+    from teachers.models import QuizAttempt
+    from .models import PendingSubmission
+
+    attempt = QuizAttempt.objects.filter(submission_token=token, student_id=submission['student_id']).only('id', 'answers').first()
+    if attempt:
+        return _written_status(attempt)
+
+    # Tokens are only unique per student; when the same student's retry races this one,
+    # get_or_create catches the IntegrityError and returns the row the other request stored
+    pending, created = PendingSubmission.objects.get_or_create(
+        token=token, student_id=submission['student_id'],
+        defaults={'quiz_id': submission['quiz_id'], 'submission': submission},
+    )
+    if not created and pending.status == 'failed':
+        # Retrying a failed write
+        pending.status = 'queued'
+        pending.error = ''
+        pending.save(update_fields=['status', 'error'])
+    return {'status': 'queued', 'result': pending.submission['result']}
+
+
+def accept_submission(token, submission):
+    """Queue a scored submission for the writer or, with QUIZ_SUBMISSION_QUEUE off, write it now"""
+    if not getattr(settings, 'QUIZ_SUBMISSION_QUEUE', True):
+        return write_submission(token, submission)
+    status = store_submission(token, submission)
+    if status['status'] != 'done':
+        # Also picks up submissions left queued by a worker process that stopped
+        _writer.submit(drain_pending_submissions)
+    return status
+
+
+def drain_pending_submissions():
+    """Write every queued submission in arrival order; returns how many were written"""
+    from .models import PendingSubmission
+
+    written = 0
+    try:
+        while True:
+            queued = list(
+                PendingSubmission.objects.filter(status='queued').order_by('id')
+                .values_list('student_id', 'token')[:DRAIN_BATCH_SIZE]
+            )
+            if not queued:
+                return written
+            # One write transaction per batch, so request threads storing submissions
+            # wait on the database lock once per batch rather than once per attempt
+            try:
+                written += len(retry_locked(_write_attempts, queued))
+            except Exception:
+                logger.warning("Writing %d queued submissions together failed; writing them one by one", len(queued))
+                for student_id, token in queued:
+                    if apply_submission(student_id, token):
+                        written += 1
+    finally:
+        # The writer thread keeps its connection between submissions for CONN_MAX_AGE
+        # (persistent PostgreSQL connections) and drops it once stale or broken
+        close_old_connections()
+
+
+def save_attempt(token, submission):
+    """Write a scored submission as a completed attempt and fold it into the leaderboard; call inside a transaction"""
+    from teachers.models import QuizAttempt
+    from teachers.analytics_utils import invalidate_teacher_summary
+    from .leaderboard_store import record_attempt
+    from .leaderboard_utils import schedule_suggestion_refresh
+
+    # Complete the in-progress attempt opened by take_quiz, or create a completed one
+    attempt, _ = QuizAttempt.objects.update_or_create(
+        quiz_id=submission['quiz_id'],
+        student_id=submission['student_id'],
+        completed_at__isnull=True,
+        defaults={
+            'completed_at': submission['completed_at'],
+            'score': submission['score'],
+            'total_points': submission['total_points'],
+            'answers': submission['answers'],
+            'tab_switch_count': submission['tab_switch_count'],
+            'fullscreen_exit_count': submission['fullscreen_exit_count'],
+            'submission_token': token,
+        }
+    )
+    record_attempt(attempt)
+    transaction.on_commit(schedule_suggestion_refresh)
+    transaction.on_commit(lambda: invalidate_teacher_summary(submission['teacher_id']))
+    return attempt
+
+
+def _write_attempts(queued):
+    """Write the stored submissions for (student_id, token) pairs in one transaction; returns the attempts"""
+    from teachers.models import QuizAttempt
+    from .models import PendingSubmission
+
+    # Save each attempt, fold it into the materialised leaderboard and remove the stored
+    # submission together
+    written = []
+    with transaction.atomic():
+        for student_id, token in queued:
+            pending = PendingSubmission.objects.select_for_update().filter(
+                student_id=student_id, token=token, status='queued'
+            ).first()
+            if pending is None:
+                # Written (or marked failed) by another writer in the meantime
+                continue
+            submission = {**pending.submission, 'completed_at': parse_datetime(pending.submission['completed_at'])}
+
+            # A token that was already written is not applied twice
+            attempt = QuizAttempt.objects.filter(submission_token=token, student_id=student_id).first()
+            if attempt is None:
+                attempt = save_attempt(token, submission)
+            pending.delete()
+            written.append(attempt)
+    return written
+
+
+def _write_submission(token, submission):
+    from teachers.models import QuizAttempt
+
+    with transaction.atomic():
+        # A token that was already written is not applied twice
+        attempt = QuizAttempt.objects.filter(submission_token=token, student_id=submission['student_id']).first()
+        if attempt:
+            return attempt, False
+        return save_attempt(token, submission), True
+
+
+def write_submission(token, submission):
+    """Write a scored submission on the calling thread, retrying while the database is locked; returns its status dict"""
+    attempt, created = retry_locked(_write_submission, token, submission)
+    if not created:
+        return _written_status(attempt)
+    return {'status': 'done', 'result': submission['result'], 'attempt_id': attempt.id}
+
+
+def retry_locked(write, *args):
+    """Run a write, retrying while the database is locked or another writer got there first"""
+    for retry in range(WRITE_RETRIES):
+        try:
+            return write(*args)
+        except IntegrityError:
+            # Another worker process wrote the same token first
+            if retry == WRITE_RETRIES - 1:
+                raise
+        except OperationalError as e:
+            if 'locked' not in str(e) or retry == WRITE_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2 ** retry)
+
+
+def apply_submission(student_id, token):
+    """Write one stored submission, retrying while the database is locked; returns the attempt or None"""
+    from .models import PendingSubmission
+
+    try:
+        written = retry_locked(_write_attempts, [(student_id, token)])
+        return written[0] if written else None
+    except Exception as e:
+        logger.exception("Quiz submission %s failed", token)
+        pending = PendingSubmission.objects.filter(student_id=student_id, token=token).first()
+        if pending:
+            pending.status = 'failed'
+            pending.error = str(e)
+            pending.save(update_fields=['status', 'error'])
+        return None
@@ -5,6 +5,7 @@ from PyPDF2 import PdfReader
 from docx import Document
 from pptx import Presentation
 import io
+from student_campus.telemetry import timed
 
 # Load .env from the campus directory
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -55,14 +56,16 @@ def summarize_text(text, summary_type="concise"):
         """
     
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
+        with timed('summarizer.generate', summary_type=summary_type, chars=len(text)):
+            response = client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=prompt
+            )
         return response.text
     except Exception as e:
         return f"Error generating summary: {str(e)}"
 
+@timed('summarizer.extract_pdf')
 def extract_text_from_pdf_file(pdf_file):
     """Extract text from uploaded PDF file"""
     try:
@@ -76,6 +79,7 @@ def extract_text_from_pdf_file(pdf_file):
     except Exception as e:
         return None
 
+@timed('summarizer.extract_docx')
 def extract_text_from_docx_file(docx_file):
     """Extract text from uploaded Word document"""
     try:
@@ -93,6 +97,7 @@ def extract_text_from_docx_file(docx_file):
     except Exception as e:
         return None
 
+@timed('summarizer.extract_pptx')
 def extract_text_from_pptx_file(pptx_file):
     """Extract text from uploaded PowerPoint presentation"""
     try:
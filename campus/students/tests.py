@@ -1,3 +1,486 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from urllib.parse import parse_qs, urlparse
+from unittest import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from authentication.models import User
+from student_campus.telemetry import timed, get_timing_snapshot, reset_timings
+from teachers.models import Subject, Quiz, Question, QuizAttempt
+from .leaderboard_store import record_attempt, get_ranked_entries, build_entries
+from . import local_knowledge, utils, wikipedia_cache, wikipedia_utils
+from .models import LeaderboardEntry, PendingSubmission, WikipediaSearchCache
+from .submission_queue import drain_pending_submissions
 
-# Create your tests here.
+
+class QuizListQueryCountTests(TestCase):
+    """The student quiz list must not issue queries per quiz"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        self.student = User.objects.create_user(username='student', password='pass', role='student')
+        self.other_student = User.objects.create_user(username='other', password='pass', role='student')
+        self.subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        self.client.force_login(self.student)
+
+    def add_quizzes(self, count):
+        for i in range(count):
+            quiz = Quiz.objects.create(title=f'Quiz {i}', subject=self.subject, created_by=self.teacher)
+            for order in range(4):
+                Question.objects.create(
+                    quiz=quiz, text=f'Q{order}', question_type='true_false',
+                    options=['True', 'False'], correct_answer='0', order=order
+                )
+            for student in (self.student, self.other_student):
+                QuizAttempt.objects.create(
+                    quiz=quiz, student=student, completed_at=timezone.now(), score=3, total_points=4
+                )
+
+    def get_quiz_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('quiz'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_quizzes(self):
+        self.add_quizzes(2)
+        _, few = self.get_quiz_page()
+
+        self.add_quizzes(8)
+        response, many = self.get_quiz_page()
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['completed_count'], 10)
+
+    def test_only_own_attempt_is_attached(self):
+        self.add_quizzes(1)
+        QuizAttempt.objects.filter(student=self.student).delete()
+
+        response, _ = self.get_quiz_page()
+
+        quiz = response.context['quizzes'][0]
+        self.assertIsNone(quiz.user_attempt)
+        self.assertEqual(quiz.question_count, 4)
+        self.assertEqual(response.context['completed_count'], 0)
+
+    def test_percentage_uses_question_count(self):
+        self.add_quizzes(1)
+
+        response, _ = self.get_quiz_page()
+
+        quiz = response.context['quizzes'][0]
+        self.assertEqual(quiz.user_attempt.student, self.student)
+        self.assertEqual(quiz.percentage, 75.0)
+
+
+class LeaderboardConsistencyTests(TestCase):
+    """Leaderboard entries must cover every student's full history, not just new attempts"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        self.subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=self.subject, created_by=self.teacher)
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='pass', role='student') for i in range(3)
+        ]
+        # History from before the table existed: three attempts each, no entries
+        for student in self.students:
+            for score in (2, 3, 4):
+                self.add_attempt(student, score)
+
+    def add_attempt(self, student, score):
+        return QuizAttempt.objects.create(
+            quiz=self.quiz, student=student, completed_at=timezone.now(), score=score, total_points=4
+        )
+
+    def backfill(self):
+        migration = import_module('students.migrations.0008_leaderboard_entry')
+        migration.build_leaderboard(apps, None)
+
+    def assert_matches_history(self):
+        expected = {entry.student_id: entry for entry in build_entries()}
+        stored = {entry.student_id: entry for entry in get_ranked_entries()}
+        self.assertEqual(set(stored), set(expected))
+        for student_id, entry in stored.items():
+            self.assertEqual(
+                (entry.total_quizzes, entry.total_score, entry.perfect_scores, entry.recent_scores,
+                 entry.engagement_score),
+                (expected[student_id].total_quizzes, expected[student_id].total_score,
+                 expected[student_id].perfect_scores, expected[student_id].recent_scores,
+                 expected[student_id].engagement_score),
+            )
+
+    def test_migration_fills_entries_from_existing_attempts(self):
+        self.backfill()
+
+        self.assertEqual(LeaderboardEntry.objects.count(), 3)
+        self.assert_matches_history()
+
+    def test_record_attempt_keeps_other_students_after_backfill(self):
+        self.backfill()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_attempt(self.add_attempt(self.students[0], 4))
+
+        self.assert_matches_history()
+        self.assertEqual(LeaderboardEntry.objects.get(student=self.students[0]).total_quizzes, 4)
+
+    def test_first_entry_starts_from_full_history(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = record_attempt(self.add_attempt(self.students[1], 4))
+
+        self.assertEqual((entry.total_quizzes, entry.total_score, entry.perfect_scores), (4, 13, 2))
+        self.assertEqual(entry.recent_scores[0], [4, 4])
+
+
+class LeaderboardPageTests(TestCase):
+    """Viewing the leaderboard reads cached AI tips; it never asks Gemini for them"""
+
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        self.student = User.objects.create_user(username='student', password='pass', role='student')
+        subject = Subject.objects.create(name='Biology', teacher=teacher)
+        quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=teacher)
+        record_attempt(QuizAttempt.objects.create(
+            quiz=quiz, student=self.student, completed_at=timezone.now(), score=3, total_points=4
+        ))
+        self.client.force_login(self.student)
+
+    def test_page_view_does_not_refresh_suggestions(self):
+        with mock.patch('students.leaderboard_utils.schedule_suggestion_refresh') as refresh, \
+                mock.patch('students.leaderboard_utils._get_model') as get_model:
+            response = self.client.get(reverse('leaderboard'))
+
+        self.assertEqual(response.status_code, 200)
+        refresh.assert_not_called()
+        get_model.assert_not_called()
+        # The local fallback stands in until the tips are precomputed
+        self.assertTrue(response.context['ai_suggestion'])
+        self.assertIsNone(response.context['overall_insights'])
+
+
+class TimedConcurrencyTests(SimpleTestCase):
+    """A timed() decorator shared by concurrent calls must time each call from its own start"""
+
+    def setUp(self):
+        reset_timings()
+        self.addCleanup(reset_timings)
+
+    def test_overlapping_calls_keep_their_own_start(self):
+        @timed('tests.overlap')
+        def wait(seconds):
+            time.sleep(seconds)
+
+        slow = threading.Thread(target=wait, args=(0.3,))
+        slow.start()
+        time.sleep(0.1)
+        # Starts while the slow call is running and finishes before it
+        wait(0.01)
+        slow.join()
+
+        snapshot = get_timing_snapshot()['tests.overlap']
+        self.assertEqual(snapshot['count'], 2)
+        self.assertGreaterEqual(snapshot['max_ms'], 300)
+        self.assertLess(snapshot['min_ms'], 100)
+
+
+@override_settings(QUIZ_SUBMISSION_QUEUE=True)
+class SubmissionTokenTests(TestCase):
+    """Quiz submissions are stored before they are acknowledged and written once per token"""
+
+    def setUp(self):
+        # Answer keys are cached per quiz id and version
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        self.student = User.objects.create_user(username='student', password='pass', role='student')
+        subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=self.teacher)
+        self.questions = [
+            Question.objects.create(quiz=self.quiz, text=f'Q{order}', question_type='true_false',
+                                    options=['True', 'False'], correct_answer='0', order=order)
+            for order in range(2)
+        ]
+        self.client.force_login(self.student)
+        # The writer drains inline, inside the test transaction, and submissions must not
+        # schedule the Gemini suggestion refresh
+        writer = mock.Mock()
+        writer.submit.side_effect = lambda fn, *args: fn(*args)
+        for patcher in (mock.patch('students.submission_queue._writer', writer),
+                        mock.patch('students.leaderboard_utils.schedule_suggestion_refresh')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, token, answer='0'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('submit_quiz', args=[self.quiz.id]), content_type='application/json',
+                data=json.dumps({'answers': {str(q.id): answer for q in self.questions}, 'submission_token': token}),
+            )
+
+    def status(self, token):
+        return self.client.get(reverse('quiz_submission_status', args=[token])).json()
+
+    def test_submission_is_stored_before_it_is_written(self):
+        with mock.patch('students.submission_queue._writer'):
+            response = self.submit('token-1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertTrue(PendingSubmission.objects.filter(token='token-1', status='queued').exists())
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        # A restarted writer picks the stored submission up
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(drain_pending_submissions(), 1)
+        attempt = QuizAttempt.objects.get(submission_token='token-1')
+        self.assertEqual(attempt.score, 2)
+        self.assertFalse(PendingSubmission.objects.exists())
+        self.assertEqual(self.status('token-1'), {'success': True, 'status': 'done', 'attempt_id': attempt.id})
+
+    def test_repeated_token_is_written_once(self):
+        first = self.submit('token-2').json()
+        second = self.submit('token-2', answer='1').json()
+
+        self.assertEqual(QuizAttempt.objects.filter(student=self.student).count(), 1)
+        self.assertEqual(LeaderboardEntry.objects.get(student=self.student).total_quizzes, 1)
+        self.assertEqual(second['score'], first['score'])
+        self.assertEqual(self.status('token-2')['status'], 'done')
+
+    def test_failed_write_is_retried_with_the_same_token(self):
+        with mock.patch('students.leaderboard_store.record_attempt', side_effect=RuntimeError('disk full')):
+            self.submit('token-3')
+        self.assertEqual(self.status('token-3'), {'success': True, 'status': 'failed', 'error': 'disk full'})
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        self.submit('token-3')
+
+        self.assertEqual(self.status('token-3')['status'], 'done')
+        self.assertEqual(QuizAttempt.objects.filter(submission_token='token-3').count(), 1)
+
+    def test_same_token_from_another_student_is_a_separate_submission(self):
+        self.submit('token-4')
+        other = User.objects.create_user(username='other', password='pass', role='student')
+        self.client.force_login(other)
+
+        response = self.submit('token-4', answer='1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['score'], 0)
+        self.assertEqual(QuizAttempt.objects.get(student=other, submission_token='token-4').score, 0)
+        self.assertEqual(QuizAttempt.objects.get(student=self.student, submission_token='token-4').score, 2)
+
+    @override_settings(QUIZ_SUBMISSION_QUEUE=False)
+    def test_without_queue_the_request_writes_the_attempt(self):
+        with mock.patch('students.submission_queue._writer') as writer:
+            first = self.submit('token-5').json()
+            second = self.submit('token-5', answer='1').json()
+
+        writer.submit.assert_not_called()
+        self.assertFalse(PendingSubmission.objects.exists())
+        attempt = QuizAttempt.objects.get(student=self.student)
+        self.assertEqual((first['status'], second['status']), ('done', 'done'))
+        self.assertEqual(first['score'], attempt.score)
+        self.assertEqual(LeaderboardEntry.objects.get(student=self.student).total_quizzes, 1)
+
+
+class LocalKnowledgeFallbackTests(SimpleTestCase):
+    """Queries the local index cannot answer must fall back to Wikipedia"""
+
+    ARTICLES = {
+        'Photosynthesis': 'Photosynthesis is the process plants use to turn light, water and carbon dioxide into sugar.',
+        'Volcano': 'A volcano is a rupture in the crust of a planet where lava and ash escape.',
+        'Roman Empire': 'The Roman Empire ruled the Mediterranean world from Rome for centuries.',
+    }
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        articles = os.path.join(scratch.name, 'articles')
+        os.makedirs(articles)
+        for title, text in self.ARTICLES.items():
+            with open(os.path.join(articles, f"{title.replace(' ', '_')}.txt"), 'w') as f:
+                f.write(text)
+        index_dir = os.path.join(scratch.name, 'index')
+        local_knowledge.build_index([articles], index_dir=index_dir)
+        self.index = local_knowledge.LocalKnowledgeIndex(index_dir)
+
+    def search_knowledge(self, query):
+        wikipedia = {'context': 'from wikipedia', 'sources': []}
+        with mock.patch.object(local_knowledge, 'KNOWLEDGE_BACKEND', 'local_then_wikipedia'), \
+                mock.patch.object(local_knowledge, 'get_index', return_value=self.index), \
+                mock.patch('students.wikipedia_utils.search_wikipedia', return_value=wikipedia) as search_wikipedia:
+            return local_knowledge.search_knowledge(query), search_wikipedia
+
+    def test_matching_query_is_answered_locally(self):
+        self.assertEqual([r['title'] for r in self.index.search('how does photosynthesis work')][0], 'Photosynthesis')
+
+        context, search_wikipedia = self.search_knowledge('explain photosynthesis')
+
+        self.assertIn('Photosynthesis', context['context'])
+        search_wikipedia.assert_not_called()
+
+    def test_unrelated_query_falls_back_to_wikipedia(self):
+        # Shares only stopwords with the articles
+        self.assertEqual(self.index.search('what is the quantum chromodynamics of a gluon'), [])
+
+        context, search_wikipedia = self.search_knowledge('what is the quantum chromodynamics of a gluon')
+
+        self.assertEqual(context['context'], 'from wikipedia')
+        search_wikipedia.assert_called_once()
+
+
+    def test_rebuild_swaps_in_a_complete_index(self):
+        index_dir = os.path.dirname(self.index.db_path)
+        articles = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, articles)
+        with open(os.path.join(articles, 'Glacier.txt'), 'w') as f:
+            f.write('A glacier is a persistent body of dense ice that moves under its own weight.')
+
+        with mock.patch.object(local_knowledge, 'KNOWLEDGE_INDEX_DIR', index_dir):
+            self.addCleanup(local_knowledge._reset_index)
+            self.assertEqual(local_knowledge.get_index().db_inode, self.index.db_inode)
+            local_knowledge.build_index([articles], index_dir=index_dir)
+
+            # The open handle still reads the index it was opened on; new searches get the new one
+            self.assertEqual(self.index.search('photosynthesis')[0]['title'], 'Photosynthesis')
+            self.assertEqual(local_knowledge.get_index().search('glacier ice')[0]['title'], 'Glacier')
+        self.assertEqual(sorted(os.listdir(index_dir)), sorted([local_knowledge.DB_NAME, local_knowledge.VECTORS_NAME]))
+        self.assertFalse([name for name in os.listdir(os.path.dirname(index_dir)) if name.startswith('.knowledge_build_')])
+
+
+class WikipediaCacheWriteTests(TestCase):
+    """Cache hits and writes must not write to the database every time"""
+
+    RESULTS = [{'title': 'Volcano', 'pageid': 1}]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hits_refresh_last_used_once_per_interval(self):
+        wikipedia_cache.store_search('volcano', 'Volcano', self.RESULTS)
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.assertEqual(wikipedia_cache.get_search('volcano'), ('Volcano', self.RESULTS))
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+
+        WikipediaSearchCache.objects.update(last_used_at=timezone.now() - 2 * wikipedia_cache.TOUCH_INTERVAL)
+        wikipedia_cache.get_search('volcano')
+        self.assertGreater(WikipediaSearchCache.objects.get().last_used_at,
+                           timezone.now() - wikipedia_cache.TOUCH_INTERVAL)
+
+    def test_size_limit_is_enforced_once_per_interval(self):
+        with mock.patch.object(wikipedia_cache, 'MAX_SEARCHES', 2):
+            for term in ('a', 'b', 'c'):
+                wikipedia_cache.store_search(term, term, self.RESULTS)
+            # The first write evicted (nothing to drop yet); the next ones skipped it
+            self.assertEqual(WikipediaSearchCache.objects.count(), 3)
+
+            cache.clear()
+            wikipedia_cache.store_search('d', 'd', self.RESULTS)
+            self.assertEqual(WikipediaSearchCache.objects.count(), 2)
+
+
+class WikipediaStubHandler(BaseHTTPRequestHandler):
+    """Answers MediaWiki search and extract queries with fixed articles"""
+
+    ARTICLES = {1: ('Photosynthesis', 'Plants turn light into sugar.'), 2: ('Chlorophyll', 'A green pigment.')}
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, params))
+        if params.get('list') == 'search':
+            data = {'query': {'search': [{'title': title, 'pageid': page_id}
+                                         for page_id, (title, _) in self.ARTICLES.items()]}}
+        else:
+            page_id = int(params['pageids'])
+            data = {'query': {'pages': {str(page_id): {'extract': self.ARTICLES[page_id][1]}}}}
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WikipediaBaseUrlTests(TestCase):
+    """Knowledge Bot lookups go to the configured MediaWiki server"""
+
+    def setUp(self):
+        cache.clear()
+        WikipediaStubHandler.requests = []
+        server = ThreadingHTTPServer(('127.0.0.1', 0), WikipediaStubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        for name, value in (('WIKIPEDIA_API_URL', f'{base_url}/w/api.php'),
+                            ('WIKIPEDIA_PAGE_URL', f'{base_url}/?curid={{page_id}}')):
+            patcher = mock.patch.object(wikipedia_utils, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.base_url = base_url
+
+    def test_search_uses_the_stub_server(self):
+        answer = wikipedia_utils.search_wikipedia('photosynthesis', extract_topic=False)
+
+        self.assertTrue(answer['context'].startswith('Photosynthesis\n\nPlants turn light into sugar.'))
+        self.assertIn('Related: Chlorophyll', answer['context'])
+        self.assertEqual(answer['sources'], [
+            {'title': 'Photosynthesis', 'url': f'{self.base_url}/?curid=1'},
+            {'title': 'Chlorophyll', 'url': f'{self.base_url}/?curid=2'},
+        ])
+        self.assertEqual({path for path, _ in WikipediaStubHandler.requests}, {'/w/api.php'})
+        self.assertEqual(WikipediaStubHandler.requests[0][1]['srsearch'], 'photosynthesis')
+        self.assertEqual(sorted(params['pageids'] for _, params in WikipediaStubHandler.requests[1:]), ['1', '2'])
+
+        # The second lookup is served from the article cache
+        wikipedia_utils.search_wikipedia('photosynthesis', extract_topic=False)
+        self.assertEqual(len(WikipediaStubHandler.requests), 3)
+
+
+class CondenseQuestionCacheTests(SimpleTestCase):
+    """Follow-up rewrites are cached on the last exchange, not the whole sliding history"""
+
+    def setUp(self):
+        patcher = mock.patch.object(utils, '_rewrite_cache', OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(utils, 'client')
+        self.client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.models.generate_content.return_value.text = 'What is the function of the mitochondria?'
+
+    def test_older_exchanges_do_not_change_the_key(self):
+        latest = "Q: What is the mitochondria?\nA: The powerhouse of the cell.\n\n"
+        for history in ("Q: What is a cell?\nA: The unit of life.\n\n" + latest,
+                        "Q: What is DNA?\nA: Genetic material.\n\n" + latest):
+            self.assertEqual(utils.condense_question('what does it do?', history),
+                             'What is the function of the mitochondria?')
+
+        self.client.models.generate_content.assert_called_once()
+        prompt = self.client.models.generate_content.call_args.kwargs['contents']
+        self.assertIn('What is the mitochondria?', prompt)
+        self.assertNotIn('What is a cell?', prompt)
+
+        utils.condense_question('what does it do?', "Q: What is a ribosome?\nA: Makes proteins.\n\n")
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('magnify-learning/', views.magnify_learning, name='magnify_learning'),
     path('pdf-chat/<int:pdf_id>/', views.pdf_chat, name='pdf_chat'),
     path('ask-question/<int:pdf_id>/', views.ask_question, name='ask_question'),
+    path('pdf-chat/<int:pdf_id>/indexing-progress/', views.indexing_progress, name='indexing_progress'),
     path('flashcards/<int:pdf_id>/', views.flashcards, name='flashcards'),
     path('flashcards/generate/<int:pdf_id>/', views.generate_flashcards, name='generate_flashcards'),
     path('upload-and-chat/', views.upload_and_chat, name='upload_and_chat'),
@@ -15,6 +16,7 @@ urlpatterns = [
     path('quiz/', views.quiz, name='quiz'),
     path('quiz/take/<int:quiz_id>/', views.take_quiz, name='take_quiz'),
     path('quiz/submit/<int:quiz_id>/', views.submit_quiz, name='submit_quiz'),
+    path('quiz/submission/<str:token>/', views.quiz_submission_status, name='quiz_submission_status'),
     path('quiz/report/<int:attempt_id>/', views.quiz_report, name='quiz_report'),
     path('quiz/proctoring/<int:attempt_id>/', views.save_proctoring_snapshot, name='save_proctoring_snapshot'),
     path('chat/', views.student_chat, name='student_chat'),
@@ -6,8 +6,15 @@ from google import genai
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings
 from typing import List
+from collections import OrderedDict
 from dotenv import load_dotenv
 import hashlib
+import re
+import logging
+from student_campus.telemetry import timed
+from .indexing_progress import IndexingJob
+
+logger = logging.getLogger(__name__)
 
 # Load .env from the campus directory
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -24,8 +31,9 @@ client = genai.Client(api_key=API_KEY)
 
 # Custom embeddings class using the new genai API
 class GenAIEmbeddings(Embeddings):
-    def __init__(self, client):
+    def __init__(self, client, progress=None):
         self.client = client
+        self.progress = progress
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embeddings = []
@@ -42,8 +50,11 @@ class GenAIEmbeddings(Embeddings):
                     time.sleep(0.5)
                     
             except Exception as e:
-                print(f"Warning: Error embedding document {i+1}: {e}")
+                logger.warning("Error embedding document %s: %s", i + 1, e)
                 embeddings.append([0.0] * 768)
+            
+            if self.progress:
+                self.progress.chunk_embedded(i + 1)
         return embeddings
     
     def embed_query(self, text: str) -> List[float]:
@@ -53,7 +64,7 @@ class GenAIEmbeddings(Embeddings):
         )
         return result.embeddings[0].values
 
-def get_pdf_text_from_path(pdf_path):
+def get_pdf_text_from_path(pdf_path, progress=None):
     """Extract text from a PDF file path - optimized for large files"""
     text = ""
     try:
@@ -66,32 +77,31 @@ def get_pdf_text_from_path(pdf_path):
                 page_text = page.extract_text()
                 if page_text:
                     text += page_text + "\n"
-                
-                # Log progress for large files
-                if total_pages > 50 and (i + 1) % 50 == 0:
-                    print(f"Processing PDF: {i + 1}/{total_pages} pages...")
-                    
             except Exception as e:
-                print(f"Warning: Could not extract text from page {i + 1}: {e}")
-                continue
+                logger.warning("Could not extract text from page %s: %s", i + 1, e)
+            
+            if progress:
+                progress.page_extracted(i + 1, total_pages)
         
-        print(f"Successfully extracted text from {total_pages} pages")
+        logger.info("Extracted text from %s pages of %s", total_pages, pdf_path)
         return text
     except Exception as e:
-        print(f"Error reading PDF: {e}")
+        logger.error("Error reading PDF %s: %s", pdf_path, e)
         return ""
 
-def get_text_chunks(text):
+def get_text_chunks(text, chunk_size=15000, chunk_overlap=2000, progress=None):
     """Split text into chunks - optimized for large documents"""
-    # Increase chunk size for better context with large documents
+    # Large chunks keep more context per retrieved passage; benchmark_rag compares sizes
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=15000,  # Increased from 10000
-        chunk_overlap=2000,  # Increased from 1000
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         length_function=len,
         separators=["\n\n", "\n", ". ", " ", ""]
     )
     chunks = text_splitter.split_text(text)
-    print(f"Split document into {len(chunks)} chunks")
+    logger.info("Split document into %s chunks", len(chunks))
+    if progress:
+        progress.chunked(len(chunks))
     return chunks
 
 def get_pdf_hash(pdf_path):
@@ -101,39 +111,50 @@ def get_pdf_hash(pdf_path):
 
 def get_vector_store_for_pdf(pdf_path, index_folder="faiss_index"):
     """Create or load vector store for a specific PDF"""
-    pdf_hash = get_pdf_hash(pdf_path)
+    with timed('pdf_index.hash'):
+        pdf_hash = get_pdf_hash(pdf_path)
     index_path = f"{index_folder}_{pdf_hash}"
     
-    embeddings = GenAIEmbeddings(client)
-    
     # Check if index already exists
     if os.path.exists(index_path):
         try:
-            vector_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+            with timed('pdf_index.load', pdf=pdf_hash):
+                vector_store = FAISS.load_local(index_path, GenAIEmbeddings(client), allow_dangerous_deserialization=True)
             return vector_store
-        except:
-            pass  # If loading fails, create new one
+        except Exception as e:
+            logger.warning("Could not load index %s, rebuilding: %s", index_path, e)
     
     # Create new vector store with optimized processing
-    print(f"Processing PDF: {pdf_path}")
-    raw_text = get_pdf_text_from_path(pdf_path)
-    if not raw_text.strip():
-        print("Error: No text extracted from PDF")
-        return None
-    
-    print(f"Extracted {len(raw_text)} characters from PDF")
-    text_chunks = get_text_chunks(raw_text)
-    
-    # Process embeddings in batches for large documents
-    print(f"Creating embeddings for {len(text_chunks)} chunks...")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-    vector_store.save_local(index_path)
-    print(f"Vector store created and saved to {index_path}")
+    progress = IndexingJob.start(pdf_hash, pdf_path)
+    try:
+        with timed('pdf_index.extract', pdf=pdf_hash):
+            raw_text = get_pdf_text_from_path(pdf_path, progress=progress)
+        if not raw_text.strip():
+            progress.fail("No text extracted from PDF")
+            return None
+        
+        progress.set_stage('chunking')
+        with timed('pdf_index.chunk', pdf=pdf_hash):
+            text_chunks = get_text_chunks(raw_text, progress=progress)
+        
+        # Embedding progress is reported per chunk by GenAIEmbeddings
+        embeddings = GenAIEmbeddings(client, progress=progress)
+        with timed('pdf_index.embed', pdf=pdf_hash, chunks=len(text_chunks)):
+            vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
+        embeddings.progress = None
+        
+        progress.set_stage('saving')
+        with timed('pdf_index.save', pdf=pdf_hash):
+            vector_store.save_local(index_path)
+    except Exception as e:
+        progress.fail(e)
+        raise
     
+    progress.finish()
     return vector_store
 
-def get_answer_from_context(context, question, chat_history=""):
-    """Get answer from context with chat history"""
+def build_answer_prompt(context, question, chat_history=""):
+    """Build the answering prompt sent to Gemini for a retrieved context"""
     history_text = ""
     if chat_history:
         history_text = f"\nPrevious conversation:\n{chat_history}\n"
@@ -152,36 +173,132 @@ def get_answer_from_context(context, question, chat_history=""):
     Answer:
     """
     
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
+    return prompt
+
+def get_answer_from_context(context, question, chat_history=""):
+    """Get answer from context with chat history"""
+    prompt = build_answer_prompt(context, question, chat_history)
+    
+    with timed('pdf_chat.generate'):
+        response = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=prompt
+        )
     
     return response.text
 
+# Number of chunks retrieved per question
+RETRIEVAL_K = 6
+
+# Cache of condensed follow-up questions keyed by (last exchange, question) digest
+REWRITE_CACHE_SIZE = 512
+_rewrite_cache = OrderedDict()
+
+# Words that usually point back at something said earlier in the conversation
+FOLLOW_UP_REFERENCES = {
+    'it', 'its', 'this', 'that', 'these', 'those', 'they', 'them', 'their',
+    'he', 'she', 'him', 'her', 'his', 'one', 'ones', 'former', 'latter',
+    'above', 'previous', 'same', 'again', 'else', 'more', 'another', 'other',
+}
+FOLLOW_UP_PREFIXES = ('and ', 'also ', 'but ', 'so ', 'then ', 'what about', 'how about', 'why not', 'and?')
+
+def is_standalone_question(question, chat_history=""):
+    """Cheap heuristic deciding whether a question can be searched as-is"""
+    if not chat_history or not chat_history.strip():
+        return True
+    
+    normalized = question.strip().lower()
+    if normalized.startswith(FOLLOW_UP_PREFIXES):
+        return False
+    
+    words = re.findall(r"[a-z0-9']+", normalized)
+    # Very short questions ("why?", "explain more") rarely carry their own subject
+    if len(words) < 4:
+        return False
+    
+    return not any(word in FOLLOW_UP_REFERENCES for word in words)
+
+def last_exchange(chat_history):
+    """The most recent 'Q: ...\nA: ...' block of a chat history"""
+    history = chat_history.strip()
+    return history[history.rfind('\nQ: ') + 1:]
+
+def condense_question(question, chat_history=""):
+    """Rewrite a follow-up question into a standalone search query using the last exchange"""
+    if is_standalone_question(question, chat_history):
+        return question
+    
+    # The history is a sliding window of recent exchanges, so keying on all of it would
+    # miss every time; follow-ups point back at the latest exchange
+    exchange = last_exchange(chat_history)
+    cache_key = hashlib.sha256(f"{exchange}\x00{question}".encode('utf-8')).hexdigest()
+    if cache_key in _rewrite_cache:
+        _rewrite_cache.move_to_end(cache_key)
+        return _rewrite_cache[cache_key]
+    
+    prompt = f"""
+    Given the conversation below and a follow-up question, rephrase the follow-up question
+    into a single standalone question that can be understood without the conversation.
+    Return ONLY the rewritten question.
+    
+    Conversation:
+    {exchange}
+    
+    Follow-up question:
+    {question}
+    
+    Standalone question:
+    """
+    
+    try:
+        with timed('pdf_chat.condense'):
+            response = client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=prompt
+            )
+        standalone = (response.text or "").strip().strip('"\'')
+    except Exception as e:
+        logger.warning("Could not condense question, using original: %s", e)
+        return question
+    
+    if not standalone:
+        return question
+    
+    _rewrite_cache[cache_key] = standalone
+    if len(_rewrite_cache) > REWRITE_CACHE_SIZE:
+        _rewrite_cache.popitem(last=False)
+    
+    return standalone
+
+@timed('pdf_chat.total')
 def get_answer_for_pdf(pdf_path, question, chat_history=""):
     """Get answer for a question about a specific PDF - optimized for large documents"""
     try:
-        embeddings = GenAIEmbeddings(client)
         vector_store = get_vector_store_for_pdf(pdf_path)
         
         if vector_store is None:
             return "Error: Could not process the PDF file. The file may be too large or corrupted."
         
+        # Rewrite follow-ups ("and the second one?") into a standalone search query
+        search_query = condense_question(question, chat_history)
+        
         # Search for more relevant documents for better context in large PDFs
-        docs = vector_store.similarity_search(question, k=6)  # Increased from 4 to 6
+        with timed('pdf_chat.embed_query'):
+            query_vector = vector_store.embeddings.embed_query(search_query)
+        with timed('pdf_chat.search'):
+            docs = vector_store.similarity_search_by_vector(query_vector, k=RETRIEVAL_K)
         
         if not docs:
             return "No relevant information found in the PDF."
         
         # Combine all document contents into context
         context = "\n\n".join([doc.page_content for doc in docs])
-        print(f"Retrieved {len(docs)} relevant chunks for question: {question[:50]}...")
+        logger.info("Retrieved %s relevant chunks for question: %s...", len(docs), question[:50])
         
         # Get answer with chat history
         answer = get_answer_from_context(context, question, chat_history)
         
         return answer
     except Exception as e:
-        print(f"Error in get_answer_for_pdf: {str(e)}")
+        logger.exception("Error in get_answer_for_pdf: %s", e)
         return f"Error processing your question: {str(e)}"
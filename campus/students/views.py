@@ -6,9 +6,9 @@ from django.db.models import Q, Max
 from teachers.models import Subject, PDFNote, ChatMessage
 from .models import ChatHistory
 from .utils import get_answer_for_pdf
+from .local_knowledge import search_knowledge
 from authentication.models import User
 import json
-import requests
 import re
 
 @login_required
@@ -16,7 +16,9 @@ def student_dashboard(request):
     if not request.user.is_student():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    subjects = Subject.objects.all()
+    from teachers.catalog_cache import get_subjects
+    
+    subjects = get_subjects()
     return render(request, 'students/dashboard.html', {'subjects': subjects})
 
 @login_required
@@ -34,7 +36,9 @@ def magnify_learning(request):
     if not request.user.is_student():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    subjects = Subject.objects.all().prefetch_related('notes')
+    from teachers.catalog_cache import get_subjects_with_notes
+    
+    subjects = get_subjects_with_notes()
     return render(request, 'students/magnify_learning.html', {'subjects': subjects})
 
 @login_required
@@ -99,6 +103,22 @@ def ask_question(request, pdf_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def indexing_progress(request, pdf_id):
+    """Poll the progress of building the chat index for a PDF"""
+    if not request.user.is_student():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    from .indexing_progress import get_job_for_path
+    
+    pdf_note = get_object_or_404(PDFNote, id=pdf_id)
+    job = get_job_for_path(pdf_note.pdf_file.path)
+    
+    if job is None:
+        return JsonResponse({'success': True, 'status': 'idle', 'job': None})
+    
+    return JsonResponse({'success': True, 'status': job['status'], 'job': job})
+
 @login_required
 @require_POST
 def upload_and_chat(request):
@@ -212,21 +232,24 @@ def quiz(request):
     if not request.user.is_student():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    from teachers.models import Quiz
-    quizzes = Quiz.objects.filter(is_active=True).select_related('subject', 'pdf_note').prefetch_related('attempts', 'questions')
+    from teachers.models import Quiz, QuizAttempt
+    from django.db.models import Prefetch
+    # Question counts and percentages are stored on the rows and only this student's
+    # completed attempts are prefetched, so the page costs a fixed number of queries
+    quizzes = Quiz.objects.filter(is_active=True).select_related('subject', 'pdf_note').prefetch_related(Prefetch(
+        'attempts',
+        queryset=QuizAttempt.objects.filter(student=request.user, completed_at__isnull=False),
+        to_attr='user_attempts'
+    ))
     
-    # Attach user's attempt and calculate percentage for each quiz
+    # Attach user's attempt and its percentage for each quiz
     completed_count = 0
     for quiz_obj in quizzes:
-        attempt = quiz_obj.attempts.filter(student=request.user, completed_at__isnull=False).first()
+        attempt = quiz_obj.user_attempts[0] if quiz_obj.user_attempts else None
         quiz_obj.user_attempt = attempt
         if attempt:
             completed_count += 1
-            total_questions = quiz_obj.questions.count()
-            if total_questions > 0:
-                quiz_obj.percentage = round((attempt.score / total_questions) * 100, 2)
-            else:
-                quiz_obj.percentage = 0
+            quiz_obj.percentage = attempt.percentage or 0
         else:
             quiz_obj.percentage = 0
     
@@ -241,8 +264,11 @@ def take_quiz(request, quiz_id):
         return HttpResponseForbidden("You don't have permission to access this page.")
     
     from teachers.models import Quiz, QuizAttempt
+    from teachers.answer_keys import get_answer_key
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     questions = quiz.questions.all()
+    # Warm the answer key from the questions rendered here, ready for the submissions
+    get_answer_key(quiz, questions)
     
     # Check if already attempted
     existing_attempt = QuizAttempt.objects.filter(student=request.user, quiz=quiz, completed_at__isnull=False).first()
@@ -254,7 +280,7 @@ def take_quiz(request, quiz_id):
             student=request.user,
             quiz=quiz,
             completed_at__isnull=True,
-            defaults={'total_points': questions.count()}
+            defaults={'total_points': quiz.question_count}
         )
     
     return render(request, 'students/take_quiz.html', {
@@ -289,10 +315,10 @@ def quiz_report(request, attempt_id):
         }
         question_results.append(result)
     
-    total_questions = quiz.questions.count()
+    total_questions = quiz.question_count
     correct_count = attempt.score
     wrong_count = total_questions - correct_count
-    percentage = (attempt.score / total_questions * 100) if total_questions > 0 else 0
+    percentage = attempt.percentage or 0
     wrong_percentage = (wrong_count / total_questions * 100) if total_questions > 0 else 0
     
     return render(request, 'students/quiz_report.html', {
@@ -313,91 +339,90 @@ def submit_quiz(request, quiz_id):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
     try:
-        from teachers.models import Quiz, QuizAttempt, Question
+        import uuid
+        from teachers.models import Quiz, QuizAttempt
+        from django.urls import reverse
         from django.utils import timezone
+        from teachers.answer_keys import get_answer_key, score_answers
+        from .submission_queue import accept_submission
         
         quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
-        data = json.loads(request.body)
-        answers = data.get('answers', {})
-        
-        # Calculate score and build detailed results
-        score = 0
-        total_questions = quiz.questions.count()
-        correct_answers = {}
-        question_details = []
-        
-        for question in quiz.questions.all():
-            question_id = str(question.id)
-            student_answer = answers.get(question_id)
-            correct_answer = question.correct_answer
-            
-            is_correct = student_answer == correct_answer
-            if is_correct:
-                score += 1
-                correct_answers[question_id] = True
-            else:
-                correct_answers[question_id] = False
-            
-            # Build question detail for report
-            question_detail = {
-                'id': question.id,
-                'text': question.text,
-                'student_answer': student_answer,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct,
-                'type': question.question_type
-            }
-            
-            # Add options for multiple choice
-            if question.question_type == 'multiple_choice':
-                question_detail['options'] = question.options
-            
-            question_details.append(question_detail)
-        
-        # Get proctoring counts from request
-        tab_switch_count = data.get('tab_switch_count', 0)
-        fullscreen_exit_count = data.get('fullscreen_exit_count', 0)
-        
-        # Update existing attempt or create new one
-        attempt, created = QuizAttempt.objects.update_or_create(
-            quiz=quiz,
-            student=request.user,
-            completed_at__isnull=True,
-            defaults={
-                'completed_at': timezone.now(),
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            # navigator.sendBeacon posts form data when the student leaves the page
+            data = {key: request.POST.get(key) for key in ('submission_token', 'tab_switch_count', 'fullscreen_exit_count')}
+            data['answers'] = json.loads(request.POST.get('answers') or '{}')
+        answers = data.get('answers') or {}
+        # Retries of the same submission carry the same token and are only applied once
+        token = str(data.get('submission_token') or uuid.uuid4())[:64]
+        
+        # Score against the cached answer key; the Question table is only read when
+        # the current quiz version has no snapshot yet
+        answer_key = get_answer_key(quiz)
+        total_questions = len(answer_key)
+        
+        def quiz_result(answers):
+            score, correct_answers, question_details = score_answers(answer_key, answers)
+            return {
                 'score': score,
-                'total_points': total_questions,
-                'answers': answers,
-                'tab_switch_count': tab_switch_count,
-                'fullscreen_exit_count': fullscreen_exit_count
+                'total': total_questions,
+                'percentage': QuizAttempt.compute_percentage(score, total_questions),
+                'correct_answers': correct_answers,
+                'question_details': question_details
             }
-        )
         
-        # If no in-progress attempt exists, this means we need to create a new completed one
-        if not created and attempt.completed_at is None:
-            # This shouldn't happen, but just in case
-            attempt.completed_at = timezone.now()
-            attempt.score = score
-            attempt.total_points = total_questions
-            attempt.answers = answers
-            attempt.tab_switch_count = tab_switch_count
-            attempt.fullscreen_exit_count = fullscreen_exit_count
-            attempt.save()
-        
-        percentage = (score / total_questions * 100) if total_questions > 0 else 0
+        result = quiz_result(answers)
+        
+        # Stored durably before acknowledging; with the submission queue on, the attempt
+        # is written by its writer and the page polls status_url until it is done
+        status = accept_submission(token, {
+            'quiz_id': quiz.id,
+            'teacher_id': quiz.created_by_id,
+            'student_id': request.user.id,
+            'completed_at': timezone.now(),
+            'score': result['score'],
+            'total_points': total_questions,
+            'answers': answers,
+            # Get proctoring counts from request
+            'tab_switch_count': int(data.get('tab_switch_count') or 0),
+            'fullscreen_exit_count': int(data.get('fullscreen_exit_count') or 0),
+            'result': result,
+        })
+        if 'result' not in status:
+            # The token was already written: answer with its first submission
+            status['result'] = quiz_result(status['answers'])
         
         return JsonResponse({
             'success': True,
-            'score': score,
-            'total': total_questions,
-            'percentage': round(percentage, 2),
-            'correct_answers': correct_answers,
-            'question_details': question_details
-        })
+            'status': status['status'],
+            'submission_token': token,
+            'status_url': reverse('quiz_submission_status', args=[token]),
+            # A repeated token gets the result of its first submission
+            **status['result']
+        }, status=202)
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def quiz_submission_status(request, token):
+    """Poll whether a queued quiz submission has been saved"""
+    if not request.user.is_student():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    from .submission_queue import get_submission_status
+    
+    status = get_submission_status(request.user.id, token)
+    if not status:
+        return JsonResponse({'error': 'Unknown submission'}, status=404)
+    payload = {'success': True, 'status': status['status']}
+    if status['status'] == 'done':
+        payload['attempt_id'] = status['attempt_id']
+    elif status['status'] == 'failed':
+        payload['error'] = status['error']
+    return JsonResponse(payload)
+
 @login_required
 def student_chat(request):
     if not request.user.is_student():
@@ -495,13 +520,14 @@ def knowledge_bot_ask(request):
             history_context += f"Previous Q: {hist.question}\nPrevious A: {hist.answer[:200]}...\n\n"
         
         # Search Wikipedia for relevant information
-        wiki_context = search_wikipedia(question)
+        wiki_context = search_knowledge(question)
         
         # Check if we got any results
         if not wiki_context.get('context'):
-            # Try a simplified search with just key words
+            # Try a simplified search with just key words (the topic was already extracted once)
             words = question.lower().replace('what is', '').replace('who is', '').replace('where is', '').replace('when is', '').replace('how', '').replace('?', '').strip()
-            wiki_context = search_wikipedia(words)
+            if words and words != question.lower():
+                wiki_context = search_knowledge(words, extract_topic=False)
         
         # Generate answer using Gemini AI
         answer = generate_knowledge_answer(question, wiki_context, history_context)
@@ -524,134 +550,6 @@ def knowledge_bot_ask(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-def search_wikipedia(query):
-    """Search Wikipedia for relevant information using proper API"""
-    try:
-        import os
-        from dotenv import load_dotenv
-        import google.generativeai as genai
-        
-        # Load .env from the campus directory
-        env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-        load_dotenv(env_path)
-        
-        # Use Gemini AI to extract the main search topic from the question
-        api_key = os.getenv('API_KEY')
-        if not api_key:
-            raise ValueError(f"API_KEY not found in .env file at: {env_path}")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        topic_prompt = f"""Extract the main topic/concept that should be searched on Wikipedia from this question.
-Return ONLY the search term(s) that would find the most relevant Wikipedia article.
-
-Examples:
-"What is photosynthesis?" → "photosynthesis"
-"Who was Albert Einstein?" → "Albert Einstein"
-"Define mitosis" → "mitosis"
-"Tell me about the pyramids" → "pyramids"
-"History of the internet" → "internet history"
-"Explain gravity" → "gravity"
-"What is quantum physics?" → "quantum physics"
-
-Question: "{query}"
-Search term:"""
-        
-        try:
-            topic_response = model.generate_content(topic_prompt)
-            search_query = topic_response.text.strip().strip('"\'').lower()
-        except:
-            # Fallback to original query if AI fails
-            search_query = query
-        
-        # Get credentials from environment
-        client_id = os.getenv('WIKIPEDIA_CLIENT_ID')
-        client_secret = os.getenv('WIKIPEDIA_CLIENT_SECRET')
-        
-        # Use Wikipedia API with proper headers
-        search_url = "https://en.wikipedia.org/w/api.php"
-        
-        headers = {
-            'User-Agent': 'StudentCampusApp/1.0 (Educational Purpose)'
-        }
-        
-        # Search for relevant articles
-        search_params = {
-            'action': 'query',
-            'format': 'json',
-            'list': 'search',
-            'srsearch': search_query,
-            'srlimit': 5,
-            'srprop': 'snippet'
-        }
-        
-        search_response = requests.get(search_url, params=search_params, headers=headers, timeout=10)
-        search_data = search_response.json()
-        
-        context = ""
-        sources = []
-        
-        if 'query' in search_data and 'search' in search_data['query']:
-            results = search_data['query']['search']
-            
-            if not results:
-                return {'context': '', 'sources': []}
-            
-            # Get the first result's full content
-            first_result = results[0]
-            title = first_result['title']
-            page_id = first_result['pageid']
-            
-            # Get full page content (not just intro)
-            content_params = {
-                'action': 'query',
-                'format': 'json',
-                'pageids': page_id,
-                'prop': 'extracts',
-                'explaintext': True,
-                'exsectionformat': 'plain'
-            }
-            
-            content_response = requests.get(search_url, params=content_params, headers=headers, timeout=10)
-            content_data = content_response.json()
-            
-            if 'query' in content_data and 'pages' in content_data['query']:
-                page_content = content_data['query']['pages'][str(page_id)].get('extract', '')
-                if page_content:
-                    # Get first 3000 characters for comprehensive answer
-                    context = f"{title}\n\n{page_content[:3000]}"
-                    if len(page_content) > 3000:
-                        context += "..."
-                    
-                    sources.append({
-                        'title': title,
-                        'url': f"https://en.wikipedia.org/?curid={page_id}"
-                    })
-                    
-                    # Add one more related article if available
-                    if len(results) > 1:
-                        second_result = results[1]
-                        second_title = second_result['title']
-                        second_page_id = second_result['pageid']
-                        
-                        content_params['pageids'] = second_page_id
-                        content_response = requests.get(search_url, params=content_params, headers=headers, timeout=10)
-                        content_data = content_response.json()
-                        
-                        if 'query' in content_data and 'pages' in content_data['query']:
-                            second_content = content_data['query']['pages'][str(second_page_id)].get('extract', '')
-                            if second_content:
-                                context += f"\n\nRelated: {second_title}\n\n{second_content[:1000]}"
-                                sources.append({
-                                    'title': second_title,
-                                    'url': f"https://en.wikipedia.org/?curid={second_page_id}"
-                                })
-        
-        return {'context': context, 'sources': sources}
-        
-    except Exception as e:
-        return {'context': '', 'sources': []}
-
 def generate_knowledge_answer(question, wiki_context, history_context=""):
     """Format answer using Gemini AI with Wikipedia content"""
     try:
@@ -730,7 +628,9 @@ def leaderboard(request):
     if not request.user.is_student():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    from .leaderboard_utils import get_leaderboard_data
+    from .leaderboard_utils import (
+        get_leaderboard_data, get_cached_suggestion, fallback_suggestion, generate_overall_insights
+    )
     
     # Get leaderboard data
     leaderboard_data = get_leaderboard_data()
@@ -742,9 +642,18 @@ def leaderboard(request):
             current_student_data = entry
             break
     
+    # AI tips and insights are only read from the cache here; they are precomputed after
+    # quiz attempts are written (submission_queue.save_attempt), never from a page view
+    ai_suggestion = None
+    overall_insights = generate_overall_insights(leaderboard_data, generate=False) if leaderboard_data else None
+    if current_student_data:
+        ai_suggestion = get_cached_suggestion(current_student_data) or fallback_suggestion(current_student_data)
+    
     return render(request, 'students/leaderboard.html', {
         'leaderboard': leaderboard_data,
         'current_student_data': current_student_data,
+        'ai_suggestion': ai_suggestion,
+        'overall_insights': overall_insights,
         'total_students': len(leaderboard_data)
     })
 
@@ -761,6 +670,7 @@ def save_proctoring_snapshot(request, attempt_id):
     
     try:
         from teachers.models import QuizAttempt, ProctoringSnapshot
+        from teachers.analytics_utils import invalidate_teacher_summary
         from django.core.files.base import ContentFile
         import base64
         
@@ -807,6 +717,7 @@ def save_proctoring_snapshot(request, attempt_id):
         
         attempt.proctoring_violations.append(violation_log)
         attempt.save()
+        invalidate_teacher_summary(attempt.quiz.created_by_id)
         
         print(f"✅ Successfully saved proctoring snapshot for attempt {attempt.id}")
         print(f"Total violations for this attempt: {len(attempt.proctoring_violations)}")
@@ -830,7 +741,7 @@ def practice_quiz(request):
         return HttpResponseForbidden("You don't have permission to access this page.")
     
     from .models import PracticeQuiz
-    from teachers.models import Subject
+    from teachers.catalog_cache import get_subjects_with_notes
     
     # Get recent practice quizzes
     recent_quizzes = PracticeQuiz.objects.filter(student=request.user).prefetch_related('attempts')[:10]
@@ -851,7 +762,7 @@ def practice_quiz(request):
             quiz.latest_percentage = None
     
     # Get all subjects with their notes for selection
-    subjects = Subject.objects.all().prefetch_related('notes')
+    subjects = get_subjects_with_notes()
     
     return render(request, 'students/practice_quiz.html', {
         'recent_quizzes': recent_quizzes,
@@ -0,0 +1,112 @@
+"""
+Persistent cache for knowledge bot Wikipedia lookups - search hits keyed by the
+normalised question and article extracts keyed by page id, with TTL and LRU size limits
+"""
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from .models import WikipediaSearchCache, WikipediaArticleCache
+
+CACHE_TTL = timedelta(seconds=getattr(settings, 'WIKIPEDIA_CACHE_TTL', 7 * 24 * 60 * 60))
+MAX_SEARCHES = getattr(settings, 'WIKIPEDIA_CACHE_MAX_SEARCHES', 5000)
+MAX_ARTICLES = getattr(settings, 'WIKIPEDIA_CACHE_MAX_ARTICLES', 2000)
+# Extracts are trimmed before storing; answers only use the first few thousand characters
+CACHED_EXTRACT_CHARS = 10000
+# last_used_at only orders eviction, so a hit refreshes it at most once per interval
+TOUCH_INTERVAL = timedelta(seconds=getattr(settings, 'WIKIPEDIA_CACHE_TOUCH_INTERVAL', 60 * 60))
+# Writes run the expiry and size limit at most once per interval (per table), not on every write
+EVICT_LOCK_KEY = 'wikipedia_cache:evict:{}'
+EVICT_INTERVAL = getattr(settings, 'WIKIPEDIA_CACHE_EVICT_INTERVAL', 10 * 60)
+
+
+def normalize_term(text):
+    """'  What is Photosynthesis?? ' -> 'what is photosynthesis'"""
+    text = re.sub(r"[^\w\s'-]", ' ', (text or '').lower())
+    return ' '.join(text.split())[:255]
+
+
+def _is_fresh(entry, now):
+    return entry.fetched_at >= now - CACHE_TTL
+
+
+def _needs_touch(entry, now):
+    return entry.last_used_at < now - TOUCH_INTERVAL
+
+
+def get_search(term):
+    """Return (search_term, results) for a cached query, or None when missing or expired"""
+    now = timezone.now()
+    entry = WikipediaSearchCache.objects.filter(term=normalize_term(term)).first()
+    if entry is None or not _is_fresh(entry, now):
+        return None
+    if _needs_touch(entry, now):
+        WikipediaSearchCache.objects.filter(pk=entry.pk).update(last_used_at=now)
+    return entry.search_term, entry.results
+
+
+def get_articles(page_ids):
+    """Return {page_id: extract} for the fresh cached articles among page_ids"""
+    now = timezone.now()
+    entries = [
+        entry for entry in WikipediaArticleCache.objects.filter(page_id__in=page_ids)
+        if _is_fresh(entry, now)
+    ]
+    touched = [entry.pk for entry in entries if _needs_touch(entry, now)]
+    if touched:
+        WikipediaArticleCache.objects.filter(pk__in=touched).update(last_used_at=now)
+    return {entry.page_id: entry.extract for entry in entries}
+
+
+def store_search(term, search_term, results):
+    now = timezone.now()
+    try:
+        WikipediaSearchCache.objects.update_or_create(
+            term=normalize_term(term),
+            defaults={
+                'search_term': (search_term or '')[:255],
+                'results': [{'title': r['title'], 'pageid': r['pageid']} for r in results],
+                'fetched_at': now,
+                'last_used_at': now,
+            }
+        )
+    except IntegrityError:
+        # Another request cached the same term first
+        return
+    _evict(WikipediaSearchCache, MAX_SEARCHES)
+
+
+def store_articles(results, extracts):
+    """Cache the extracts fetched for search results ({page_id: extract})"""
+    now = timezone.now()
+    titles = {r['pageid']: r['title'] for r in results}
+    for page_id, extract in extracts.items():
+        if not extract:
+            continue
+        try:
+            WikipediaArticleCache.objects.update_or_create(
+                page_id=page_id,
+                defaults={
+                    'title': titles.get(page_id, '')[:255],
+                    'extract': extract[:CACHED_EXTRACT_CHARS],
+                    'fetched_at': now,
+                    'last_used_at': now,
+                }
+            )
+        except IntegrityError:
+            continue
+    _evict(WikipediaArticleCache, MAX_ARTICLES)
+
+
+def _evict(model, max_entries):
+    """Drop expired rows, then the least recently used rows beyond max_entries (once per EVICT_INTERVAL)"""
+    if not cache.add(EVICT_LOCK_KEY.format(model._meta.model_name), True, EVICT_INTERVAL):
+        return
+    now = timezone.now()
+    model.objects.filter(fetched_at__lt=now - CACHE_TTL).delete()
+    overflow = model.objects.count() - max_entries
+    if overflow > 0:
+        stale_ids = list(model.objects.order_by('last_used_at').values_list('pk', flat=True)[:overflow])
+        model.objects.filter(pk__in=stale_ids).delete()
@@ -0,0 +1,251 @@
+"""
+Wikipedia retrieval for the knowledge bot - pooled HTTP session and concurrent
+search/extract requests, so a lookup costs roughly its slowest call
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from django.conf import settings
+from student_campus.telemetry import timed
+from . import wikipedia_cache
+
+logger = logging.getLogger(__name__)
+
+# Load .env from the campus directory
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Point WIKIPEDIA_BASE_URL at a mirror or a local stub server; the API and page URLs
+# follow it unless set themselves
+WIKIPEDIA_BASE_URL = getattr(settings, 'WIKIPEDIA_BASE_URL', os.getenv('WIKIPEDIA_BASE_URL', 'https://en.wikipedia.org')).rstrip('/')
+WIKIPEDIA_API_URL = getattr(settings, 'WIKIPEDIA_API_URL', os.getenv('WIKIPEDIA_API_URL', f'{WIKIPEDIA_BASE_URL}/w/api.php'))
+WIKIPEDIA_PAGE_URL = getattr(settings, 'WIKIPEDIA_PAGE_URL', f'{WIKIPEDIA_BASE_URL}/?curid={{page_id}}')
+REQUEST_TIMEOUT = 10
+TOPIC_TIMEOUT = 8
+
+HEADERS = {
+    'User-Agent': 'StudentCampusApp/1.0 (Educational Purpose)'
+}
+
+# Characters of the main and related article included in the answer context
+MAIN_EXTRACT_CHARS = 3000
+RELATED_EXTRACT_CHARS = 1000
+
+TOPIC_PROMPT = """Extract the main topic/concept that should be searched on Wikipedia from this question.
+Return ONLY the search term(s) that would find the most relevant Wikipedia article.
+
+Examples:
+"What is photosynthesis?" → "photosynthesis"
+"Who was Albert Einstein?" → "Albert Einstein"
+"Define mitosis" → "mitosis"
+"Tell me about the pyramids" → "pyramids"
+"History of the internet" → "internet history"
+"Explain gravity" → "gravity"
+"What is quantum physics?" → "quantum physics"
+
+Question: "{query}"
+Search term:"""
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='wikipedia')
+_session = None
+_topic_model = None
+
+
+def get_session():
+    """Shared keep-alive session so repeat lookups reuse TLS connections"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=1, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(HEADERS)
+        _session = session
+    return _session
+
+
+def _get_topic_model():
+    global _topic_model
+    if _topic_model is None:
+        import google.generativeai as genai
+        api_key = os.getenv('API_KEY')
+        if not api_key:
+            raise ValueError(f"API_KEY not found in .env file at: {env_path}")
+        genai.configure(api_key=api_key)
+        _topic_model = genai.GenerativeModel('gemini-2.5-flash')
+    return _topic_model
+
+
+def extract_search_topic(query):
+    """Use Gemini to turn a question into a Wikipedia search term"""
+    with timed('knowledge_bot.topic'):
+        response = _get_topic_model().generate_content(TOPIC_PROMPT.format(query=query))
+    return response.text.strip().strip('"\'').lower()
+
+
+def search_articles(search_query, limit=5):
+    """Return MediaWiki search hits as [{'title', 'pageid'}, ...]"""
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'list': 'search',
+        'srsearch': search_query,
+        'srlimit': limit,
+        'srprop': 'snippet'
+    }
+    with timed('knowledge_bot.search'):
+        response = get_session().get(WIKIPEDIA_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+    data = response.json()
+    return data.get('query', {}).get('search', [])
+
+
+def fetch_extract(page_id):
+    """Return the plain-text extract of an article ('' if missing)"""
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'pageids': page_id,
+        'prop': 'extracts',
+        'explaintext': True,
+        'exsectionformat': 'plain'
+    }
+    with timed('knowledge_bot.extract'):
+        response = get_session().get(WIKIPEDIA_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+    data = response.json()
+    return data.get('query', {}).get('pages', {}).get(str(page_id), {}).get('extract', '')
+
+
+def _result(future, default, timeout=None):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.warning("Wikipedia lookup step timed out")
+    except Exception as e:
+        logger.warning("Wikipedia lookup step failed: %s", e)
+    return default
+
+
+def _source_url(result):
+    # Local knowledge results carry their own url (possibly empty for plain text files)
+    if 'url' in result:
+        return result['url']
+    return WIKIPEDIA_PAGE_URL.format(page_id=result['pageid'])
+
+
+def build_context(results, extracts):
+    """Format the top article (and one related article) into answer context and sources"""
+    context = ""
+    sources = []
+
+    first = results[0]
+    page_content = extracts.get(first['pageid'], '')
+    if not page_content:
+        return {'context': '', 'sources': []}
+
+    context = f"{first['title']}\n\n{page_content[:MAIN_EXTRACT_CHARS]}"
+    if len(page_content) > MAIN_EXTRACT_CHARS:
+        context += "..."
+    sources.append({
+        'title': first['title'],
+        'url': _source_url(first)
+    })
+
+    if len(results) > 1:
+        second = results[1]
+        second_content = extracts.get(second['pageid'], '')
+        if second_content:
+            context += f"\n\nRelated: {second['title']}\n\n{second_content[:RELATED_EXTRACT_CHARS]}"
+            sources.append({
+                'title': second['title'],
+                'url': _source_url(second)
+            })
+
+    return {'context': context, 'sources': sources}
+
+
+def _prefetch_extracts(results, extract_futures):
+    """Start extract requests for the top two results that are not already in flight"""
+    for result in results[:2]:
+        if result['pageid'] not in extract_futures:
+            extract_futures[result['pageid']] = _executor.submit(fetch_extract, result['pageid'])
+
+
+def _fetch_extracts(results, extract_futures=None):
+    """Wait for (or start) the extract requests of the top two results"""
+    extract_futures = {} if extract_futures is None else extract_futures
+    _prefetch_extracts(results, extract_futures)
+    return {
+        result['pageid']: _result(extract_futures[result['pageid']], '', REQUEST_TIMEOUT * 2)
+        for result in results[:2]
+    }
+
+
+def _search_cached(query):
+    """Serve a previously seen question from the article cache, or None on a miss"""
+    cached = wikipedia_cache.get_search(query)
+    if cached is None:
+        return None
+    _, results = cached
+    if not results:
+        return None
+
+    top_ids = [result['pageid'] for result in results[:2]]
+    extracts = wikipedia_cache.get_articles(top_ids)
+    missing = [result for result in results[:2] if result['pageid'] not in extracts]
+    if missing:
+        fetched = _fetch_extracts(missing)
+        wikipedia_cache.store_articles(missing, fetched)
+        extracts.update(fetched)
+    return build_context(results, extracts)
+
+
+def search_wikipedia(query, extract_topic=True):
+    """Search Wikipedia for relevant information using proper API.
+
+    Warm questions are answered from the article cache without any request. Otherwise
+    the Gemini topic extraction runs alongside a search for the raw question, and the
+    extracts of the raw hits are prefetched while the topic is still pending.
+    """
+    with timed('knowledge_bot.wikipedia'):
+        try:
+            cached = _search_cached(query)
+            if cached is not None:
+                return cached
+
+            topic_future = _executor.submit(extract_search_topic, query) if extract_topic else None
+            raw_future = _executor.submit(search_articles, query)
+            extract_futures = {}
+
+            raw_results = _result(raw_future, [], REQUEST_TIMEOUT * 2)
+            _prefetch_extracts(raw_results, extract_futures)
+
+            results = raw_results
+            search_query = query
+            if topic_future is not None:
+                search_query = _result(topic_future, query, TOPIC_TIMEOUT)
+                if search_query and search_query.strip().lower() != query.strip().lower():
+                    topic_results = _result(_executor.submit(search_articles, search_query), [], REQUEST_TIMEOUT * 2)
+                    if topic_results:
+                        results = topic_results
+                        _prefetch_extracts(results, extract_futures)
+
+            if not results:
+                return {'context': '', 'sources': []}
+
+            extracts = _fetch_extracts(results, extract_futures)
+            wikipedia_cache.store_search(query, search_query, results)
+            wikipedia_cache.store_articles(results, extracts)
+            return build_context(results, extracts)
+
+        except Exception as e:
+            logger.warning("Wikipedia search failed for %r: %s", query, e)
+            return {'context': '', 'sources': []}
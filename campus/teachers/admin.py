@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Subject, PDFNote, Quiz, Question, QuizAttempt
+from .models import Subject, PDFNote, Quiz, Question, QuizAttempt, ReportJob
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -30,3 +30,9 @@ class QuizAttemptAdmin(admin.ModelAdmin):
     list_display = ['quiz', 'student', 'started_at', 'completed_at', 'score', 'total_points']
     list_filter = ['quiz', 'student', 'started_at']
     search_fields = ['student__username', 'quiz__title']
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'teacher', 'status', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['teacher__username', 'fingerprint']
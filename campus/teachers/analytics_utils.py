@@ -0,0 +1,59 @@
+"""
+Aggregate statistics for the teacher quiz analytics page - a few grouped queries per
+teacher, cached briefly and dropped whenever one of the teacher's quizzes is submitted
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Avg, Max, Min
+from .models import QuizAttempt, ProctoringSnapshot
+
+ANALYTICS_CACHE_TTL = getattr(settings, 'QUIZ_ANALYTICS_CACHE_TTL', 60)
+ANALYTICS_KEY = 'quiz_analytics:teacher:{}'
+
+
+def _compute_teacher_summary(teacher_id):
+    completed = QuizAttempt.objects.filter(quiz__created_by_id=teacher_id, completed_at__isnull=False)
+
+    per_quiz = {
+        row['quiz_id']: row
+        for row in completed.order_by().values('quiz_id').annotate(
+            total_attempts=Count('id'),
+            avg_score=Avg('score'),
+            avg_percentage=Avg('percentage'),
+            highest_score=Max('score'),
+            lowest_score=Min('score'),
+            unique_students=Count('student_id', distinct=True),
+        )
+    }
+    unique_students = completed.aggregate(count=Count('student_id', distinct=True))['count']
+
+    # Snapshot totals per attempt; attempts without snapshots never appear
+    violations = {}
+    snapshot_rows = ProctoringSnapshot.objects.filter(
+        attempt__quiz__created_by_id=teacher_id
+    ).order_by().values('attempt_id', 'attempt__quiz_id').annotate(snapshot_count=Count('id'))
+    for row in snapshot_rows:
+        quiz_violations = violations.setdefault(row['attempt__quiz_id'], {'total_violations': 0, 'attempt_ids': []})
+        quiz_violations['total_violations'] += row['snapshot_count']
+        quiz_violations['attempt_ids'].append(row['attempt_id'])
+
+    return {
+        'per_quiz': per_quiz,
+        'total_attempts': sum(row['total_attempts'] for row in per_quiz.values()),
+        'unique_students': unique_students,
+        'violations': violations,
+    }
+
+
+def get_teacher_summary(teacher_id):
+    """Per-quiz attempt aggregates, overall totals and proctoring violation counts"""
+    key = ANALYTICS_KEY.format(teacher_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _compute_teacher_summary(teacher_id)
+        cache.set(key, summary, ANALYTICS_CACHE_TTL)
+    return summary
+
+
+def invalidate_teacher_summary(teacher_id):
+    cache.delete(ANALYTICS_KEY.format(teacher_id))
@@ -0,0 +1,73 @@
+"""
+Cached answer keys for quiz scoring - an immutable snapshot of a quiz's questions per
+quiz version, so submissions are scored without reading the Question table. The version
+is Quiz.answer_key_version, bumped in the same transaction as every question edit, so
+no worker can serve a key from before a committed edit
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+ANSWER_KEY_TTL = getattr(settings, 'ANSWER_KEY_TTL', 24 * 60 * 60)
+ANSWER_KEY = 'answer_key:{}:{}'
+
+
+def build_answer_key(questions):
+    """Compact snapshot: one (id, correct_answer, text, type, options) tuple per question, in quiz order"""
+    return tuple(
+        (
+            str(question.id),
+            question.correct_answer,
+            question.text,
+            question.question_type,
+            question.options if question.question_type == 'multiple_choice' else None,
+        )
+        for question in questions
+    )
+
+
+def get_answer_key(quiz, questions=None):
+    """Answer key for the quiz's current version; questions (already loaded) are used on a miss"""
+    # The quiz row, and with it the version, is read before the questions, so a snapshot
+    # built from rows an edit has since replaced is stored under the old version only
+    key = ANSWER_KEY.format(quiz.id, quiz.answer_key_version)
+    answer_key = cache.get(key)
+    if answer_key is None:
+        if questions is None:
+            from .models import Question
+            questions = Question.objects.filter(quiz_id=quiz.id).order_by('order', 'id')
+        answer_key = build_answer_key(questions)
+        cache.set(key, answer_key, ANSWER_KEY_TTL)
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """Move the quiz to a new answer key version; call inside the transaction that edits its questions"""
+    from .models import Quiz
+    Quiz.objects.filter(pk=quiz_id).update(answer_key_version=F('answer_key_version') + 1)
+
+
+def score_answers(answer_key, answers):
+    """Score submitted answers against an answer key; returns (score, correct_answers, question_details)"""
+    score = 0
+    correct_answers = {}
+    question_details = []
+    for question_id, correct_answer, text, question_type, options in answer_key:
+        student_answer = answers.get(question_id)
+        is_correct = student_answer == correct_answer
+        if is_correct:
+            score += 1
+        correct_answers[question_id] = is_correct
+
+        question_detail = {
+            'id': int(question_id),
+            'text': text,
+            'student_answer': student_answer,
+            'correct_answer': correct_answer,
+            'is_correct': is_correct,
+            'type': question_type
+        }
+        if options is not None:
+            question_detail['options'] = options
+        question_details.append(question_detail)
+    return score, correct_answers, question_details
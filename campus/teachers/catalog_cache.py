@@ -0,0 +1,65 @@
+"""
+Cached subject listings for the read-mostly pages (student dashboard, Magnify Learning,
+practice quiz, teacher dashboard) - stored under a catalog version that Subject, PDFNote
+and Quiz saves and deletes move on, so an edit shows up on the next request
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from .models import Subject, Quiz
+
+CATALOG_CACHE_TTL = getattr(settings, 'CATALOG_CACHE_TTL', 60 * 60)
+VERSION_KEY = 'catalog_version'
+CATALOG_KEY = 'catalog:{}:{}'
+
+
+def _catalog_version():
+    # Seeded from the clock, like the answer key versions, so a version lost to
+    # eviction never comes back as one an older listing was cached under
+    version = int(time.time() * 1000)
+    if cache.add(VERSION_KEY, version, None):
+        return version
+    return cache.get(VERSION_KEY, version)
+
+
+def _cached(name, build):
+    key = CATALOG_KEY.format(_catalog_version(), name)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CATALOG_CACHE_TTL)
+    return value
+
+
+def _subjects_with_counts():
+    return Subject.objects.select_related('teacher').annotate(
+        note_count=Count('notes', distinct=True),
+        quiz_count=Count('quizzes', distinct=True),
+    )
+
+
+def get_subjects():
+    """All subjects with their teacher and note/quiz counts"""
+    return _cached('subjects', lambda: list(_subjects_with_counts()))
+
+
+def get_subjects_with_notes():
+    """All subjects with their notes loaded"""
+    return _cached('subjects_with_notes', lambda: list(Subject.objects.prefetch_related('notes')))
+
+
+def get_teacher_dashboard(teacher_id):
+    """A teacher's subjects (with note/quiz counts) and ten most recent quizzes"""
+    return _cached(f'teacher:{teacher_id}', lambda: {
+        'subjects': list(_subjects_with_counts().filter(teacher_id=teacher_id)),
+        'quizzes': list(Quiz.objects.filter(created_by_id=teacher_id).order_by('-created_at')[:10]),
+    })
+
+
+def invalidate_catalog():
+    """Start a new catalog version; call after subject, note or quiz changes are committed"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
@@ -0,0 +1,234 @@
+"""
+Benchmark the hot QuizAttempt / ChatMessage / ChatHistory lookups with and without
+their composite indexes on a synthetic dataset.
+
+    python manage.py benchmark_indexes
+    python manage.py benchmark_indexes --attempts 100000 --messages 500000 --plans
+
+Seeds users, quizzes, attempts, chat messages and PDF chat history, then runs each
+view's query with the indexes from the hot_lookup_indexes migrations dropped and
+again with them created, printing latency (and with --plans the query plans).
+
+Everything happens inside a transaction that is rolled back afterwards, so the
+database and its indexes are left untouched. Run migrations first.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Avg, Q
+from django.utils import timezone
+
+HOT_INDEXES = {
+    'teachers.QuizAttempt': ['attempt_student_quiz_idx', 'attempt_quiz_completed_idx'],
+    'teachers.ChatMessage': ['chat_thread_idx', 'chat_unread_idx'],
+    'students.ChatHistory': ['chat_history_thread_idx'],
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare hot view queries before and after the composite/partial indexes"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=1_000_000)
+        parser.add_argument('--messages', type=int, default=5_000_000)
+        parser.add_argument('--chat-history', type=int, default=500_000)
+        parser.add_argument('--students', type=int, default=20_000)
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--quizzes', type=int, default=500)
+        parser.add_argument('--runs', type=int, default=20, help="Executions per query (different users each time)")
+        parser.add_argument('--plans', action='store_true', help="Print the query plan of every query")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic data and index changes rolled back")
+
+    def insert_rows(self, model, columns, rows, batch_size=20000):
+        """Raw executemany, so explicit created_at values survive (bulk_create would apply auto_now_add)"""
+        table = connection.ops.quote_name(model._meta.db_table)
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        count = 0
+        with connection.cursor() as cursor:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    cursor.executemany(sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        return count
+
+    def seed(self, options):
+        from authentication.models import User
+        from teachers.models import Subject, PDFNote, Quiz, QuizAttempt, ChatMessage
+        from students.models import ChatHistory
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        now = timezone.now()
+
+        def timestamp(max_days=180):
+            return connection.ops.adapt_datetimefield_value(now - timedelta(seconds=rng.randint(0, max_days * 86400)))
+
+        teachers = User.objects.bulk_create([
+            User(username=f'bench_teacher_{i}', role='teacher') for i in range(options['teachers'])
+        ])
+        students = User.objects.bulk_create([
+            User(username=f'bench_student_{i}', role='student') for i in range(options['students'])
+        ], batch_size=5000)
+        subjects = Subject.objects.bulk_create([Subject(name=f'Bench {t.id}', teacher=t) for t in teachers])
+        notes = PDFNote.objects.bulk_create([
+            PDFNote(subject=subject, title=f'Bench note {i}', pdf_file='notes/bench.pdf', uploaded_by=subject.teacher)
+            for subject in subjects for i in range(4)
+        ])
+        quizzes = Quiz.objects.bulk_create([
+            Quiz(title=f'Bench quiz {i}', subject=subjects[i % len(subjects)], created_by=subjects[i % len(subjects)].teacher)
+            for i in range(options['quizzes'])
+        ])
+        student_ids = [s.id for s in students]
+        teacher_ids = [t.id for t in teachers]
+        quiz_ids = [q.id for q in quizzes]
+        note_ids = [n.id for n in notes]
+
+        def attempt_rows():
+            for _ in range(options['attempts']):
+                started_at = timestamp()
+                completed = rng.random() < 0.85
+                total = rng.choice([5, 10, 20])
+                yield (rng.choice(quiz_ids), rng.choice(student_ids), started_at, started_at if completed else None,
+                       rng.randint(0, total) if completed else None, total, '{}', '[]', 0, 0)
+
+        def message_rows():
+            for _ in range(options['messages']):
+                student, teacher = rng.choice(student_ids), rng.choice(teacher_ids)
+                sender, receiver = (student, teacher) if rng.random() < 0.5 else (teacher, student)
+                yield (sender, receiver, 'hello', '', timestamp(), rng.random() < 0.9)
+
+        def history_rows():
+            for _ in range(options['chat_history']):
+                yield (rng.choice(student_ids), rng.choice(note_ids), 'question', 'answer', timestamp())
+
+        counts = {
+            'attempts': self.insert_rows(QuizAttempt, [
+                'quiz_id', 'student_id', 'started_at', 'completed_at', 'score', 'total_points', 'answers',
+                'proctoring_violations', 'tab_switch_count', 'fullscreen_exit_count',
+            ], attempt_rows()),
+            'messages': self.insert_rows(ChatMessage, [
+                'sender_id', 'receiver_id', 'message', 'file', 'created_at', 'is_read',
+            ], message_rows()),
+            'chat history rows': self.insert_rows(ChatHistory, [
+                'student_id', 'pdf_note_id', 'question', 'answer', 'created_at',
+            ], history_rows()),
+        }
+        self.stdout.write(
+            "Seeded " + ", ".join(f"{count} {label}" for label, count in counts.items()) +
+            f" in {time.perf_counter() - started:.1f}s"
+        )
+
+        self.samples = {
+            'students': rng.sample(student_ids, min(options['runs'], len(student_ids))),
+            'teachers': [rng.choice(teacher_ids) for _ in range(options['runs'])],
+            'quizzes': [rng.choice(quiz_ids) for _ in range(options['runs'])],
+            'notes': [rng.choice(note_ids) for _ in range(options['runs'])],
+            'quiz_ids': quiz_ids,
+        }
+
+    def hot_queries(self):
+        """(label, build(i), evaluate) triples mirroring the queries the views issue for the i-th sample user"""
+        from teachers.models import QuizAttempt, ChatMessage
+        from students.models import ChatHistory
+
+        s = self.samples
+
+        def student(i):
+            return s['students'][i % len(s['students'])]
+
+        def teacher(i):
+            return s['teachers'][i % len(s['teachers'])]
+
+        return [
+            ('student quiz list attempts', lambda i: QuizAttempt.objects.filter(
+                student_id=student(i), completed_at__isnull=False, quiz_id__in=s['quiz_ids'][:50]
+            ), list),
+            ('take_quiz existing attempt', lambda i: QuizAttempt.objects.filter(
+                student_id=student(i), quiz_id=s['quizzes'][i % len(s['quizzes'])], completed_at__isnull=False
+            )[:1], list),
+            ('reports recent attempts', lambda i: QuizAttempt.objects.filter(
+                quiz__created_by_id=teacher(i)
+            ).order_by('-completed_at')[:10], list),
+            ('analytics per-quiz aggregates', lambda i: QuizAttempt.objects.filter(
+                quiz__created_by_id=teacher(i), completed_at__isnull=False
+            ).order_by().values('quiz_id').annotate(total=Count('id'), avg=Avg('score')), list),
+            ('chat unread count', lambda i: ChatMessage.objects.filter(
+                sender_id=student(i), receiver_id=teacher(i), is_read=False
+            ), lambda queryset: queryset.count()),
+            ('chat last message', lambda i: ChatMessage.objects.filter(
+                Q(sender_id=teacher(i), receiver_id=student(i)) | Q(sender_id=student(i), receiver_id=teacher(i))
+            ).order_by('-created_at')[:1], list),
+            ('pdf chat recent history', lambda i: ChatHistory.objects.filter(
+                student_id=student(i), pdf_note_id=s['notes'][i % len(s['notes'])]
+            ).order_by('-created_at')[:5], list),
+        ]
+
+    def set_indexes(self, present):
+        """Create or drop the hot-lookup indexes (DDL is transactional, so the rollback restores them)"""
+        from django.apps import apps
+
+        editor = connection.schema_editor(atomic=False)
+        with connection.cursor() as cursor:
+            for label, names in HOT_INDEXES.items():
+                model = apps.get_model(label)
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for index in model._meta.indexes:
+                    if index.name not in names or (index.name in existing) == present:
+                        continue
+                    if present:
+                        cursor.execute(str(index.create_sql(model, editor)))
+                    else:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+    def measure(self, options):
+        results = {}
+        for label, build, evaluate in self.hot_queries():
+            evaluate(build(0))  # warm the page cache
+            timings = []
+            for i in range(options['runs']):
+                queryset = build(i)
+                started = time.perf_counter()
+                evaluate(queryset)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            results[label] = (timings[len(timings) // 2], build(0).explain())
+        return results
+
+    def run(self, options):
+        self.set_indexes(False)
+        before = self.measure(options)
+        self.set_indexes(True)
+        after = self.measure(options)
+
+        self.stdout.write(f"\n{'query':<32}{'before p50':>12}{'after p50':>12}{'speedup':>10}")
+        for label, (before_p50, before_plan) in before.items():
+            after_p50, after_plan = after[label]
+            speedup = before_p50 / after_p50 if after_p50 else float('inf')
+            self.stdout.write(f"{label:<32}{before_p50 * 1000:>10.2f}ms{after_p50 * 1000:>10.2f}ms{speedup:>9.1f}x")
+            if options['plans']:
+                self.stdout.write(f"  before: {' | '.join(before_plan.splitlines())}")
+                self.stdout.write(f"  after:  {' | '.join(after_plan.splitlines())}")
@@ -0,0 +1,23 @@
+"""
+Delete report jobs and generated PDF reports older than REPORT_ARTIFACT_TTL.
+
+    python manage.py expire_reports
+    python manage.py expire_reports --ttl 3600
+
+Report submissions already run this at most once an hour; schedule it (cron) on
+servers where reports are rarely requested.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete expired report jobs and their PDF files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=None, help="Age in seconds (defaults to REPORT_ARTIFACT_TTL)")
+
+    def handle(self, *args, **options):
+        from teachers.report_jobs import expire_report_artifacts
+
+        jobs, files = expire_report_artifacts(options['ttl'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {jobs} report jobs and {files} report files"))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0010_reportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'receiver', 'created_at'], name='chat_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['sender', 'receiver'], name='chat_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['student', 'quiz', 'completed_at'], name='attempt_student_quiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', '-completed_at'], name='attempt_quiz_completed_idx'),
+        ),
+    ]
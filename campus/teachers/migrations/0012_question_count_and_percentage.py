@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    Quiz = apps.get_model('teachers', 'Quiz')
+    QuizAttempt = apps.get_model('teachers', 'QuizAttempt')
+
+    quizzes = []
+    for quiz in Quiz.objects.annotate(num=Count('questions')).only('id').iterator(chunk_size=2000):
+        quiz.question_count = quiz.num
+        quizzes.append(quiz)
+    Quiz.objects.bulk_update(quizzes, ['question_count'], batch_size=1000)
+
+    # Historical models don't carry QuizAttempt.save(), so mirror compute_percentage here
+    batch = []
+    for attempt in QuizAttempt.objects.filter(score__isnull=False).only('id', 'score', 'total_points').iterator(chunk_size=2000):
+        attempt.percentage = round(attempt.score / attempt.total_points * 100, 2) if attempt.total_points > 0 else 0
+        batch.append(attempt)
+        if len(batch) == 2000:
+            QuizAttempt.objects.bulk_update(batch, ['percentage'])
+            batch = []
+    QuizAttempt.objects.bulk_update(batch, ['percentage'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0011_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='percentage',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0012_question_count_and_percentage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='submission_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:08
+
+import teachers.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0013_quizattempt_submission_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='answer_key_version',
+            field=models.BigIntegerField(default=teachers.models.new_answer_key_version),
+        ),
+    ]
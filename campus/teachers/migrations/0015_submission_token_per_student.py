@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0014_quiz_answer_key_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizattempt',
+            name='submission_token',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='quizattempt',
+            constraint=models.UniqueConstraint(fields=('student', 'submission_token'), name='attempt_student_token_uniq'),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from authentication.models import User
 import json
+import time
 
 class Subject(models.Model):
     name = models.CharField(max_length=200)
@@ -11,6 +12,17 @@ class Subject(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        super().save(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+    
+    def delete(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+        return result
+    
     class Meta:
         ordering = ['name']
 
@@ -38,9 +50,24 @@ class PDFNote(models.Model):
         }
         return icons.get(ext, 'bi-file-earmark')
     
+    def save(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        super().save(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+    
+    def delete(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+        return result
+    
     class Meta:
         ordering = ['-created_at']
 
+def new_answer_key_version():
+    # Clock-seeded, so a quiz id reused after a delete never matches an older cached key
+    return int(time.time() * 1000)
+
 class Quiz(models.Model):
     title = models.CharField(max_length=200)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='quizzes')
@@ -54,10 +81,28 @@ class Quiz(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     deadline = models.DateTimeField(null=True, blank=True, help_text="Quiz deadline")
     is_active = models.BooleanField(default=True)
+    question_count = models.PositiveIntegerField(default=0)  # Maintained by Question.save()/delete()
+    answer_key_version = models.BigIntegerField(default=new_answer_key_version)  # Bumped with every question edit
     
     def __str__(self):
         return f"{self.title} - {self.subject.name}"
     
+    def refresh_question_count(self):
+        """Recount the quiz's questions into question_count"""
+        self.question_count = self.questions.count()
+        Quiz.objects.filter(pk=self.pk).update(question_count=self.question_count)
+    
+    def save(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        super().save(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+    
+    def delete(self, *args, **kwargs):
+        from .catalog_cache import invalidate_catalog
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(invalidate_catalog)
+        return result
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Quizzes"
@@ -80,6 +125,24 @@ class Question(models.Model):
     def __str__(self):
         return f"{self.quiz.title} - Q{self.order}"
     
+    def save(self, *args, **kwargs):
+        from .answer_keys import invalidate_answer_key
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.quiz.refresh_question_count()
+            invalidate_answer_key(self.quiz_id)
+    
+    def delete(self, *args, **kwargs):
+        from .answer_keys import invalidate_answer_key
+        quiz = self.quiz
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            quiz.refresh_question_count()
+            invalidate_answer_key(quiz.id)
+        return result
+    
     class Meta:
         ordering = ['order']
 
@@ -90,18 +153,43 @@ class QuizAttempt(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     score = models.IntegerField(null=True, blank=True)
     total_points = models.IntegerField(default=0)
+    percentage = models.FloatField(null=True, blank=True)  # score / total_points, set on save
     answers = models.JSONField(default=dict)  # Store student answers
     
     # Proctoring fields
     proctoring_violations = models.JSONField(default=list, blank=True)  # Store violation logs
     tab_switch_count = models.IntegerField(default=0)
     fullscreen_exit_count = models.IntegerField(default=0)
+    submission_token = models.CharField(max_length=64, null=True, blank=True)  # Client idempotency key, unique per student
     
     def __str__(self):
         return f"{self.student.username} - {self.quiz.title}"
     
+    @staticmethod
+    def compute_percentage(score, total_points):
+        if score is None:
+            return None
+        return round(score / total_points * 100, 2) if total_points and total_points > 0 else 0
+    
+    def save(self, *args, **kwargs):
+        self.percentage = self.compute_percentage(self.score, self.total_points)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('score' in update_fields or 'total_points' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'percentage'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            # A student's attempt at a quiz (quiz list, take/submit quiz, leaderboard)
+            models.Index(fields=['student', 'quiz', 'completed_at'], name='attempt_student_quiz_idx'),
+            # Completed attempts per quiz, newest first (reports, analytics)
+            models.Index(fields=['quiz', '-completed_at'], name='attempt_quiz_completed_idx'),
+        ]
+        constraints = [
+            # Tokens come from the client, so they only have to be unique per student
+            models.UniqueConstraint(fields=['student', 'submission_token'], name='attempt_student_token_uniq'),
+        ]
 
 
 class ProctoringSnapshot(models.Model):
@@ -144,3 +232,33 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Conversation threads and their latest message
+            models.Index(fields=['sender', 'receiver', 'created_at'], name='chat_thread_idx'),
+            # Unread counts and mark-as-read; only unread rows are indexed
+            models.Index(fields=['sender', 'receiver'], condition=models.Q(is_read=False), name='chat_unread_idx'),
+        ]
+
+class ReportJob(models.Model):
+    """Background PDF report generation for a set of report filters"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    fingerprint = models.CharField(max_length=64, db_index=True)  # QuizReportFilter.fingerprint()
+    params = models.JSONField(default=dict)  # Filter query parameters the job was submitted with
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file_path = models.CharField(max_length=500, blank=True)  # Relative to MEDIA_ROOT
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Report {self.id} ({self.status}) - {self.teacher.username}"
+    
+    class Meta:
+        ordering = ['-created_at']
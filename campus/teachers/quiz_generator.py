@@ -6,6 +6,7 @@ from google import genai
 from dotenv import load_dotenv
 import json
 import re
+from student_campus.telemetry import timed
 
 # Load .env from the campus directory
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -86,6 +87,7 @@ def extract_text_from_pptx(pptx_path):
         print(f"Error extracting PowerPoint text: {e}")
         return None
 
+@timed('quiz.extract')
 def extract_text_from_file(file_path, max_pages=20):
     """Extract text from PDF, Word, or PowerPoint file"""
     try:
@@ -151,14 +153,15 @@ Rules:
 - Return ONLY valid JSON, nothing else"""
     
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config={
-                "temperature": 0.7,
-                "response_mime_type": "application/json"
-            }
-        )
+        with timed('quiz.generate', num_questions=num_questions, difficulty=difficulty):
+            response = client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=prompt,
+                config={
+                    "temperature": 0.7,
+                    "response_mime_type": "application/json"
+                }
+            )
         
         response_text = response.text.strip()
         
@@ -214,6 +217,7 @@ Rules:
         print(f"Error generating questions: {e}")
         return []
 
+@timed('quiz.total')
 def generate_quiz_from_pdf(pdf_path, num_questions=10, topics=None, difficulty='medium'):
     """Main function to generate quiz from PDF, Word, or PowerPoint file"""
     
@@ -0,0 +1,117 @@
+"""
+Background PDF report jobs - the Reports page submits its filters, polls the job and
+downloads the finished artifact from MEDIA_ROOT instead of holding a request open
+for the whole ReportLab render
+"""
+import os
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from .models import ReportJob
+from .reports_generator import QuizReportFilter, QuizReportGenerator, REPORT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+REPORT_ARTIFACT_TTL = getattr(settings, 'REPORT_ARTIFACT_TTL', 24 * 60 * 60)
+REPORT_JOB_WORKERS = getattr(settings, 'REPORT_JOB_WORKERS', 2)
+FILTER_PARAMS = (
+    'quiz_id', 'subject_id', 'student_id', 'difficulty', 'start_date', 'end_date',
+    'min_score', 'max_score', 'min_percentage', 'max_percentage', 'search', 'sort',
+)
+# A pending or running job older than this was lost with a restarted worker (or is stuck)
+# and is replaced instead of reused
+REPORT_JOB_STALE_AFTER = getattr(settings, 'REPORT_JOB_STALE_AFTER', 10 * 60)
+EXPIRY_LOCK_KEY = 'report_jobs:expiry'
+EXPIRY_INTERVAL = 60 * 60
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix='report-jobs')
+
+
+def _artifact_exists(job):
+    return bool(job.file_path) and os.path.exists(os.path.join(settings.MEDIA_ROOT, job.file_path))
+
+
+def submit_report_job(teacher, params):
+    """Queue a PDF report for the given filters, reusing a live job for the same fingerprint"""
+    params = {key: params[key] for key in FILTER_PARAMS if params.get(key)}
+    report_filter = QuizReportFilter.from_params(teacher, params)
+    fingerprint = report_filter.fingerprint()
+
+    existing = ReportJob.objects.filter(
+        teacher=teacher, fingerprint=fingerprint, status__in=['pending', 'running', 'done']
+    ).first()
+    if existing and existing.status != 'done':
+        if existing.created_at >= timezone.now() - timedelta(seconds=REPORT_JOB_STALE_AFTER):
+            return existing
+        ReportJob.objects.filter(id=existing.id, status__in=['pending', 'running']).update(
+            status='failed', error='Report job timed out', finished_at=timezone.now()
+        )
+    elif existing and _artifact_exists(existing):
+        return existing
+
+    job = ReportJob.objects.create(teacher=teacher, fingerprint=fingerprint, params=params)
+    _executor.submit(run_report_job, job.id)
+
+    if cache.add(EXPIRY_LOCK_KEY, True, EXPIRY_INTERVAL):
+        _executor.submit(expire_report_artifacts)
+    return job
+
+
+def run_report_job(job_id):
+    """Render the PDF for a queued job on a worker thread"""
+    try:
+        job = ReportJob.objects.select_related('teacher').get(id=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status'])
+
+        try:
+            report_filter = QuizReportFilter.from_params(job.teacher, job.params)
+            pdf_path = QuizReportGenerator(report_filter).get_or_generate_pdf()
+            job.file_path = os.path.relpath(pdf_path, settings.MEDIA_ROOT)
+            job.status = 'done'
+        except Exception as e:
+            logger.exception("Report job %s failed", job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'file_path', 'error', 'finished_at'])
+    except ReportJob.DoesNotExist:
+        logger.warning("Report job %s disappeared before it ran", job_id)
+    finally:
+        # Runs on a worker thread, which owns its own database connection
+        connection.close()
+
+
+def expire_report_artifacts(ttl=None):
+    """Delete jobs older than the TTL and cached PDFs no remaining job points to"""
+    ttl = REPORT_ARTIFACT_TTL if ttl is None else ttl
+    try:
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        deleted_jobs, _ = ReportJob.objects.filter(created_at__lt=cutoff).delete()
+
+        live_files = {
+            os.path.normpath(os.path.join(settings.MEDIA_ROOT, path))
+            for path in ReportJob.objects.exclude(file_path='').values_list('file_path', flat=True)
+        }
+        deleted_files = 0
+        if os.path.isdir(REPORT_CACHE_DIR):
+            oldest_mtime = time.time() - ttl
+            for name in os.listdir(REPORT_CACHE_DIR):
+                path = os.path.normpath(os.path.join(REPORT_CACHE_DIR, name))
+                if path in live_files or os.path.getmtime(path) >= oldest_mtime:
+                    continue
+                try:
+                    os.remove(path)
+                    deleted_files += 1
+                except OSError as e:
+                    logger.warning("Could not remove expired report %s: %s", path, e)
+
+        logger.info("Expired %d report jobs and %d report files", deleted_jobs, deleted_files)
+        return deleted_jobs, deleted_files
+    finally:
+        connection.close()
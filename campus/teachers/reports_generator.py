@@ -1,10 +1,15 @@
 """
 Reports module for teachers - Generate and filter quiz reports with PDF export
 """
-from django.db.models import Q, Count, Avg, Max, Min
-from teachers.models import Quiz, QuizAttempt, Question
+import os
+import hashlib
+import threading
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db.models import Q, F, Count, Avg, Max, Min
+from teachers.models import QuizAttempt, Question
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 from io import BytesIO
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -12,7 +17,21 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.pdfbase.pdfmetrics import stringWidth
 import json
+import numpy as np
+
+# Attempt rows per platypus Table; small tables keep layout linear in the row count
+ROWS_PER_TABLE = 40
+ATTEMPTS_PAGE_SIZE = 25
+# sort key -> (QuizAttempt field, descending)
+SORT_ORDERS = {
+    'recent': ('completed_at', True),
+    'percentage_desc': ('percentage', True),
+    'percentage_asc': ('percentage', False),
+}
+MAX_ATTEMPTS_PAGE_SIZE = 100
+REPORT_CACHE_DIR = getattr(settings, 'REPORT_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'reports', 'cache'))
 
 
 class QuizReportFilter:
@@ -22,6 +41,56 @@ class QuizReportFilter:
         self.teacher = teacher
         self.filters = {}
     
+    @classmethod
+    def from_params(cls, teacher, params):
+        """Build a filter from download/export query parameters"""
+        report_filter = cls(teacher)
+        
+        if params.get('quiz_id'):
+            report_filter.set_quiz_filter(params['quiz_id'])
+        
+        if params.get('subject_id'):
+            report_filter.set_subject_filter(params['subject_id'])
+        
+        if params.get('student_id'):
+            report_filter.set_student_filter(params['student_id'])
+        
+        if params.get('difficulty'):
+            report_filter.set_difficulty_filter(params['difficulty'])
+        
+        # Date range
+        if params.get('start_date') and params.get('end_date'):
+            start_date = timezone.datetime.fromisoformat(params['start_date'])
+            end_date = timezone.datetime.fromisoformat(params['end_date'])
+            report_filter.set_date_range_filter(start_date, end_date)
+        
+        # Score range
+        if params.get('min_score') and params.get('min_score') != '':
+            try:
+                min_score = int(params['min_score'])
+                max_score = int(params.get('max_score', 1000)) if params.get('max_score') and params.get('max_score') != '' else 1000
+                report_filter.set_score_range_filter(min_score, max_score)
+            except (ValueError, TypeError):
+                pass  # Skip if conversion fails
+        
+        # Percentage range
+        if params.get('min_percentage') or params.get('max_percentage'):
+            try:
+                min_percentage = float(params['min_percentage']) if params.get('min_percentage') else None
+                max_percentage = float(params['max_percentage']) if params.get('max_percentage') else None
+                report_filter.set_percentage_range_filter(min_percentage, max_percentage)
+            except (ValueError, TypeError):
+                pass  # Skip if conversion fails
+        
+        # Search
+        if params.get('search'):
+            report_filter.set_search_filter(params['search'])
+        
+        if params.get('sort') in SORT_ORDERS:
+            report_filter.set_sort(params['sort'])
+        
+        return report_filter
+    
     def set_quiz_filter(self, quiz_id):
         """Filter by specific quiz"""
         self.filters['quiz_id'] = quiz_id
@@ -44,6 +113,19 @@ class QuizReportFilter:
         self.filters['max_score'] = max_score
         return self
     
+    def set_percentage_range_filter(self, min_percentage=None, max_percentage=None):
+        """Filter by stored score percentage; either bound may be None"""
+        self.filters['min_percentage'] = min_percentage
+        self.filters['max_percentage'] = max_percentage
+        return self
+    
+    def set_sort(self, sort):
+        """Order attempts by one of SORT_ORDERS"""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        self.filters['sort'] = sort
+        return self
+    
     def set_student_filter(self, student_id):
         """Filter by specific student"""
         self.filters['student_id'] = student_id
@@ -66,9 +148,7 @@ class QuizReportFilter:
     
     def get_attempts(self):
         """Get filtered quiz attempts"""
-        query = QuizAttempt.objects.filter(quiz__created_by=self.teacher).select_related(
-            'quiz', 'student'
-        ).prefetch_related('quiz__questions')
+        query = QuizAttempt.objects.filter(quiz__created_by=self.teacher).select_related('quiz', 'student')
         
         # Apply filters
         if 'quiz_id' in self.filters:
@@ -101,6 +181,12 @@ class QuizReportFilter:
         if 'max_score' in self.filters and self.filters['max_score'] is not None:
             query = query.filter(score__lte=self.filters['max_score'])
         
+        if self.filters.get('min_percentage') is not None:
+            query = query.filter(percentage__gte=self.filters['min_percentage'])
+        
+        if self.filters.get('max_percentage') is not None:
+            query = query.filter(percentage__lte=self.filters['max_percentage'])
+        
         if 'search' in self.filters and self.filters['search']:
             search_text = self.filters['search']
             query = query.filter(
@@ -110,31 +196,89 @@ class QuizReportFilter:
                 Q(student__last_name__icontains=search_text)
             )
         
-        return query.order_by('-completed_at')
+        # In-progress attempts (no completed_at / percentage) sort last on every backend;
+        # id breaks ties for keyset paging
+        field, descending = SORT_ORDERS[self.filters.get('sort', 'recent')]
+        order = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+        return query.order_by(order, '-id')
     
-    def get_statistics(self):
-        """Get aggregate statistics for filtered data"""
+    def get_page(self, cursor=None, page_size=ATTEMPTS_PAGE_SIZE):
+        """One page of filtered attempts after the given cursor; returns (attempts, next_cursor)"""
+        field, descending = SORT_ORDERS[self.filters.get('sort', 'recent')]
         attempts = self.get_attempts()
-        completed_attempts = attempts.filter(completed_at__isnull=False)
+        if cursor:
+            value, attempt_id = self._decode_cursor(cursor, field)
+            if value is None:
+                attempts = attempts.filter(**{f'{field}__isnull': True}, id__lt=attempt_id)
+            else:
+                attempts = attempts.filter(
+                    Q(**{f"{field}__{'lt' if descending else 'gt'}": value}) |
+                    Q(**{field: value}, id__lt=attempt_id) |
+                    Q(**{f'{field}__isnull': True})
+                )
+        
+        page = list(attempts[:page_size + 1])
+        if len(page) <= page_size:
+            return page, None
+        page = page[:page_size]
+        last = page[-1]
+        return page, self._encode_cursor(getattr(last, field), last.id)
+    
+    @staticmethod
+    def _encode_cursor(value, attempt_id):
+        if value is None:
+            value = ''
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        return f"{value}|{attempt_id}"
+    
+    @staticmethod
+    def _decode_cursor(cursor, field):
+        """Inverse of _encode_cursor; raises ValueError for malformed cursors"""
+        value, _, attempt_id = cursor.rpartition('|')
+        if not value:
+            return None, int(attempt_id)
+        if field == 'completed_at':
+            return datetime.fromisoformat(value), int(attempt_id)
+        return float(value), int(attempt_id)
+    
+    def fingerprint(self):
+        """Identifies the report for these filters and the current state of the matching attempts"""
+        version = self.get_attempts().order_by().aggregate(
+            count=Count('id'), last_id=Max('id'), last_completed=Max('completed_at')
+        )
+        payload = json.dumps(
+            {'teacher': self.teacher.id, 'filters': self.filters, 'version': version},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get_statistics(self):
+        """Get aggregate statistics for filtered data in a single conditional-aggregate query"""
+        completed = Q(completed_at__isnull=False)
+        agg = self.get_attempts().order_by().aggregate(
+            total_attempts=Count('id'),
+            completed_attempts=Count('id', filter=completed),
+            unique_students=Count('student_id', distinct=True),
+            total_quizzes=Count('quiz_id', distinct=True),
+            avg_score=Avg('score', filter=completed),
+            max_score=Max('score', filter=completed),
+            min_score=Min('score', filter=completed),
+            avg_total=Avg('total_points', filter=completed),
+        )
         
         stats = {
-            'total_attempts': attempts.count(),
-            'completed_attempts': completed_attempts.count(),
+            'total_attempts': agg['total_attempts'],
+            'completed_attempts': agg['completed_attempts'],
             'avg_score': None,
             'max_score': None,
             'min_score': None,
             'avg_percentage': None,
-            'unique_students': attempts.values('student').distinct().count(),
-            'total_quizzes': attempts.values('quiz').distinct().count(),
+            'unique_students': agg['unique_students'],
+            'total_quizzes': agg['total_quizzes'],
         }
         
-        if completed_attempts.exists():
-            agg = completed_attempts.aggregate(
-                avg_score=Avg('score'),
-                max_score=Max('score'),
-                min_score=Min('score'),
-                avg_total=Avg('total_points')
-            )
+        if agg['completed_attempts']:
             stats['avg_score'] = round(agg['avg_score'], 2) if agg['avg_score'] else 0
             stats['max_score'] = agg['max_score']
             stats['min_score'] = agg['min_score']
@@ -256,74 +400,97 @@ class QuizReportGenerator:
         elements.append(stats_table)
         return elements
     
+    def _attempt_rows(self):
+        """Plain-text table rows for the filtered attempts, streamed from a values_list iterator"""
+        attempts = self.filter_obj.get_attempts().values_list(
+            'quiz__title', 'student__username', 'student__first_name', 'student__last_name',
+            'score', 'total_points', 'percentage', 'completed_at'
+        )
+        for title, username, first_name, last_name, score, total, percentage, completed_at in attempts.iterator(chunk_size=ROWS_PER_TABLE * 10):
+            score = score if score else 0
+            total = total if total else 0
+            percentage = percentage or 0
+            
+            # Get student name - fallback to username if first/last names are empty
+            student_name = f"{first_name} {last_name}".strip() or username
+            
+            yield [
+                str(title)[:30],
+                str(student_name)[:35],
+                f"{score}/{total}",
+                f"{percentage}%",
+                completed_at.strftime('%d-%m-%Y') if completed_at else 'N/A',
+            ]
+    
+    def _cell(self, text, width):
+        """Plain string when it fits the column, otherwise a wrapping Paragraph"""
+        if stringWidth(text, 'Helvetica', 9) <= width - 16:
+            return text
+        return Paragraph(escape(text), self.styles['Normal'])
+    
     def _build_attempts_table(self):
-        """Build detailed attempts table with proper formatting"""
+        """Build detailed attempts table as fixed-size page tables, one chunk of rows at a time"""
         elements = []
         
         elements.append(Spacer(1, 0.2*inch))
         elements.append(Paragraph("📋 Detailed Attempt Records", self.styles['CustomHeading']))
         elements.append(Spacer(1, 0.15*inch))
         
-        attempts = self.filter_obj.get_attempts()
-        
-        # Create table data using Paragraph objects for proper rendering
-        header = [
-            Paragraph('<b>Quiz Title</b>', self.styles['Normal']),
-            Paragraph('<b>Student Name</b>', self.styles['Normal']),
-            Paragraph('<b>Score</b>', self.styles['Normal']),
-            Paragraph('<b>Percentage</b>', self.styles['Normal']),
-            Paragraph('<b>Completed Date</b>', self.styles['Normal']),
-        ]
-        
-        table_data = [header]
-        
-        for attempt in attempts:
-            score = attempt.score if attempt.score else 0
-            total = attempt.total_points if attempt.total_points else 0
-            percentage = round((score / total * 100), 2) if total and total > 0 else 0
-            
-            # Get student name - fallback to username if first/last names are empty
-            student_name = attempt.student.get_full_name().strip() if attempt.student.get_full_name() else attempt.student.username
-            if not student_name or student_name.isspace():
-                student_name = attempt.student.username
-            
-            row = [
-                Paragraph(str(attempt.quiz.title)[:30], self.styles['Normal']),
-                Paragraph(str(student_name)[:35], self.styles['Normal']),
-                Paragraph(str(f"{score}/{total}"), self.styles['Normal']),
-                Paragraph(str(f"{percentage}%"), self.styles['Normal']),
-                Paragraph(str(attempt.completed_at.strftime('%d-%m-%Y')) if attempt.completed_at else 'N/A', self.styles['Normal']),
-            ]
-            table_data.append(row)
-        
-        if len(table_data) > 1:
-            attempts_table = Table(table_data, colWidths=[1.5*inch, 2.2*inch, 0.9*inch, 1*inch, 1.4*inch])
-            attempts_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0891b2')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#a5f3fc')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#e0f7fb')]),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('TOPPADDING', (0, 1), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(attempts_table)
-            
+        header = ['Quiz Title', 'Student Name', 'Score', 'Percentage', 'Completed Date']
+        col_widths = [1.5*inch, 2.2*inch, 0.9*inch, 1*inch, 1.4*inch]
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0891b2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#a5f3fc')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#e0f7fb')]),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ])
+        
+        total_records = 0
+        chunk = []
+        for row in self._attempt_rows():
+            chunk.append([self._cell(value, width) for value, width in zip(row, col_widths)])
+            total_records += 1
+            if len(chunk) == ROWS_PER_TABLE:
+                elements.append(Table([header] + chunk, colWidths=col_widths, style=table_style, repeatRows=1))
+                chunk = []
+        if chunk:
+            elements.append(Table([header] + chunk, colWidths=col_widths, style=table_style, repeatRows=1))
+        
+        if total_records:
             # Add summary at bottom
             elements.append(Spacer(1, 0.15*inch))
-            summary_text = f"<i>Total Records: <b>{attempts.count()}</b></i>"
+            summary_text = f"<i>Total Records: <b>{total_records}</b></i>"
             elements.append(Paragraph(summary_text, self.styles['Normal']))
         else:
             elements.append(Paragraph("<i>No data available for the selected filters.</i>", self.styles['Normal']))
         
         return elements
+    
+    def get_or_generate_pdf(self):
+        """Path of the PDF for these filters, generated only when the cache has no fresh copy"""
+        fingerprint = self.filter_obj.fingerprint()
+        path = os.path.join(REPORT_CACHE_DIR, f"quiz_report_{fingerprint}.pdf")
+        if os.path.exists(path):
+            return path
+        
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        pdf_buffer, _ = self.generate_pdf()
+        # Write under a temporary name so concurrent downloads never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_buffer.getbuffer())
+        os.replace(tmp_path, path)
+        return path
 
 
 class QuizAnalytics:
@@ -331,38 +498,79 @@ class QuizAnalytics:
     
     @staticmethod
     def get_performance_by_question(quiz_id):
-        """Get performance metrics for each question in a quiz"""
-        quiz = Quiz.objects.get(id=quiz_id)
-        questions = quiz.questions.all()
-        
+        """
+        Get performance metrics for each question in a quiz.
+
+        Attempts are loaded once and turned into a question x attempt correctness matrix;
+        success rate, option (distractor) frequencies and the discrimination index (upper
+        minus lower 27% of attempts by score) are derived from it with numpy.
+        """
+        questions = list(Question.objects.filter(quiz_id=quiz_id).values_list(
+            'id', 'text', 'question_type', 'options', 'correct_answer'
+        ))
+        answer_sets = list(QuizAttempt.objects.filter(
+            quiz_id=quiz_id,
+            completed_at__isnull=False
+        ).values_list('answers', flat=True))
+
+        total_attempts = len(answer_sets)
+        keys = [str(question_id) for question_id, _, _, _, _ in questions]
+        # answers[q][a] is attempt a's answer to question q (None when unanswered)
+        answers = [[answer_set.get(key) for answer_set in answer_sets] for key in keys]
+
+        correct = np.array([
+            [answer == question[4] for answer in row] for question, row in zip(questions, answers)
+        ], dtype=bool).reshape(len(questions), total_attempts)
+        correct_counts = correct.sum(axis=1)
+        success_rates = correct_counts / total_attempts * 100 if total_attempts else np.zeros(len(questions))
+
+        # Discrimination: how much better the top scorers do on a question than the bottom scorers
+        group_size = max(1, int(round(total_attempts * 0.27)))
+        if total_attempts >= 2:
+            by_score = np.argsort(correct.sum(axis=0), kind='stable')
+            lower, upper = by_score[:group_size], by_score[-group_size:]
+            discrimination = correct[:, upper].mean(axis=1) - correct[:, lower].mean(axis=1)
+        else:
+            discrimination = np.zeros(len(questions))
+
         performance_data = []
-        
-        for question in questions:
-            attempts = QuizAttempt.objects.filter(
-                quiz=quiz,
-                completed_at__isnull=False
-            )
-            
-            correct_count = 0
-            for attempt in attempts:
-                student_answer = attempt.answers.get(str(question.id))
-                if student_answer == question.correct_answer:
-                    correct_count += 1
-            
-            total_attempts = attempts.count()
-            success_rate = (correct_count / total_attempts * 100) if total_attempts > 0 else 0
-            
+        for index, (question_id, text, question_type, options, correct_answer) in enumerate(questions):
+            success_rate = float(success_rates[index])
             performance_data.append({
-                'question_id': question.id,
-                'question_text': question.text[:50],
-                'correct_answers': correct_count,
+                'question_id': question_id,
+                'question_text': text[:50],
+                'correct_answers': int(correct_counts[index]),
                 'total_attempts': total_attempts,
                 'success_rate': round(success_rate, 2),
-                'difficulty': 'Easy' if success_rate > 80 else 'Medium' if success_rate > 50 else 'Hard'
+                'difficulty': 'Easy' if success_rate > 80 else 'Medium' if success_rate > 50 else 'Hard',
+                'discrimination_index': round(float(discrimination[index]), 3),
+                'unanswered': sum(1 for answer in answers[index] if answer in (None, '')),
+                'distractors': QuizAnalytics._option_frequencies(
+                    answers[index], options, correct_answer, total_attempts
+                ) if question_type in ('multiple_choice', 'true_false') else [],
             })
-        
+
         return performance_data
-    
+
+    @staticmethod
+    def _option_frequencies(answers, options, correct_answer, total_attempts):
+        """How often each option was chosen; answers are stored as option indexes"""
+        options = options or []
+        chosen = np.array([
+            int(answer) if isinstance(answer, (int, str)) and str(answer).isdigit() else -1
+            for answer in answers
+        ], dtype=np.int64)
+        counts = np.bincount(chosen[(chosen >= 0) & (chosen < len(options))], minlength=len(options))
+        return [
+            {
+                'option': option,
+                'count': int(counts[index]),
+                'percentage': round(float(counts[index]) / total_attempts * 100, 2) if total_attempts else 0,
+                'is_correct': str(index) == str(correct_answer),
+            }
+            for index, option in enumerate(options)
+        ]
+
     @staticmethod
     def get_student_progress(student_id, quiz_ids=None):
         """Get student progress across quizzes"""
@@ -378,12 +586,11 @@ class QuizAnalytics:
         for attempt in query:
             score = attempt.score if attempt.score else 0
             total = attempt.total_points if attempt.total_points else 0
-            percentage = (score / total * 100) if total and total > 0 else 0
             progress_data.append({
                 'quiz_title': attempt.quiz.title,
                 'score': score,
                 'total': total,
-                'percentage': round(percentage, 2),
+                'percentage': attempt.percentage or 0,
                 'completed_at': attempt.completed_at,
                 'time_taken_minutes': int((attempt.completed_at - attempt.started_at).total_seconds() / 60) if (attempt.completed_at and attempt.started_at) else 0
             })
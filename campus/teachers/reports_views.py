@@ -3,11 +3,18 @@ Views for quiz reports module - separate from main views to avoid collision
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse, FileResponse
 from django.views.decorators.http import require_POST
 from django.db.models import Q
-from teachers.models import Quiz, QuizAttempt, Subject
-from teachers.reports_generator import QuizReportFilter, QuizReportGenerator, QuizAnalytics
+from teachers.models import Quiz, QuizAttempt, Subject, ReportJob
+from teachers.reports_generator import (
+    QuizReportFilter, QuizReportGenerator, QuizAnalytics, ATTEMPTS_PAGE_SIZE, MAX_ATTEMPTS_PAGE_SIZE, SORT_ORDERS
+)
+from teachers.report_exports import stream_csv, write_xlsx, write_parquet
+from teachers.report_jobs import submit_report_job
+from django.conf import settings
+from django.urls import reverse
+import os
 from authentication.models import User
 from django.utils import timezone
 from datetime import timedelta
@@ -87,24 +94,34 @@ def filter_quiz_reports(request):
             except (ValueError, TypeError):
                 pass  # Skip if conversion fails
         
+        # Percentage range
+        if data.get('min_percentage') or data.get('max_percentage'):
+            try:
+                min_percentage = float(data['min_percentage']) if data.get('min_percentage') else None
+                max_percentage = float(data['max_percentage']) if data.get('max_percentage') else None
+                report_filter.set_percentage_range_filter(min_percentage, max_percentage)
+            except (ValueError, TypeError):
+                pass  # Skip if conversion fails
+        
         # Search
         if data.get('search'):
             report_filter.set_search_filter(data['search'])
         
-        # Get filtered data
-        attempts = report_filter.get_attempts()
-        stats = report_filter.get_statistics()
+        if data.get('sort') in SORT_ORDERS:
+            report_filter.set_sort(data['sort'])
+        
+        # Keyset pagination: the client passes back next_cursor to fetch the following page
+        try:
+            page_size = min(int(data.get('page_size') or ATTEMPTS_PAGE_SIZE), MAX_ATTEMPTS_PAGE_SIZE)
+            attempts, next_cursor = report_filter.get_page(data.get('cursor'), max(page_size, 1))
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid page cursor'}, status=400)
         
         # Format attempts for JSON
         attempts_data = []
-        for attempt in attempts[:100]:  # Limit to 100 for JSON response
-            # Safely calculate percentage - handle None and zero cases
+        for attempt in attempts:
             score = attempt.score if attempt.score else 0
             total = attempt.total_points if attempt.total_points else 0
-            if total and total > 0:
-                percentage = (score / total * 100)
-            else:
-                percentage = 0
             
             # Get student name - use full name if available, otherwise username
             student_name = f"{attempt.student.first_name} {attempt.student.last_name}".strip()
@@ -117,17 +134,23 @@ def filter_quiz_reports(request):
                 'student_name': student_name,
                 'score': score,
                 'total': total,
-                'percentage': round(percentage, 2),
+                'percentage': attempt.percentage or 0,
                 'completed_at': attempt.completed_at.strftime('%Y-%m-%d %H:%M') if attempt.completed_at else 'N/A',
                 'status': 'Completed' if attempt.completed_at else 'In Progress'
             })
         
-        return JsonResponse({
+        response = {
             'success': True,
-            'statistics': stats,
             'attempts': attempts_data,
-            'total_records': attempts.count()
-        })
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+        }
+        # Statistics (and the record count) only change with the filters, not the page
+        if not data.get('cursor'):
+            stats = report_filter.get_statistics()
+            response['statistics'] = stats
+            response['total_records'] = stats['total_attempts']
+        return JsonResponse(response)
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -140,47 +163,109 @@ def download_quiz_report_pdf(request):
         return HttpResponseForbidden("You don't have permission to access this page.")
     
     try:
-        # Get filter parameters from GET request
-        report_filter = QuizReportFilter(request.user)
-        
-        if request.GET.get('quiz_id'):
-            report_filter.set_quiz_filter(request.GET['quiz_id'])
+        report_filter = QuizReportFilter.from_params(request.user, request.GET)
         
-        if request.GET.get('subject_id'):
-            report_filter.set_subject_filter(request.GET['subject_id'])
-        
-        if request.GET.get('student_id'):
-            report_filter.set_student_filter(request.GET['student_id'])
+        # Generate PDF (repeat downloads of unchanged data are served from the report cache)
+        generator = QuizReportGenerator(report_filter)
+        pdf_path = generator.get_or_generate_pdf()
+        filename = f"quiz_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
-        if request.GET.get('difficulty'):
-            report_filter.set_difficulty_filter(request.GET['difficulty'])
+        # Return PDF response
+        return FileResponse(open(pdf_path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
         
-        # Date range
-        if request.GET.get('start_date') and request.GET.get('end_date'):
-            start_date = timezone.datetime.fromisoformat(request.GET['start_date'])
-            end_date = timezone.datetime.fromisoformat(request.GET['end_date'])
-            report_filter.set_date_range_filter(start_date, end_date)
+    except Exception as e:
+        return HttpResponse(f"Error generating PDF: {str(e)}", status=500)
+
+
+def _report_job_payload(job):
+    payload = {
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat(),
+    }
+    if job.status == 'done':
+        payload['download_url'] = reverse('download_report_job', args=[job.id])
+    elif job.status == 'failed':
+        payload['error'] = job.error
+    return payload
+
+
+@login_required
+@require_POST
+def create_report_job(request):
+    """Queue PDF generation for the posted filters; identical pending or finished reports are reused"""
+    if not request.user.is_teacher():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        job = submit_report_job(request.user, request.POST)
+        return JsonResponse(_report_job_payload(job), status=202)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+def report_job_status(request, job_id):
+    """Poll the state of a report job"""
+    if not request.user.is_teacher():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    job = get_object_or_404(ReportJob, id=job_id, teacher=request.user)
+    return JsonResponse(_report_job_payload(job))
+
+
+@login_required
+def download_report_job(request, job_id):
+    """Download the PDF produced by a finished report job"""
+    if not request.user.is_teacher():
+        return HttpResponseForbidden("You don't have permission to access this page.")
+    
+    job = get_object_or_404(ReportJob, id=job_id, teacher=request.user, status='done')
+    pdf_path = os.path.join(settings.MEDIA_ROOT, job.file_path)
+    if not os.path.exists(pdf_path):
+        return HttpResponse("This report has expired, please generate it again.", status=410)
+    
+    filename = f"quiz_report_{job.created_at.strftime('%Y%m%d_%H%M%S')}.pdf"
+    return FileResponse(open(pdf_path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+@login_required
+def export_quiz_report(request, export_format):
+    """Download filtered attempts as streamed CSV, or XLSX / Parquet for analysts"""
+    if not request.user.is_teacher():
+        return HttpResponseForbidden("You don't have permission to access this page.")
+    
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unsupported export format: {export_format}'}, status=400)
+    
+    try:
+        report_filter = QuizReportFilter.from_params(request.user, request.GET)
+        filename = f"quiz_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
         
-        # Score range
-        if request.GET.get('min_score') and request.GET.get('min_score') != '':
+        if export_format == 'csv':
+            response = StreamingHttpResponse(stream_csv(report_filter), content_type=EXPORT_FORMATS['csv'])
+        else:
+            writer = write_xlsx if export_format == 'xlsx' else write_parquet
             try:
-                min_score = int(request.GET['min_score'])
-                max_score = int(request.GET.get('max_score', 1000)) if request.GET.get('max_score') and request.GET.get('max_score') != '' else 1000
-                report_filter.set_score_range_filter(min_score, max_score)
-            except (ValueError, TypeError):
-                pass  # Skip if conversion fails
-        
-        # Generate PDF
-        generator = QuizReportGenerator(report_filter)
-        pdf_buffer, filename = generator.generate_pdf()
+                output = writer(report_filter)
+            except ImportError:
+                package = 'XlsxWriter' if export_format == 'xlsx' else 'pyarrow'
+                return JsonResponse({'error': f'{export_format.upper()} export requires the {package} package'}, status=501)
+            response = FileResponse(output, content_type=EXPORT_FORMATS[export_format])
         
-        # Return PDF response
-        response = HttpResponse(pdf_buffer, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
         
     except Exception as e:
-        return HttpResponse(f"Error generating PDF: {str(e)}", status=500)
+        return JsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
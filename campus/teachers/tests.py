@@ -1,3 +1,265 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from authentication.models import User
+from .answer_keys import get_answer_key
+from .models import Subject, Quiz, Question, QuizAttempt, ReportJob
+from .report_jobs import submit_report_job, REPORT_JOB_STALE_AFTER
+from .reports_generator import QuizAnalytics, QuizReportFilter, SORT_ORDERS
 
-# Create your tests here.
+
+class ReportJobReuseTests(TestCase):
+    """Identical report requests reuse a live job, but not one that has gone stale"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        patcher = mock.patch('teachers.report_jobs._executor')
+        self.executor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_live_pending_job_is_reused(self):
+        first = submit_report_job(self.teacher, {'difficulty': 'easy'})
+
+        self.assertEqual(submit_report_job(self.teacher, {'difficulty': 'easy'}).id, first.id)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_stale_running_job_is_resubmitted(self):
+        stale = submit_report_job(self.teacher, {'difficulty': 'easy'})
+        ReportJob.objects.filter(id=stale.id).update(
+            status='running', created_at=timezone.now() - timedelta(seconds=REPORT_JOB_STALE_AFTER + 60)
+        )
+
+        job = submit_report_job(self.teacher, {'difficulty': 'easy'})
+
+        self.assertNotEqual(job.id, stale.id)
+        self.assertEqual(job.status, 'pending')
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.executor.submit.assert_any_call(mock.ANY, job.id)
+
+
+class ReportKeysetPaginationTests(TestCase):
+    """Paging through attempts with next_cursor visits every attempt once, in sort order"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=self.teacher)
+        now = timezone.now()
+        # Ties on percentage and on completed_at, plus in-progress attempts (both NULL)
+        for i, score in enumerate([4, 2, 2, 3, 2, 4, None, 1, None, 3, 2]):
+            student = User.objects.create_user(username=f'student{i}', password='pass', role='student')
+            QuizAttempt.objects.create(
+                quiz=quiz, student=student, score=score, total_points=4,
+                completed_at=None if score is None else now - timedelta(hours=i % 3),
+            )
+
+    def test_every_sort_order_pages_through_all_attempts(self):
+        for sort in SORT_ORDERS:
+            with self.subTest(sort=sort):
+                report_filter = QuizReportFilter(self.teacher).set_sort(sort)
+                seen, cursor = [], None
+                while True:
+                    page, cursor = report_filter.get_page(cursor, page_size=3)
+                    seen.extend(attempt.id for attempt in page)
+                    if cursor is None:
+                        break
+
+                self.assertEqual(seen, [attempt.id for attempt in report_filter.get_attempts()])
+                self.assertEqual(len(set(seen)), QuizAttempt.objects.count())
+
+
+class AnswerKeyInvalidationTests(TestCase):
+    """Question edits must reach the cached answer key used for scoring"""
+
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        subject = Subject.objects.create(name='Biology', teacher=teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=teacher)
+        self.question = Question.objects.create(
+            quiz=self.quiz, text='Q1', question_type='true_false',
+            options=['True', 'False'], correct_answer='0', order=0,
+        )
+
+    def answer_key(self):
+        # Each request loads the quiz row afresh, as take_quiz and submit_quiz do
+        return get_answer_key(Quiz.objects.get(pk=self.quiz.pk))
+
+    def test_edit_replaces_cached_key(self):
+        self.assertEqual(self.answer_key()[0][1], '0')
+
+        # No on_commit callback or cache call is involved: the new version is in the quiz row
+        self.question.correct_answer = '1'
+        self.question.save()
+
+        self.assertEqual(self.answer_key()[0][1], '1')
+
+    def test_added_and_deleted_questions_change_the_key(self):
+        self.assertEqual(len(self.answer_key()), 1)
+
+        Question.objects.create(quiz=self.quiz, text='Q2', question_type='short_answer',
+                                correct_answer='mitosis', order=1)
+        self.assertEqual([row[2] for row in self.answer_key()], ['Q1', 'Q2'])
+
+        self.question.delete()
+        self.assertEqual([row[2] for row in self.answer_key()], ['Q2'])
+
+
+class QuizAnalyticsTests(TestCase):
+    """The analytics page leaves questions and attempt lists to the per-quiz endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=self.teacher)
+        Question.objects.create(quiz=self.quiz, text='Q1', question_type='true_false',
+                                options=['True', 'False'], correct_answer='0', order=0)
+        now = timezone.now()
+        for i in range(30):
+            student = User.objects.create_user(username=f'student{i}', password='pass', role='student')
+            QuizAttempt.objects.create(quiz=self.quiz, student=student, score=i % 2, total_points=1,
+                                       completed_at=now - timedelta(minutes=i))
+        self.client.force_login(self.teacher)
+
+    def test_page_does_not_load_attempts_or_questions(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('quiz_analytics'))
+
+        self.assertEqual(response.status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('teachers_question', tables)
+        self.assertNotIn('"teachers_quizattempt"."answers"', tables)
+
+    def test_attempts_are_paged(self):
+        url = reverse('quiz_attempts', args=[self.quiz.id])
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+
+        self.assertIsNone(second['next_cursor'])
+        seen = [attempt['student'] for attempt in first['attempts'] + second['attempts']]
+        self.assertEqual(seen, [f'student{i}' for i in range(30)])
+
+    def test_questions_of_another_teachers_quiz_are_not_found(self):
+        other = User.objects.create_user(username='other', password='pass', role='teacher')
+        self.client.force_login(other)
+
+        self.assertEqual(self.client.get(reverse('quiz_questions', args=[self.quiz.id])).status_code, 404)
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('quiz_questions', args=[self.quiz.id])).json()['questions'][0]['text'], 'Q1')
+
+
+class QuestionPerformanceTests(TestCase):
+    """Per-question success rate, discrimination index and distractors on a hand-checked quiz"""
+
+    def setUp(self):
+        teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        subject = Subject.objects.create(name='Biology', teacher=teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=teacher)
+        questions = [
+            Question.objects.create(quiz=self.quiz, text='Q1', question_type='multiple_choice',
+                                    options=['A', 'B', 'C'], correct_answer='0', order=0),
+            Question.objects.create(quiz=self.quiz, text='Q2', question_type='true_false',
+                                    options=['True', 'False'], correct_answer='1', order=1),
+            Question.objects.create(quiz=self.quiz, text='Q3', question_type='short_answer',
+                                    correct_answer='mitosis', order=2),
+        ]
+        # Scores 3, 2, 2 and 1: the top and bottom 27% are one attempt each
+        answer_rows = [
+            ('0', '1', 'mitosis'),
+            ('0', '1', None),
+            ('0', '0', 'mitosis'),
+            ('2', '1', None),
+        ]
+        now = timezone.now()
+        for i, row in enumerate(answer_rows):
+            student = User.objects.create_user(username=f'student{i}', password='pass', role='student')
+            answers = {str(question.id): answer for question, answer in zip(questions, row) if answer is not None}
+            QuizAttempt.objects.create(quiz=self.quiz, student=student, score=sum(
+                answer == question.correct_answer for question, answer in zip(questions, row)
+            ), total_points=3, answers=answers, completed_at=now)
+        # In-progress attempts are left out
+        student = User.objects.create_user(username='student_in_progress', password='pass', role='student')
+        QuizAttempt.objects.create(quiz=self.quiz, student=student,
+                                   answers={str(questions[0].id): '1', str(questions[1].id): '0'})
+
+    def test_known_values(self):
+        q1, q2, q3 = QuizAnalytics.get_performance_by_question(self.quiz.id)
+
+        self.assertEqual([q['total_attempts'] for q in (q1, q2, q3)], [4, 4, 4])
+        self.assertEqual([q['correct_answers'] for q in (q1, q2, q3)], [3, 3, 2])
+        self.assertEqual([q['success_rate'] for q in (q1, q2, q3)], [75.0, 75.0, 50.0])
+        self.assertEqual([q['difficulty'] for q in (q1, q2, q3)], ['Medium', 'Medium', 'Hard'])
+        # Q2 is answered correctly by both the top and the bottom attempt
+        self.assertEqual([q['discrimination_index'] for q in (q1, q2, q3)], [1.0, 0.0, 1.0])
+        self.assertEqual([q['unanswered'] for q in (q1, q2, q3)], [0, 0, 2])
+
+        self.assertEqual(q1['distractors'], [
+            {'option': 'A', 'count': 3, 'percentage': 75.0, 'is_correct': True},
+            {'option': 'B', 'count': 0, 'percentage': 0.0, 'is_correct': False},
+            {'option': 'C', 'count': 1, 'percentage': 25.0, 'is_correct': False},
+        ])
+        self.assertEqual(q2['distractors'], [
+            {'option': 'True', 'count': 1, 'percentage': 25.0, 'is_correct': False},
+            {'option': 'False', 'count': 3, 'percentage': 75.0, 'is_correct': True},
+        ])
+        self.assertEqual(q3['distractors'], [])
+
+
+class QuizDetailEditTests(TestCase):
+    """Saving the quiz form writes only the questions that changed"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        subject = Subject.objects.create(name='Biology', teacher=self.teacher)
+        self.quiz = Quiz.objects.create(title='Quiz', subject=subject, created_by=self.teacher)
+        self.choice = Question.objects.create(quiz=self.quiz, text='Q1', question_type='multiple_choice',
+                                              options=['A', 'B', 'C', 'D'], correct_answer='0', order=0)
+        self.short = Question.objects.create(quiz=self.quiz, text='Q2', question_type='short_answer',
+                                             correct_answer='mitosis', order=1)
+        self.client.force_login(self.teacher)
+
+    def form(self, **changes):
+        data = {
+            'title': 'Quiz', 'description': '', 'duration': '30',
+            f'question_{self.choice.id}': 'Q1', f'answer_{self.choice.id}': '0',
+            f'question_{self.short.id}': 'Q2', f'answer_{self.short.id}': 'mitosis',
+        }
+        data.update({f'option_{self.choice.id}_{i}': option for i, option in enumerate('ABCD')})
+        data.update(changes)
+        return data
+
+    def post(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('quiz_detail', args=[self.quiz.id]), data)
+        self.assertEqual(response.status_code, 302)
+        return [query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('UPDATE "teachers_question"')]
+
+    def version(self):
+        return Quiz.objects.values_list('answer_key_version', flat=True).get(pk=self.quiz.pk)
+
+    def test_unchanged_questions_are_not_written(self):
+        version = self.version()
+
+        self.assertEqual(self.post(self.form()), [])
+        self.assertEqual(self.version(), version)
+
+    def test_changed_question_is_written_and_invalidates_the_key(self):
+        version = self.version()
+        get_answer_key(Quiz.objects.get(pk=self.quiz.pk))
+
+        updates = self.post(self.form(**{f'answer_{self.short.id}': 'meiosis'}))
+
+        self.assertEqual(len(updates), 1)
+        self.assertIn(f'IN ({self.short.id})', updates[0])
+        self.assertNotEqual(self.version(), version)
+        key = get_answer_key(Quiz.objects.get(pk=self.quiz.pk))
+        self.assertEqual([row[1] for row in key], ['0', 'meiosis'])
@@ -14,6 +14,8 @@ urlpatterns = [
     path('quiz/<int:quiz_id>/', views.quiz_detail, name='quiz_detail'),
     path('quiz/<int:quiz_id>/toggle/', views.toggle_quiz_active, name='toggle_quiz_active'),
     path('quiz/analytics/', views.quiz_analytics, name='quiz_analytics'),
+    path('quiz/<int:quiz_id>/attempts/', views.quiz_attempts, name='quiz_attempts'),
+    path('quiz/<int:quiz_id>/questions/', views.quiz_questions, name='quiz_questions'),
     path('chat/', views.teacher_chat, name='teacher_chat'),
     path('chat/<int:user_id>/', views.teacher_chat_with, name='teacher_chat_with'),
     path('chat/send/<int:user_id>/', views.send_message, name='send_message'),
@@ -24,6 +26,10 @@ urlpatterns = [
     path('reports/', reports_views.quiz_reports, name='quiz_reports'),
     path('reports/filter/', reports_views.filter_quiz_reports, name='filter_quiz_reports'),
     path('reports/download-pdf/', reports_views.download_quiz_report_pdf, name='download_quiz_report_pdf'),
+    path('reports/export/<str:export_format>/', reports_views.export_quiz_report, name='export_quiz_report'),
+    path('reports/jobs/', reports_views.create_report_job, name='create_report_job'),
+    path('reports/jobs/<int:job_id>/', reports_views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<int:job_id>/download/', reports_views.download_report_job, name='download_report_job'),
     path('reports/question-performance/<int:quiz_id>/', reports_views.question_performance, name='question_performance'),
     path('reports/student-progress/<int:student_id>/', reports_views.student_progress, name='student_progress'),
 ]
@@ -2,21 +2,25 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden, JsonResponse
 from django.contrib import messages
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q, Max, Count, Case, When
 from .models import Subject, PDFNote, Quiz, Question, ChatMessage
 from .forms import SubjectForm, PDFNoteForm
 from authentication.models import User
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 @login_required
 def teacher_dashboard(request):
     if not request.user.is_teacher():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    subjects = Subject.objects.filter(teacher=request.user)
-    quizzes = Quiz.objects.filter(created_by=request.user).order_by('-created_at')[:10]
-    return render(request, 'teachers/dashboard.html', {'subjects': subjects, 'quizzes': quizzes})
+    from .catalog_cache import get_teacher_dashboard
+    
+    dashboard = get_teacher_dashboard(request.user.id)
+    return render(request, 'teachers/dashboard.html', {'subjects': dashboard['subjects'], 'quizzes': dashboard['quizzes']})
 
 @login_required
 def create_subject(request):
@@ -163,39 +167,42 @@ def generate_quiz(request, pdf_id):
                 quiz_description += f" (Topics: {topics})"
             quiz_description += f" | Difficulty: {difficulty.capitalize()}"
             
-            quiz = Quiz.objects.create(
-                title=f"Quiz: {pdf_note.title}",
-                subject=pdf_note.subject,
-                pdf_note=pdf_note,
-                description=quiz_description,
-                duration=duration,
-                num_questions=num_questions,
-                topics=topics,
-                difficulty=difficulty,
-                created_by=request.user,
-                is_active=True
-            )
-            
-            # Create questions
-            for idx, q_data in enumerate(questions_data, start=1):
-                Question.objects.create(
-                    quiz=quiz,
-                    text=q_data['question'],
-                    question_type='multiple_choice',
-                    options=q_data['options'],
-                    correct_answer=str(q_data['correct_answer']),
-                    points=1,
-                    order=idx
+            # Quiz and questions are written together; questions go in one bulk insert
+            with transaction.atomic():
+                quiz = Quiz.objects.create(
+                    title=f"Quiz: {pdf_note.title}",
+                    subject=pdf_note.subject,
+                    pdf_note=pdf_note,
+                    description=quiz_description,
+                    duration=duration,
+                    num_questions=num_questions,
+                    topics=topics,
+                    difficulty=difficulty,
+                    created_by=request.user,
+                    is_active=True,
+                    # bulk_create skips Question.save(), which would otherwise keep this current
+                    question_count=len(questions_data)
                 )
+                
+                Question.objects.bulk_create([
+                    Question(
+                        quiz=quiz,
+                        text=q_data['question'],
+                        question_type='multiple_choice',
+                        options=q_data['options'],
+                        correct_answer=str(q_data['correct_answer']),
+                        points=1,
+                        order=idx
+                    )
+                    for idx, q_data in enumerate(questions_data, start=1)
+                ])
             
             messages.success(request, f'Quiz "{quiz.title}" created successfully with {len(questions_data)} questions!')
             return redirect('quiz_detail', quiz_id=quiz.id)
             
         except Exception as e:
-            import traceback
             error_msg = str(e)
-            print(f"Quiz generation error: {error_msg}")
-            print(traceback.format_exc())
+            logger.exception("Quiz generation error: %s", error_msg)
             messages.error(request, f'Error generating quiz: {error_msg}')
             return render(request, 'teachers/generate_quiz.html', {
                 'pdf_note': pdf_note,
@@ -216,39 +223,49 @@ def quiz_detail(request, quiz_id):
     questions = quiz.questions.all().order_by('order')
     
     if request.method == 'POST':
-        # Handle quiz metadata update
-        quiz.title = request.POST.get('title', quiz.title)
-        quiz.description = request.POST.get('description', quiz.description)
-        quiz.duration = int(request.POST.get('duration', quiz.duration))
-        
-        deadline_str = request.POST.get('deadline')
-        if deadline_str:
-            from django.utils import timezone
-            from datetime import datetime
-            quiz.deadline = timezone.make_aware(datetime.fromisoformat(deadline_str))
-        
-        quiz.save()
-        
-        # Handle question updates
-        for question in questions:
-            q_text = request.POST.get(f'question_{question.id}')
-            q_answer = request.POST.get(f'answer_{question.id}')
+        with transaction.atomic():
+            # Handle quiz metadata update
+            quiz.title = request.POST.get('title', quiz.title)
+            quiz.description = request.POST.get('description', quiz.description)
+            quiz.duration = int(request.POST.get('duration', quiz.duration))
+            
+            deadline_str = request.POST.get('deadline')
+            if deadline_str:
+                from django.utils import timezone
+                from datetime import datetime
+                quiz.deadline = timezone.make_aware(datetime.fromisoformat(deadline_str))
             
-            if q_text:
-                question.text = q_text
-            if q_answer:
-                question.correct_answer = q_answer
+            quiz.save(update_fields=['title', 'description', 'duration', 'deadline'])
             
-            # Update options for multiple choice
-            if question.question_type == 'multiple_choice':
-                options = []
-                for i in range(4):
-                    option = request.POST.get(f'option_{question.id}_{i}')
-                    if option:
-                        options.append(option)
-                question.options = options
+            # Handle question updates; only questions that actually changed are written,
+            # all in one bulk UPDATE
+            changed = []
+            for question in questions:
+                original = (question.text, question.correct_answer, question.options)
+                q_text = request.POST.get(f'question_{question.id}')
+                q_answer = request.POST.get(f'answer_{question.id}')
+                
+                if q_text:
+                    question.text = q_text
+                if q_answer:
+                    question.correct_answer = q_answer
+                
+                # Update options for multiple choice
+                if question.question_type == 'multiple_choice':
+                    options = []
+                    for i in range(4):
+                        option = request.POST.get(f'option_{question.id}_{i}')
+                        if option:
+                            options.append(option)
+                    question.options = options
+                
+                if (question.text, question.correct_answer, question.options) != original:
+                    changed.append(question)
             
-            question.save()
+            if changed:
+                from .answer_keys import invalidate_answer_key
+                Question.objects.bulk_update(changed, ['text', 'correct_answer', 'options'])
+                invalidate_answer_key(quiz.id)
         
         messages.success(request, 'Quiz updated successfully!')
         return redirect('quiz_detail', quiz_id=quiz.id)
@@ -260,15 +277,11 @@ def quiz_detail(request, quiz_id):
         completed_at__isnull=False
     ).select_related('student').prefetch_related('snapshots').order_by('-completed_at')
     
-    # Add violation count to each attempt
+    # Add violation count to each attempt (percentage is stored on the attempt)
     total_violations = 0
     for attempt in attempts:
         attempt.violation_count = attempt.snapshots.count()
         total_violations += attempt.violation_count
-        if quiz.questions.count() > 0:
-            attempt.percentage = round((attempt.score / quiz.questions.count()) * 100, 2)
-        else:
-            attempt.percentage = 0
     
     return render(request, 'teachers/quiz_detail.html', {
         'quiz': quiz,
@@ -300,34 +313,30 @@ def quiz_analytics(request):
     if not request.user.is_teacher():
         return HttpResponseForbidden("You don't have permission to access this page.")
     
-    quizzes = Quiz.objects.filter(created_by=request.user).prefetch_related('attempts', 'questions', 'attempts__student')
+    from .models import QuizAttempt
+    from .analytics_utils import get_teacher_summary
+    
+    # Questions and attempt lists are fetched per quiz when the teacher opens them
+    # (quiz_questions, quiz_attempts), not for every quiz on every page view
+    quizzes = list(Quiz.objects.filter(created_by=request.user).select_related(
+        'subject', 'pdf_note', 'created_by'
+    ))
+    summary = get_teacher_summary(request.user.id)
     
-    # Calculate statistics for each quiz
+    # Calculate statistics for each quiz from the grouped aggregates
     quiz_stats = []
-    total_attempts_all = 0
-    unique_students_set = set()
     all_percentages = []
     
     for quiz in quizzes:
-        attempts = quiz.attempts.filter(completed_at__isnull=False)
-        total_attempts = attempts.count()
-        total_attempts_all += total_attempts
-        
-        # Get unique students for this quiz
-        students_in_quiz = set(attempt.student.id for attempt in attempts)
-        unique_students_set.update(students_in_quiz)
+        row = summary['per_quiz'].get(quiz.id)
+        total_attempts = row['total_attempts'] if row else 0
         
         if total_attempts > 0:
-            scores = [a.score for a in attempts]
-            avg_score = sum(scores) / total_attempts
-            highest_score = max(scores)
-            lowest_score = min(scores)
-            
-            if quiz.questions.count() > 0:
-                avg_percentage = (avg_score / quiz.questions.count()) * 100
-                all_percentages.append(avg_percentage)
-            else:
-                avg_percentage = 0
+            avg_score = row['avg_score']
+            highest_score = row['highest_score']
+            lowest_score = row['lowest_score']
+            avg_percentage = row['avg_percentage'] or 0
+            all_percentages.append(avg_percentage)
         else:
             avg_score = 0
             avg_percentage = 0
@@ -339,24 +348,26 @@ def quiz_analytics(request):
             'total_attempts': total_attempts,
             'avg_score': round(avg_score, 2),
             'avg_percentage': round(avg_percentage, 2),
-            'total_questions': quiz.questions.count(),
+            'total_questions': quiz.question_count,
             'highest_score': highest_score,
             'lowest_score': lowest_score,
-            'unique_students': len(students_in_quiz)
+            'unique_students': row['unique_students'] if row else 0
         })
     
     # Calculate overall statistics
     overall_avg = round(sum(all_percentages) / len(all_percentages), 2) if all_percentages else 0
     
-    # Prepare proctoring data for all quizzes
-    proctoring_data = []
-    for quiz in quizzes:
-        # Get all attempts with violations for this quiz
-        attempts_with_violations = quiz.attempts.prefetch_related(
-            'snapshots', 'student'
-        ).annotate(
+    # Prepare proctoring data: every attempt with snapshots, fetched in one query
+    violation_attempt_ids = [
+        attempt_id for violations in summary['violations'].values() for attempt_id in violations['attempt_ids']
+    ]
+    attempts_by_quiz = {}
+    if violation_attempt_ids:
+        attempts_with_violations = QuizAttempt.objects.filter(
+            id__in=violation_attempt_ids
+        ).select_related('student').prefetch_related('snapshots').annotate(
             snapshot_count=Count('snapshots')
-        ).filter(snapshot_count__gt=0).order_by(
+        ).order_by(
             # Order by completed status (completed first), then by date (most recent first)
             models.Case(
                 models.When(completed_at__isnull=False, then=0),
@@ -366,25 +377,70 @@ def quiz_analytics(request):
             '-completed_at',
             '-started_at'
         )
-        
-        if attempts_with_violations.exists():
-            # Calculate total violations for this quiz
-            total_violations = sum(attempt.snapshots.count() for attempt in attempts_with_violations)
-            
+        for attempt in attempts_with_violations:
+            attempts_by_quiz.setdefault(attempt.quiz_id, []).append(attempt)
+    
+    proctoring_data = []
+    for quiz in quizzes:
+        if quiz.id in attempts_by_quiz:
             proctoring_data.append({
                 'quiz': quiz,
-                'total_violations': total_violations,
-                'attempts_with_violations': attempts_with_violations
+                'total_violations': summary['violations'][quiz.id]['total_violations'],
+                'attempts_with_violations': attempts_by_quiz[quiz.id]
             })
     
     return render(request, 'teachers/quiz_analytics.html', {
         'quiz_stats': quiz_stats,
-        'total_attempts': total_attempts_all,
-        'unique_students': len(unique_students_set),
+        'total_attempts': summary['total_attempts'],
+        'unique_students': summary['unique_students'],
         'overall_avg': overall_avg,
         'proctoring_data': proctoring_data
     })
 
+@login_required
+def quiz_attempts(request, quiz_id):
+    """One page of a quiz's completed attempts, most recent first, for the analytics modal"""
+    if not request.user.is_teacher():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    from .reports_generator import QuizReportFilter
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id, created_by=request.user)
+    report_filter = QuizReportFilter(request.user).set_quiz_filter(quiz.id).set_completion_filter().set_sort('recent')
+    try:
+        attempts, next_cursor = report_filter.get_page(request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'attempts': [{
+            'id': attempt.id,
+            'student': attempt.student.username,
+            'score': attempt.score,
+            'total': quiz.question_count,
+            'completed_at': attempt.completed_at.isoformat(),
+        } for attempt in attempts if attempt.score is not None],
+        'next_cursor': next_cursor,
+    })
+
+@login_required
+def quiz_questions(request, quiz_id):
+    """Questions and answers of one quiz, for the analytics copy and answer sheet buttons"""
+    if not request.user.is_teacher():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    quiz = get_object_or_404(Quiz.objects.select_related('subject'), id=quiz_id, created_by=request.user)
+    return JsonResponse({
+        'success': True,
+        'title': quiz.title,
+        'subject': quiz.subject.name,
+        'duration': quiz.duration,
+        'questions': list(quiz.questions.order_by('order').values(
+            'text', 'question_type', 'options', 'correct_answer'
+        )),
+    })
+
 @login_required
 def teacher_chat(request):
     if not request.user.is_teacher():
@@ -516,8 +572,11 @@ def get_messages(request, user_id):
         
         messages_list = messages_query.order_by('created_at')
         
-        # Mark new messages as read
-        ChatMessage.objects.filter(sender=other_user, receiver=request.user, is_read=False).update(is_read=True)
+        # Mark new messages as read; polls with nothing unread stay read-only, so they never
+        # wait for the database write lock behind quiz submissions
+        unread = ChatMessage.objects.filter(sender=other_user, receiver=request.user, is_read=False)
+        if unread.exists():
+            unread.update(is_read=True)
         
         messages_data = [{
             'id': msg.id,